@@ -24,12 +24,14 @@
 from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication, QThread, pyqtSignal
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QFileDialog, QMessageBox
-from qgis.core import QgsProject, QgsMapLayer, QgsVectorLayer, QgsMessageLog, QgsLayerTreeLayer
+from qgis.core import QgsProject, QgsMapLayer, QgsVectorLayer, QgsMessageLog, QgsLayerTreeLayer, QgsApplication
 
 # Initialize Qt resources from file resources.py
 from .resources import *
 # Import the code for the dialog
 from .heat_net_tool_dialog import HeatNetToolDialog
+# Cancellation of background tasks, without further dependencies
+from .src.task_control import CancelToken, TaskCancelled, progress_callback
 
 import os.path
 import subprocess
@@ -42,9 +44,15 @@ try:
     import pandas as pd
     import geopandas as gpd
     from shapely import Point
-    from .src.download_files import file_list_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, filter_df, get_shape_from_wfs, clean_data, add_point, create_square, get_area_for_zensus
-    from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
-    from .src.status_analysis import WLD, Polygons
+    from .src.download_files import file_catalog_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, read_csv_region_from_zip_QGIS, filter_df, get_shape_from_wfs, get_shapes_from_wfs, select_by_parcels, repair_geometries, combine_zensus, get_area_for_zensus
+    from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join, zensus_join, adjust_buildings_tiled, copy_layer
+    from .src.read_files import read_layer, layer_columns
+    from .src.qgis_layers import LayerSnapshot
+    from .src.reference_data import load_excel, load_cities
+    from .src.stage_cache import StageCache
+    from .src.stages import (BAK_BINS, BAK_LABELS, BUILDING_CLASS, download_layers, download_zensus_grid, adjust_buildings, adjust_streets,
+                             analyse_heat_density, polygon_paths, net_graph, disconnected_buildings, route_net, net_buildings, save_net, create_result, save_result)
+    from .src.status_analysis import WLD, Polygons, HeatGrid
     from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
     from .src.load_curve import Temperature, LoadProfile
     from workalendar.europe import Germany
@@ -83,10 +91,15 @@ class Worker(QThread):
     *args, **kwargs :
         Additional arguments and keyword arguments to be passed to the task function.
 
+    cancel_token : CancelToken
+        Token to request the cancellation of the task. It is checked by the progress callbacks of the task, see `HeatNetTool.task_progress`.
+
     Methods
     -------
     run()
         Executes the `task_function` with the provided arguments and emits the `finished` signal when done.
+    cancel()
+        Requests the cancellation of the task. The task stops at its next progress report.
     '''
     progress_update = pyqtSignal(int) 
     label_update = pyqtSignal(str, str)
@@ -99,11 +112,19 @@ class Worker(QThread):
         self.args = args
         self.kwargs = kwargs
         self.gui_elements = gui_elements  # GUI elements to update
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        '''Requests the cancellation of the task.'''
+        self.cancel_token.cancel()
 
     def run(self):
         try:
             # Run the task function with the provided arguments
             self.task_function(self.progress_update, self.label_update, *self.args, **self.kwargs)
+        except TaskCancelled:
+            self.progress_update.emit(0)
+            self.label_update.emit(QCoreApplication.translate('HeatNetTool', 'Cancelled.'), 'orange')
         except Exception as e:
             print(e)
             # stacktrace error
@@ -128,6 +149,9 @@ class HeatNetTool:
         self.iface = iface
         # initialize plugin directory
         self.plugin_dir = os.path.dirname(__file__)
+        # compiled reference data and cached results in the QGIS profile, the plugin directory may be read-only
+        # and is replaced by updates (see src/reference_data.user_cache_dir)
+        self.cache_dir = os.path.join(QgsApplication.qualifiedSettingsDirPath(), 'cache', 'fheat')
         # initialize locale
         locale = QSettings().value('locale/userLocale')[0:2]
         locale_path = os.path.join(
@@ -326,9 +350,15 @@ class HeatNetTool:
         import pandas as pd
         import geopandas as gpd
         from shapely import Point
-        from .src.download_files import file_list_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, filter_df, get_shape_from_wfs, clean_data, add_point, create_square, get_area_for_zensus
-        from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
-        from .src.status_analysis import WLD, Polygons
+        from .src.download_files import file_catalog_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, read_csv_region_from_zip_QGIS, filter_df, get_shape_from_wfs, get_shapes_from_wfs, select_by_parcels, repair_geometries, combine_zensus, get_area_for_zensus
+        from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join, zensus_join, adjust_buildings_tiled, copy_layer
+        from .src.read_files import read_layer, layer_columns
+        from .src.qgis_layers import LayerSnapshot
+        from .src.reference_data import load_excel, load_cities
+        from .src.stage_cache import StageCache
+        from .src.stages import (BAK_BINS, BAK_LABELS, BUILDING_CLASS, download_layers, download_zensus_grid, adjust_buildings, adjust_streets,
+                                 analyse_heat_density, polygon_paths, net_graph, disconnected_buildings, route_net, net_buildings, save_net, create_result, save_result)
+        from .src.status_analysis import WLD, Polygons, HeatGrid
         from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
         from .src.load_curve import Temperature, LoadProfile
         from workalendar.europe import Germany
@@ -417,6 +447,104 @@ class HeatNetTool:
         else:
             return None, None, None
 
+    @staticmethod
+    def get_file_layer_name(layer):
+        '''
+        Gets the name of the layer within its file, e.g. of a GeoPackage with several layers.
+
+        Parameters
+        ----------
+        layer : QgsVectorLayer or None
+            The layer of the project.
+
+        Returns
+        -------
+        str or None
+            The 'layername' of the layer source, None for files with a single layer (e.g. shapefiles).
+        '''
+        if layer is None:
+            return None
+        options = dict(part.split('=', 1) for part in layer.source().split('|')[1:] if '=' in part)
+        return options.get('layername')
+
+    def get_layer_snapshots(self, *comboboxes):
+        '''
+        Takes snapshots of the layers selected in the given ComboBoxes.
+
+        The snapshots have to be taken in the main thread. They are read in the background task instead of
+        the layer files, so unsaved edits and memory layers are included.
+
+        Parameters
+        ----------
+        *comboboxes : QComboBox
+            The QComboBox objects representing the layer selection.
+
+        Returns
+        -------
+        dict
+            The LayerSnapshot of each ComboBox, keyed by its object name. None if no vector layer is selected.
+        '''
+        snapshots = {}
+        for combobox in comboboxes:
+            path, layer_name, layer = self.get_layer_path_from_combobox(combobox)
+            snapshots[combobox.objectName()] = LayerSnapshot(layer) if isinstance(layer, QgsVectorLayer) else None
+        return snapshots
+
+    @staticmethod
+    def get_wld_values(text, default=0.1):
+        '''
+        Converts the text of the WLD threshold lineEdit into a list of thresholds.
+
+        Parameters
+        ----------
+        text : str
+            Thresholds separated by semicolons, e.g. '0.1; 500; 1000'. A decimal comma is allowed.
+        default : float, optional
+            Threshold used if the text is empty (default is 0.1).
+
+        Returns
+        -------
+        list of float
+            The thresholds in descending order.
+        '''
+        values = [value.strip().replace(',', '.') for value in text.split(';') if value.strip()]
+        if not values:
+            return [default]
+        return sorted({float(value) for value in values}, reverse=True)
+
+    def task_progress(self, progress_update, start, end):
+        '''
+        Creates a callback that maps the progress of a loop of the running task to a range of the progress bar.
+
+        The callback is passed as `progress` to the loops of the `src` classes. It raises TaskCancelled if the
+        user cancelled the task, so the task stops at the next step of the loop.
+
+        Parameters
+        ----------
+        progress_update : pyqtSignal
+            The progress signal of the worker.
+        start : int
+            The progress value at the start of the loop.
+        end : int
+            The progress value at the end of the loop.
+
+        Returns
+        -------
+        callable
+            A function of the done and the total number of steps.
+        '''
+        return progress_callback(progress_update.emit, start, end, self.worker.cancel_token)
+
+    def cancel_running_task(self):
+        '''
+        Asks the user whether the running background task should be cancelled and cancels it.
+        '''
+        answer = QMessageBox.question(self.dlg, self.tr('Warning'),
+                                      self.tr('A process is already running. Do you want to cancel it?'),
+                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if answer == QMessageBox.Yes and self.worker_running:
+            self.worker.cancel()
+
     def create_layer_tree_structure(self):
         '''
         Creates the desired layer tree structure if it does not already exist.
@@ -534,11 +662,9 @@ class HeatNetTool:
         -------
         None
         '''
+        # bbox strings are parsed to lists with floats when the table is compiled
         path = Path(self.plugin_dir) / 'data/cities.xlsx'
-        df = pd.read_excel(path, dtype={'schluessel': str, 'gmdschl': str})
-
-        # convert string to list with floats
-        df['bbox'] = df['bbox'].apply(lambda x: [float(coord) for coord in x.replace('(', '').replace(')', '').split(',')])
+        df = load_cities(path, cache_dir=self.cache_dir)
 
         municipalities = sorted(df['gemeinde'].unique().tolist())
         cities = sorted(df['name'].tolist())
@@ -808,14 +934,6 @@ class HeatNetTool:
         else:
             label_update.emit(self.tr('Starting...'),'white')
 
-            # URLs
-            # buildings
-            url_buildings = 'https://www.opengeodata.nrw.de/produkte/umwelt_klima/energie/kwp/'
-
-            # parcels
-            url_parcels = 'https://www.wfs.nrw.de/geobasis/wfs_nw_inspire-flurstuecke_alkis'
-            layer_parcels = 'cp:CadastralParcel'
-
             # get name from combo box
             if self.dlg.load_radioButton_municipality.isChecked():
                 name = self.dlg.load_comboBox_municipality.currentText()
@@ -831,61 +949,18 @@ class HeatNetTool:
             
             # filter df for city/municipality name
             filtered_df = filter_df(name, self.gemarkungen_df, parameter)
-            
-            # city/municipality keys
-            municipality_key = filtered_df['gmdschl'][0]
 
-            progress_update.emit(5) # update progressBar
             label_update.emit(self.tr('Downloading...'), 'white')
 
-            # buildings shapes
-            all_buildings_files = file_list_from_URL_QGIS(url_buildings+'index.json')
-            progress_update.emit(10) # update progressBar
-            buildings_zip = search_filename(all_buildings_files, municipality_key)
-            
-            # Check if Data is found
-            if buildings_zip == 'No data found':
+            # buildings, streets and parcels, if only a city is selected only the buildings and streets on its parcels are kept
+            try:
+                buildings_gdf, streets_gdf, parcels_gdf, incomplete_keys = download_layers(filtered_df, parameter, file_catalog_from_URL_QGIS, read_file_from_zip_QGIS,
+                                                                                           progress=self.task_progress(progress_update, 0, 100))
+            except ValueError:
                 label_update.emit(self.tr('Error, no data found. Data source was possibly renamed.'), '#ff5555')
                 return
-            
-            progress_update.emit(15) # update progressBar
-            buildings_file_pattern = f'WBM-NRW_{municipality_key}' # file pattern maybe has to be renamed, when changes on the website occur
-            buildings_gdf = read_file_from_zip_QGIS(url_buildings, buildings_zip, buildings_file_pattern)
-
-            progress_update.emit(35) # update progressBar
-
-            # streets shapes
-            streets_file_pattern = f'WBM-NRW-Waermelinien_{municipality_key}' # file pattern maybe has to be renamed, when changes on the website occur
-            streets_gdf = read_file_from_zip_QGIS(url_buildings, buildings_zip, streets_file_pattern)
-
-            progress_update.emit(55) # update progressBar
-
-            # parcels
-            gdf_list_parcels=[] # if a whole municipality is selected filtered df consists of multiple cities which parcels will be saved in this list and later merged
-            for row  in filtered_df.itertuples():
-                bbox = row.bbox
-                key = row.schluessel
-                parcel_gdf_i, e = get_shape_from_wfs(url_parcels, key, bbox, layer_parcels)
-                if e == 1:
-                    label_update.emit(self.tr('Too many parcels for key: {}!\nMax. 100,000 parcels can be downloaded at once\nparcels incomplete').format(key), '#ff5555')
-                gdf_list_parcels.append(parcel_gdf_i)
-            parcels_gdf = pd.concat(gdf_list_parcels, ignore_index=True)
-
-            progress_update.emit(90) # update progressBar
-
-            # buffer(0) can sometimes repair invalid geometries
-            buildings_gdf['geometry'] = buildings_gdf['geometry'].buffer(0)
-            parcels_gdf['geometry'] = parcels_gdf['geometry'].buffer(0)
-
-            # The buildings and streets can only be downloaded at municipality level, if you only want one city, the 
-            # additional buildings are superfluous and only extend the calculation time of the following programs.
-            # Therefore, only buildings that are located on the parcels that are available at municipality level are retained
-            if parameter == 'city':
-                union = gpd.GeoDataFrame(geometry=[parcels_gdf.unary_union])
-                buildings_gdf = gpd.sjoin(buildings_gdf, union, predicate='intersects')
-                streets_gdf = gpd.sjoin(streets_gdf, union, predicate='intersects')
-
-            progress_update.emit(98) # update progressBar
+            for key in incomplete_keys:
+                label_update.emit(self.tr('Too many parcels for key: {}!\nThe WFS service refused to transmit all parcels\nparcels incomplete').format(key), '#ff5555')
 
             # save gdfs as instance attributes
             self.buildings_gdf = buildings_gdf
@@ -923,65 +998,10 @@ class HeatNetTool:
             # filter df for city/municipality name
             filtered_df = filter_df(name, self.gemarkungen_df, parameter)
 
-            zensus_bbox, zensus_area = get_area_for_zensus(filtered_df)
-
-            xmin, ymin, xmax, ymax = zensus_bbox
-
-            progress_update.emit(5)
-            
-            ## load zensus data
-            url_zensus = 'https://www.destatis.de/static/DE/zensus/gitterdaten/'
-            
-            heizungsart_zip = 'Zensus2022_Heizungsart.zip'
-            energietraeger_zip = 'Zensus2022_Energietraeger.zip'
-
-            df_Heizungsart = read_file_from_zip_QGIS(url_zensus, heizungsart_zip, 'Zensus2022_Heizungsart_100m-Gitter', '.csv', encoding='latin1')
-            progress_update.emit(20)
-            df_Energietraeger = read_file_from_zip_QGIS(url_zensus, energietraeger_zip, 'Zensus2022_Energietraeger_100m-Gitter', '.csv', encoding='latin1')
-
-            # only data within bbox
-            df_Heizungsart = df_Heizungsart[(df_Heizungsart['x_mp_100m'] > xmin) & (df_Heizungsart['x_mp_100m'] < xmax) & (df_Heizungsart['y_mp_100m'] > ymin) & (df_Heizungsart['y_mp_100m'] < ymax)]
-            df_Energietraeger = df_Energietraeger[(df_Energietraeger['x_mp_100m'] > xmin) & (df_Energietraeger['x_mp_100m'] < xmax) & (df_Energietraeger['y_mp_100m'] > ymin) & (df_Energietraeger['y_mp_100m'] < ymax)]
-            progress_update.emit(40)
-
-            ### clean data
-            df_Heizungsart = clean_data(df_Heizungsart)
-            progress_update.emit(50)
-            df_Energietraeger = clean_data(df_Energietraeger)
-            progress_update.emit(60)
-
-            ### add points
-            df_Heizungsart = add_point(df_Heizungsart)
-            progress_update.emit(70)
-            df_Energietraeger = add_point(df_Energietraeger)
-            progress_update.emit(80)
-
-            # create GeoDataFrames
-            gdf_Heizungsart = gpd.GeoDataFrame(df_Heizungsart, geometry='point')
-            gdf_Energietraeger = gpd.GeoDataFrame(df_Energietraeger, geometry='point')
+            # heating types and energy carriers within the bbox, saved as regional extract for later runs
+            zensus_gdf = download_zensus_grid(filtered_df, os.path.join(self.cache_dir, 'zensus'), read_csv_region_from_zip_QGIS,
+                                              progress=self.task_progress(progress_update, 0, 100))
 
-            # set crs
-            gdf_Heizungsart.set_crs(epsg=3035, inplace=True)
-            gdf_Energietraeger.set_crs(epsg=3035, inplace=True)
-
-            # Spatial Join
-            gdf_combined = gpd.sjoin(gdf_Heizungsart, gdf_Energietraeger, how='inner', predicate='intersects')
-
-            # drop unwanted columns
-            gdf_combined = gdf_combined.drop(columns=['index_right'])
-
-            # add square geometry
-            gdf_combined['geometry'] = gdf_combined.apply(lambda row: create_square(row['point'], 100), axis=1)
-
-            # drop point column
-            zensus_gdf = gdf_combined.drop(columns=['point'])
-
-            # Set the 'geometry' column as the active geometry column for the 'shape' object
-            zensus_gdf = zensus_gdf.set_geometry('geometry')
-
-            # Set the CRS for 'shape'
-            zensus_gdf.set_crs(epsg=3035, inplace=True)
-            
             # save zensus_gdf as instance attribute
             self.zensus_gdf = zensus_gdf
 
@@ -998,7 +1018,7 @@ class HeatNetTool:
         - Sets the initial value of the progress bar and provides feedback to the user interface.
 
         2. **Parameter Definitions**:
-        - Defines the heat demand attribute (`heat_att`) and building age class bins (`bak_bins`) and labels (`bak_labels`).
+        - Defines the heat demand attribute (`heat_att`), the building age classes are `BAK_BINS` and `BAK_LABELS` of `src.stages`.
 
         3. **Data Loading**:
         - Reads additional building information from an Excel file.
@@ -1007,7 +1027,7 @@ class HeatNetTool:
         - Retrieves file paths and layer objects for streets, buildings, and parcels from the selected options in the user interface.
 
         5. **Adjustment Class Initialization**:
-        - Initializes instances of `Parcels_adj`, `Buildings_adj`, and `Streets_adj` classes for data processing.
+        - Adjusts the layers with `adjust_buildings` and `adjust_streets` of `src.stages`, which are shared with the pipeline.
 
         6. **Building Data Adjustments**:
         - **Heat Demand Filtering**: Filters out buildings without heat demand.
@@ -1017,8 +1037,12 @@ class HeatNetTool:
         - **Data Cleanup**: Drops unwanted attributes and adds thermal power information.
         - **ID Assignment**: Assigns new IDs to buildings and merges building data as needed.
 
+        - **Zensus Join**: Adds heating types and energy carriers of the Zensus grid cell if a Zensus layer is selected.
+        - **Tiled Mode**: If tiles are checked, the buildings are adjusted tile by tile with `adjust_buildings_tiled` 
+          and written to the output file directly to limit the memory use.
+
         7. **Street Data Adjustments**:
-        - Rounds street coordinates and adds a boolean column to indicate possible routes.
+        - Rounds street coordinates, cleans the street topology and adds a boolean column to indicate possible routes.
 
         8. **Saving and Layer Update**:
         - Determines whether to create new files or overwrite existing ones based on user input.
@@ -1055,59 +1079,106 @@ class HeatNetTool:
                 label_update.emit(self.tr('Specify a file path for the streets'),'orange')
                 return
 
-        # building age classes
-        bak_bins = [0, 1918, 1948, 1957, 1968, 1978, 1983, 1994, 2001, 9999]
-        bak_labels = ['B','C','D','E','F','G','H','I','J']
-        
         streets_path, streets_layer_name, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_streets)
         buildings_path, buildings_layer_name, buildings_layer_obj = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_buildings)
         parcels_path, parcels_layer_name, parcels_layer_obj  = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_parcels)
 
         progress_update.emit(5) # update progressBar
 
-        parcels = Parcels_adj(parcels_path)
-        buildings = Buildings_adj(buildings_path, heat_att)
-        streets = Streets_adj(streets_path)
+        # path of the zensus layer
+        zensus_path, zensus_layer_name, zensus_layer_obj = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_zensus)
+        zensus_file_layer = self.get_file_layer_name(zensus_layer_obj)
+
+        # tiled mode: buildings are adjusted tile by tile and written to a file directly
+        self.buildings_tiles_path = None
+        self.topology_feedback = ''
+        if self.dlg.adjust_checkBox_tiled.isChecked():
+            # test if buildings already have been adjusted
+            if 'Leistung_th [kW]' in layer_columns(buildings_path):
+                self.bool_files_already_adjusted = True
+                label_update.emit(self.tr('Buildings already adjusted!'), 'rgb(0, 255, 0)') # update label
+                progress_update.emit(100) # update progressBar
+                return
+            self.bool_files_already_adjusted = False
+
+            # output file, a temporary GeoPackage if the buildings are overwritten
+            target_path = self.dlg.adjust_lineEdit_buildings.text() if self.dlg.adjust_radioButton_new.isChecked() else buildings_path
+            output_path = target_path
+            if os.path.abspath(output_path) == os.path.abspath(buildings_path):
+                output_path = os.path.splitext(buildings_path)[0] + '_tiles.gpkg'
+
+            zensus = read_layer(zensus_path, layer=zensus_file_layer) if zensus_path is not None else None
+            try:
+                adjust_buildings_tiled(buildings_path, parcels_path, output_path, heat_att, self.excel_building_info,
+                                       self.excel_building_demand_wg, BAK_BINS, BAK_LABELS, zensus=zensus,
+                                       tile_size=self.dlg.adjust_spinBox_tile_size.value(),
+                                       progress=self.task_progress(progress_update, 10, 75))
+            except TaskCancelled:
+                # remove the incomplete output, the input layers are not touched
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
+
+            # overwrite the buildings with the temporary GeoPackage, here in the background task
+            if output_path != target_path:
+                copy_layer(output_path, target_path)
+                os.remove(output_path)
+            progress_update.emit(80) # update progressBar
+
+            self.streets_gdf = self.adjust_street_layer(streets_path, label_update)
+            progress_update.emit(90) # update progressBar
+
+            # save gdfs and path of the adjusted buildings as instance attributes
+            self.buildings_tiles_path = target_path
+            self.buildings_gdf = None
+            progress_update.emit(95) # update progressBar
+
+            # set status for on_task_finished, only reached if the task was not cancelled
+            self.adjust_files_status = 'complete'
+            return
 
         # test if buildings already have been adjusted
-        if 'Leistung_th [kW]' in buildings.gdf.columns:
+        if 'Leistung_th [kW]' in layer_columns(buildings_path):
             self.bool_files_already_adjusted = True
             label_update.emit(self.tr('Buildings already adjusted!'), 'rgb(0, 255, 0)') # update label
             progress_update.emit(100) # update progressBar
         else:
             self.bool_files_already_adjusted = False
-            buildings.gdf = buildings.gdf[buildings.gdf[heat_att]>0].reset_index(drop=True) # only buildings with heat demand
-            progress_update.emit(10) # update progressBar
-            buildings.add_LANUV_age_and_type() # add building age and type by LANUV
-            progress_update.emit(20) # update progressBar
-            buildings.merge_buildings()
-            buildings.gdf['new_ID'] = buildings.gdf.index.astype('int32')
-            progress_update.emit(30) # update progressBar
-            buildings.gdf = spatial_join(buildings.gdf.copy(), parcels.gdf, ['validFrom']) # building age from parcels
-            progress_update.emit(40) # update progressBar
-            buildings.add_BAK(bak_bins,bak_labels) # add building age class
-            progress_update.emit(50) # update progressBar
-            buildings.add_Vlh_Loadprofile(self.excel_building_info)
-            progress_update.emit(60) # update progressBar
-            buildings.drop_unwanted()
-            progress_update.emit(70) # update progressBar
-            buildings.add_power()
-            buildings.add_custom_heat_demand(self.excel_building_demand_wg, self.excel_building_info)
-            buildings.add_connect_option()
-            buildings.rename_and_order_columns()
 
+            # heating types and energy carriers from the Zensus grid
+            zensus = read_layer(zensus_path, layer=zensus_file_layer) if zensus_path is not None else None
+            self.buildings_gdf = adjust_buildings(buildings_path, parcels_path, heat_att, self.excel_building_info, self.excel_building_demand_wg,
+                                                  zensus=zensus, progress=self.task_progress(progress_update, 5, 80))
             progress_update.emit(80) # update progressBar
 
-            streets.round_streets()
-            progress_update.emit(90) # update progressBar
-            streets.add_bool_column() # possible routes
-
-            # save gdfs as instance attributes
-            self.buildings_gdf = buildings.gdf
-            self.streets_gdf = streets.gdf
-            self.parcels_gdf = parcels.gdf
+            # save streets as instance attribute
+            self.streets_gdf = self.adjust_street_layer(streets_path, label_update)
             progress_update.emit(95) # update progressBar
 
+            # set status for on_task_finished, only reached if the task was not cancelled
+            self.adjust_files_status = 'complete'
+
+    def adjust_street_layer(self, streets_path, label_update):
+        '''
+        Adjusts the streets and cleans their topology if selected in the dialog, see `src.stages.adjust_streets`.
+
+        Parameters
+        ----------
+        streets_path : str
+            The file path of the streets.
+        label_update : pyqtSignal
+            Signal to update the feedback label with the summary of the topology cleaning.
+
+        Returns
+        -------
+        GeoDataFrame
+            The adjusted streets.
+        '''
+        streets_gdf, self.topology_feedback = adjust_streets(streets_path, self.dlg.adjust_checkBox_clean_topology.isChecked())
+        if self.topology_feedback:
+            label_update.emit(self.topology_feedback, 'white')
+        return streets_gdf
+
     def status_analysis(self, progress_update, label_update):
         '''
          Perform a status analysis of building and street data, updating the GIS project with new attributes and geometries.
@@ -1117,8 +1188,8 @@ class HeatNetTool:
         1. **Progress Bar Initialization**:
         - Sets the initial value of the progress bar to indicate the start of the process.
 
-        2. **Layer Path Retrieval**:
-        - Retrieves paths and layer objects for streets, parcels, and buildings from the respective combo boxes in the user interface.
+        2. **Layer Retrieval**:
+        - Uses the snapshots of the streets, parcels, and buildings layers taken from the respective combo boxes in the main thread.
 
         3. **Attribute Selection**:
         - Retrieves the selected heat and thermal power attributes from the combo boxes.
@@ -1127,7 +1198,7 @@ class HeatNetTool:
         - Specifies the file path for saving the polygon data from a line edit field.
 
         5. **Geospatial Data Loading**:
-        - Reads the shapefiles for streets, parcels, and buildings into GeoDataFrames.
+        - Reads the streets, parcels, and buildings layers into GeoDataFrames, including unsaved edits.
 
         6. **Warmth Load Density (WLD) Calculation**:
         - Initializes a `WLD` object with the loaded buildings and streets.
@@ -1140,11 +1211,12 @@ class HeatNetTool:
 
         7. **Polygon Processing**:
         - Initializes a `Polygons` object with the parcels, updated streets, and buildings.
-        - Selects parcels based on their connection to buildings within a specified distance.
+        - Calculates the parcel-building coverage table once.
+        - Selects parcels for every WLD threshold of the lineEdit, starting with the highest threshold.
         - Applies a buffer, dissolve, and explode operation to refine the polygon geometries.
         - Adds the specified heat and thermal power attributes to the polygons.
-        - Saves the processed polygons to a shapefile.
-        - Adds the updated polygon layer to the GIS project with a specific style.
+        - Saves the processed polygons to one shapefile per threshold.
+        - Adds the updated polygon layers to the GIS project with a specific style.
 
         8. **Completion**:
         - Updates the progress bar to indicate the completion of the analysis.
@@ -1160,11 +1232,6 @@ class HeatNetTool:
         # feedback
         label_update.emit(self.tr('Calculating...'), 'white')
 
-        # layer from combo box
-        streets_path, streets_layer_name, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.status_comboBox_streets)
-        parcels_path, parcels_layer_name, parcels_layer_obj = self.get_layer_path_from_combobox(self.dlg.status_comboBox_parcels)
-        buildings_path, buildings_layer_name, buildings_layer_obj = self.get_layer_path_from_combobox(self.dlg.status_comboBox_buildings)
-        
         # attributes from layer
         heat_attribute = self.dlg.status_comboBox_heat.currentText()
         power_attribute = self.dlg.status_comboBox_power.currentText()
@@ -1184,47 +1251,118 @@ class HeatNetTool:
         # path from lineEdit
         polygon_path = self.dlg.status_lineEdit_polygons.text()
 
-        progress_update.emit(2) # update progressBar
+        # WLD thresholds from lineEdit, several thresholds create one layer per threshold
+        try:
+            wld_values = self.get_wld_values(self.dlg.status_lineEdit_thresholds.text())
+        except ValueError:
+            label_update.emit(self.tr('Please enter the WLD thresholds as numbers separated by semicolons.'),'orange')
+            return
 
-        # shapes to gdf
-        streets = gpd.read_file(streets_path)
-        parcels = gpd.read_file(parcels_path)
-        buildings = gpd.read_file(buildings_path)
+        progress_update.emit(2) # update progressBar
 
-        # HLD/WLD
-        wld = WLD(buildings,streets)
-        progress_update.emit(5) # update progressBar
-        wld.get_centroid()
-        progress_update.emit(20) # update progressBar
-        wld.closest_street_buildings()
-        progress_update.emit(30) # update progressBar
-        wld.add_lenght()
-        progress_update.emit(40) # update progressBar
-        wld.add_heat_att(heat_att=heat_attribute)
-        progress_update.emit(50) # update progressBar
-        wld.add_WLD(heat_att=heat_attribute)
-        progress_update.emit(60) # update progressBar
-        
-        # polygons
-        polygons = Polygons(parcels, wld.streets, buildings)
-        polygons.select_parcels_by_building_connection(0.1)
-        progress_update.emit(70) # update progressBar
-        polygons.buffer_dissolve_and_explode(0.5)
-        progress_update.emit(80) # update progressBar
-        polygons.add_attributes(heat_attribute, power_attribute)
+        # WLD of the streets and polygons of each threshold, the layers are read including unsaved edits
+        self.wld, polygons_dict = analyse_heat_density(self.layer_snapshots['status_comboBox_buildings'], self.layer_snapshots['status_comboBox_streets'],
+                                                       self.layer_snapshots['status_comboBox_parcels'], wld_values, heat_attribute, power_attribute,
+                                                       progress=self.task_progress(progress_update, 2, 90))
         progress_update.emit(90) # update progressBar
-        
-        # translate columns
-        wld.rename_columns()
-        polygons.rename_columns()
 
-        # save gdfs as instance attributes
-        self.wld = wld.streets
-        self.polygons = polygons.polygons
+        # save polygons with their paths as instance attribute
+        self.polygons = polygon_paths(polygon_path, polygons_dict)
 
         # Set status as complete
         self.status_analysis_status = 'complete'
     
+    def heat_map_preview(self, progress_update, label_update):
+        '''
+        Creates a grid based heat density preview of the selected buildings.
+
+        The heat demand and thermal power of the buildings are summed up per grid cell by the `HeatGrid` class.
+        Streets and parcels are not needed, so the preview is available for a whole municipality before the
+        parcel based status analysis is started. The grid is saved next to the heat density output with the suffix '_grid'.
+
+        Returns
+        -------
+        None
+        '''
+        progress_update.emit(0) # update progressBar
+        self.heat_map_preview_status = 0
+
+        # feedback
+        label_update.emit(self.tr('Calculating...'), 'white')
+
+        # attributes from layer
+        heat_attribute = self.dlg.status_comboBox_heat.currentText()
+        power_attribute = self.dlg.status_comboBox_power.currentText()
+
+        # check if attributes and paths are selected correctly
+        if heat_attribute == self.tr('Select Attribute'):
+            label_update.emit(self.tr('Please select an Attribute as heat demand.'),'orange')
+            return
+        if power_attribute == self.tr('Select Attribute'):
+            label_update.emit(self.tr('Please select an Attribute as thermal power.'),'orange')
+            return
+
+        if self.dlg.status_lineEdit_polygons.text().strip() == "":
+            label_update.emit(self.tr('Specify a file path for the heat density output'),'orange')
+            return
+
+        # path from lineEdit
+        root, ext = os.path.splitext(self.dlg.status_lineEdit_polygons.text())
+        self.heat_map_path = f'{root}_grid{ext}'
+
+        progress_update.emit(10) # update progressBar
+
+        buildings = read_layer(self.layer_snapshots['status_comboBox_buildings'], columns=[heat_attribute, power_attribute], where=f'"{heat_attribute}" > 0')
+
+        progress_update.emit(50) # update progressBar
+
+        # heat grid
+        grid = HeatGrid(buildings, self.dlg.status_spinBox_cell_size.value())
+        try:
+            grid.bin_buildings(heat_attribute, power_attribute)
+        except ValueError as e:
+            label_update.emit(str(e), 'orange')
+            return
+        progress_update.emit(80) # update progressBar
+
+        # save gdf as instance attribute
+        self.heat_map = grid.to_polygons()
+
+        # Set status as complete
+        self.heat_map_preview_status = 'complete'
+
+    def net_graph_key(self, stage_cache, heat_attribute):
+        '''
+        Returns the stage cache key of the buildings, sources and street graph of the network analysis.
+
+        The key covers the selected layers of buildings, source, streets and polygon, the content of their files
+        and the heat attribute, so the connection points and the graph are only computed again if one of them changes.
+        Layers with unsaved edits, subset filters or without file are not cached.
+
+        Parameters
+        ----------
+        stage_cache : StageCache
+            The cache of the intermediate results.
+        heat_attribute : str
+            The selected heat demand attribute.
+
+        Returns
+        -------
+        str or None
+            The key of the 'net_graph' stage, None if a layer is not cached.
+        '''
+        names = ['net_comboBox_buildings', 'net_comboBox_source', 'net_comboBox_streets']
+        if self.dlg.net_checkBox_polygon.isChecked():
+            names.append('net_comboBox_polygon')
+        paths, layer_names = [], []
+        for name in names:
+            snapshot = self.layer_snapshots[name]
+            if snapshot is None or snapshot.path is None:
+                return None
+            paths.append(snapshot.path)
+            layer_names.append(snapshot.layer_name)
+        return stage_cache.key('net_graph', paths, layers=layer_names, heat_attribute=heat_attribute)
+
     def network_analysis(self, progress_update, label_update):
         '''
         Conduct a network analysis for a district heating system, including setup, data loading,
@@ -1244,8 +1382,8 @@ class HeatNetTool:
         4. **Retrieve Temperatures**:
         - Retrieves supply and return temperatures from SpinBoxes in the user interface.
 
-        5. **Retrieve Layer Paths**:
-        - Retrieves the file paths and objects for source, streets, and buildings layers from combo boxes.
+        5. **Retrieve Layers**:
+        - Uses the snapshots of the source, streets, buildings and polygon layers taken from the combo boxes in the main thread.
 
         6. **Select Attributes**:
         - Retrieves the selected heat and power attributes from combo boxes.
@@ -1258,6 +1396,7 @@ class HeatNetTool:
 
         9. **Instantiate Classes**:
         - Creates instances of classes for buildings, source, and streets, loading the respective data.
+        - Steps 9 to 13 are skipped if the stage cache holds the connection points and the graph of unchanged inputs.
 
         10. **Polygon Filtering**:
             - If a polygon is selected, filters buildings to those within the polygon boundaries.
@@ -1283,6 +1422,7 @@ class HeatNetTool:
 
         16. **Network Analysis**:
             - Creates a `Net` object and performs a detailed network analysis, computing the optimal network for heat distribution based on the supply and return temperatures, pipe data, and building attributes.
+            - The routed net is loaded from the stage cache if the graph, the temperatures, the power attribute and the pipe data are unchanged.
 
         17. **GeoDataFrame Creation and Saving**:
             - Converts the graph to a GeoDataFrame with the computed network.
@@ -1320,11 +1460,7 @@ class HeatNetTool:
             self.dlg.net_label_response.repaint()
             return
 
-        # Layer paths
-        source_path, source_layer, source_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_source)
-        streets_path, streets_layer, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_streets)
-        buildings_path, buildings_layer, buildings_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_buildings)
-        
+        # Attributes
         heat_attribute = self.dlg.net_comboBox_heat.currentText()
         power_attribute = self.dlg.net_comboBox_power.currentText()
 
@@ -1342,124 +1478,66 @@ class HeatNetTool:
        
         progress_update.emit(2) # update progressBar
 
-        # Instantiate classes
-        buildings = Buildings(buildings_path, heat_attribute, buildings_layer)
-        source = Source(source_path, source_layer)
-        streets = Streets(streets_path, streets_layer)
-        
-        # check if polygon checkbox is checked
-        if self.dlg.net_checkBox_polygon.isChecked():
-            polygon_path, polygon_layer, polygon_layer_obj  = self.get_layer_path_from_combobox(self.dlg.net_comboBox_polygon)
-            # load polygon as gdf
-            if polygon_layer == None:
-                polygon = gpd.read_file(polygon_path)
-            else: 
-                polygon = gpd.read_file(polygon_path, layer=polygon_layer)
-
-            # only buildings within polygon
-            buildings.gdf = gpd.sjoin(buildings.gdf, polygon, how="inner", predicate="within")
-
-        # Drop unwanted routes if existing
-        try:
-            streets.gdf = streets.gdf[streets.gdf['Moegliche_Route']==1]
-        except:
-            pass
-
-        # Drop unconnected buildings if existing
-        try:
-            buildings.gdf = buildings.gdf[buildings.gdf['Anschluss']==1]
-        except:
-            pass
-
-        
-        progress_update.emit(5) # update progressBar
-
-        # create connection points
-        buildings.add_centroid()
-        buildings.closest_points_buildings(streets.gdf)
-        source.closest_points_sources(streets.gdf)
-        streets.add_connection_to_streets(buildings.gdf, source.gdf)
-        
-        progress_update.emit(15) # update progressBar
-
-        # Create graph
-        graph = Graph(crs=buildings.gdf.crs)
-        graph.create_street_network(streets.gdf)
-        graph.connect_centroids(buildings.gdf)
-        graph.connect_source(source.gdf)
-        graph.add_attribute_length()
+        # connection points and graph of unchanged inputs are loaded from the stage cache
+        stage_cache = StageCache(os.path.join(self.cache_dir, 'stages'))
+        graph_key = self.net_graph_key(stage_cache, heat_attribute)
+        polygon_layer = self.layer_snapshots['net_comboBox_polygon'] if self.dlg.net_checkBox_polygon.isChecked() else None
+        buildings_gdf, source_gdf, graph = net_graph(stage_cache, graph_key, self.layer_snapshots['net_comboBox_buildings'], self.layer_snapshots['net_comboBox_source'],
+                                                     self.layer_snapshots['net_comboBox_streets'], heat_attribute, polygon_layer,
+                                                     progress=self.task_progress(progress_update, 2, 25))
 
         progress_update.emit(25) # update progressBar
 
         # Test connection
-        start_point = (source.gdf['geometry'][0].x, source.gdf['geometry'][0].y)
-        connected_points = graph.get_connected_points(start_point)
-        all_points = list(graph.graph.nodes)
-        if start_point not in connected_points:
-            connected_points.append(start_point)
-        if len(all_points) > len(connected_points):
-            # get disconnected points
-            disconnected_points = [point for point in all_points if point not in connected_points and point != start_point]
-            # building centroids
-            building_centroids = [(centroid.x, centroid.y) for centroid in buildings.gdf['centroid']]
-            # check if building centroids are disconnected
-            disconnected_buildings = [centroid for centroid in building_centroids if centroid in disconnected_points]
-            if disconnected_buildings:
-                # feedback
-                label_update.emit(self.tr('Some Buildings are not connected to the street network! Please connect the nearest street to the street network by using the snapping tool or set the "Moegliche_Route/possoble_route"-attribute of their corresponding street to zero to connect them to another street.'), '#ff5555')
-                # save parameters as self attributes to plot in main thread
-                graph.start_point = start_point
-                graph.connected_points = connected_points
-                graph.disconnected_buildings = disconnected_buildings
-                self.graph = graph
-                self.network_analysis_status = 'plot'
-                return
+        start_point, connected_points, disconnected = disconnected_buildings(graph, buildings_gdf, source_gdf)
+        if disconnected:
+            # feedback
+            label_update.emit(self.tr('Some Buildings are not connected to the street network! Please connect the nearest street to the street network by using the snapping tool or set the "Moegliche_Route/possoble_route"-attribute of their corresponding street to zero to connect them to another street.'), '#ff5555')
+            # save parameters as self attributes to plot in main thread
+            graph.start_point = start_point
+            graph.connected_points = connected_points
+            graph.disconnected_buildings = disconnected
+            self.graph = graph
+            self.network_analysis_status = 'plot'
+            return
+
+        # # check if polygon is activated
+        # if self.dlg.net_checkBox_polygon.isChecked():
+        #     # check if disconnected points are inside the polygon
+        #     disconnected_points = [point for point in all_points if point not in connected_points and point != start_point]
+        #     #print( f'disconnected nodes: {len(disconnected_points)}')
+        #     #print(disconnected_points)
+        #     if any(polygon['geometry'][0].contains(Point(point)) for point in disconnected_points):
+        #         # feedback
+        #         label_update.emit('Some points of the street network in your area are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.','#ff5555')
+        #         # save parameters as self attributes to plot in main thread
+        #         graph.start_point = start_point
+        #         graph.connected_points = connected_points
+        #         self.graph = graph
+        #         self.network_analysis_status = 'plot'
+        #         return
+        # else:
             
-            # # check if polygon is activated
-            # if self.dlg.net_checkBox_polygon.isChecked():
-            #     # check if disconnected points are inside the polygon
-            #     disconnected_points = [point for point in all_points if point not in connected_points and point != start_point]
-            #     #print( f'disconnected nodes: {len(disconnected_points)}')
-            #     #print(disconnected_points)
-            #     if any(polygon['geometry'][0].contains(Point(point)) for point in disconnected_points):
-            #         # feedback
-            #         label_update.emit('Some points of the street network in your area are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.','#ff5555')
-            #         # save parameters as self attributes to plot in main thread
-            #         graph.start_point = start_point
-            #         graph.connected_points = connected_points
-            #         self.graph = graph
-            #         self.network_analysis_status = 'plot'
-            #         return
-            # else:
-                
-            #     #print( f'{len(disconnected_points)} disconnected nodes')
-            #     #print(disconnected_points)
-            #     # feedback
-            #     label_update.emit('Some points of the street network are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.', '#ff5555')
-            #     # save parameters as self attributes to plot in main thread
-            #     graph.start_point = start_point
-            #     graph.connected_points = connected_points
-            #     self.graph = graph
-            #     self.network_analysis_status = 'plot'
-            #     return
+        #     #print( f'{len(disconnected_points)} disconnected nodes')
+        #     #print(disconnected_points)
+        #     # feedback
+        #     label_update.emit('Some points of the street network are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.', '#ff5555')
+        #     # save parameters as self attributes to plot in main thread
+        #     graph.start_point = start_point
+        #     graph.connected_points = connected_points
+        #     self.graph = graph
+        #     self.network_analysis_status = 'plot'
+        #     return
 
         progress_update.emit(30) # update progressBar
 
         ### Net Analysis ###
-        net = Net(t_supply,t_return,crs=buildings.gdf.crs)
-        net.network_analysis(graph.graph, buildings.gdf, source.gdf, self.pipe_info, power_th_att=power_attribute, progressBar=self.dlg.net_progressBar)
-
-        progress_update.emit(70) # update progressBar
-
-        # GeoDataFrame from net
-        net.ensure_power_th_attribute()
-        net.graph_to_gdf()
-
-        # translate
-        net.rename_columns()
+        # the routed net of an unchanged graph, temperatures, power attribute and pipe catalog is loaded from the stage cache
+        net_gdf = route_net(stage_cache, graph_key, graph, buildings_gdf, source_gdf, self.pipe_info, t_supply, t_return, power_attribute,
+                            progress=self.task_progress(progress_update, 30, 95))
         
         # save net as instance attribute
-        self.net_gdf = net.gdf
+        self.net_gdf = net_gdf
 
         # set net status as completed
         self.network_analysis_status = 'complete'
@@ -1486,17 +1564,17 @@ class HeatNetTool:
         5. **Retrieve Temperature Values**:
         - Retrieves the supply and return temperatures from the user interface.
 
-        6. **Retrieve Layer Paths**:
-        - Gets file paths and objects for source, streets, and buildings layers from combo boxes.
+        6. **Retrieve Layers**:
+        - Uses the snapshots of the buildings and polygon layers taken from the combo boxes in the main thread.
 
         7. **Select Attributes**:
         - Retrieves selected heat and power attributes from the user interface.
 
         8. **Load Network Shapefile**:
-        - Loads the network data from the specified shapefile path.
+        - Loads the network data from the specified shapefile path, or from the stage cache if the file was written by the network analysis and is unchanged.
 
         9. **Instantiate Classes**:
-        - Creates instances of relevant classes for buildings, source, and streets.
+        - Takes the buildings of the network analysis from the stage cache or reads them from the buildings layer.
 
         10. **Polygon Filtering**:
             - If a polygon is selected, filters buildings to include only those within the polygon boundaries.
@@ -1548,18 +1626,11 @@ class HeatNetTool:
             label_update(self.tr('This QGIS project has no valid directory!\nPlease save the project.'), '#ff5555')
             return
 
-        # Load Profiles
-        load_profiles = ['EFH', 'MFH', 'GHA', 'GMK', 'GKO']
-
         # Temperatures from SpinBox
         t_supply = self.dlg.net_doubleSpinBox_supply.value()
         t_return = self.dlg.net_doubleSpinBox_return.value()
 
-        # Layer paths
-        source_path, source_layer, source_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_source)
-        streets_path, streets_layer, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_streets)
-        buildings_path, buildings_layer, buildings_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_buildings)
-        
+        # Attributes
         heat_attribute = self.dlg.net_comboBox_heat.currentText()
         power_attribute = self.dlg.net_comboBox_power.currentText()
 
@@ -1578,32 +1649,23 @@ class HeatNetTool:
             label_update.emit(self.tr('Specify a file path for the result file'),'orange')
             return
         
-        # net path
+        # net path, the net written by the network analysis is taken from the stage cache if the file is unchanged
+        stage_cache = StageCache(os.path.join(self.cache_dir, 'stages'))
         net_path = self.dlg.net_lineEdit_net.text()
-        net_gdf = gpd.read_file(net_path)
+        net_gdf = stage_cache.load('net_file', stage_cache.key('net_file', [net_path]))
+        if net_gdf is None:
+            net_gdf = gpd.read_file(net_path)
         
         # feedback
         label_update.emit(self.tr('Calculating...'), 'white')
 
-        # Instantiate classes
-        buildings = Buildings(buildings_path, heat_attribute, buildings_layer)
-        source = Source(source_path, source_layer)
-        streets = Streets(streets_path, streets_layer)
-
-        # filter buildings
-        buildings.gdf = buildings.gdf[buildings.gdf['Anschluss']==1]
-        
-        # check if polygon checkbox is checked
-        if self.dlg.net_checkBox_polygon.isChecked():
-            polygon_path, polygon_layer, polygon_layer_obj  = self.get_layer_path_from_combobox(self.dlg.net_comboBox_polygon)
-            # load polygon as gdf
-            if polygon_layer == None:
-                polygon = gpd.read_file(polygon_path)
-            else:
-                polygon = gpd.read_file(polygon_path, layer=polygon_layer)
-
-            # only buildings within polygon
-            buildings.gdf = gpd.sjoin(buildings.gdf, polygon, how="inner", predicate="within")
+        # buildings of the network analysis if the inputs are unchanged
+        graph_artifact = stage_cache.load('net_graph', self.net_graph_key(stage_cache, heat_attribute))
+        if graph_artifact is not None:
+            buildings_gdf = graph_artifact['buildings']
+        else:
+            polygon_layer = self.layer_snapshots['net_comboBox_polygon'] if self.dlg.net_checkBox_polygon.isChecked() else None
+            buildings_gdf = net_buildings(self.layer_snapshots['net_comboBox_buildings'], heat_attribute, polygon_layer).gdf
        
         progress_update.emit(10) # update progressBar
 
@@ -1617,95 +1679,10 @@ class HeatNetTool:
             self.worker_running = False # Reset worker_running
             return
 
-        result.create_data_dict(buildings.gdf, net_gdf, load_profiles, self.dn_list, heat_attribute, t_supply, t_return)
-        result.create_df_from_dataDict()
-        
-        progress_update.emit(15) # update progressBar
-
-        ### building statistic ###
-        statistic = result.building_statistic(buildings.gdf)
-        # save statistic as result attribute
-        result.statistic = statistic
-        
-        # save result as instance attribute
-        self.result = result
-        
-        progress_update.emit(20) # update progressBar
-
-        ### Load Curve ###
-
-        # set up time data
-        year = 2022
-        resolution = 8760
-        freq = 'H'
-
-        # Holidays
-        cal = Germany()
-        holidays = dict(cal.holidays(year))
-
-        # temperature
-        temperature_data = self.temp_profile['TT_TU']
-
-        # load_profile class
-        load_profile = LoadProfile(result.df, result_path, year, temperature_data, holidays)
-        
-        # dataframe for collecting generated profiles
-        demand = load_profile.set_up_df(year, resolution, freq)
-
-        progress_update.emit(30) # update progressBar
-
-        for row in load_profile.net_result.itertuples(index=False):
-            building_type = row.Lastprofil
-            building_class = 3 # Baualtersklasse NRW:3 Quelle:Praxisinformation P 2006 / 8 Gastransport / Betriebswirtschaft, BGW, 2006, Seite 43 Tabelle 2 und 3
-            if pd.isna(building_type):
-                break
-            elif building_type.lower() not in ('efh', 'mfh'):
-                building_class = 0
-            hd = row[2]
-            demand[building_type] = load_profile.create_heat_demand_profile(building_type, building_class, 0, 1, hd)
-
-        progress_update.emit(35) # update progressBar
-
-        # add sum column for all buildings
-        demand_with_sum_buildings = load_profile.add_sum_buildings(demand)
-
-        # add loss
-        demand_with_loss = load_profile.add_loss(demand_with_sum_buildings, load_profile.net_result, resolution)
-        
-        # add sum buildings+loss
-        demand_with_sum = load_profile.add_sum(demand_with_loss)
-
-        progress_update.emit(40) # update progressBar
-
-        # plot and save fig
-        load_profile.plot_bar_chart(demand_with_sum, column_names=['Gesamtsumme', 'Verlust'], filename = self.project_dir+'/Lastprofil.png')
-        progress_update.emit(50) # update progressBar
-        load_profile.plot_bar_chart(demand_with_sum, column_names=['Gesamtsumme (extra Dämmung)', 'Verlust'], colors=['green','orange'], filename = self.project_dir+'/Lastprofil_extra_Daemmung.png', ylabel='Wärmebedarf und Verlust bei extra Dämmung [MW]', title='Wärmebedarf und Verlust bei extra Dämmung pro Stunde im Jahr')
-
-        progress_update.emit(60) # update progressBar
-
-        # order
-        sorted_demand = demand_with_sum.sort_values(by='Gesamtsumme', ascending=False)
-
-        # plot and save fig
-        load_profile.plot_bar_chart(sorted_demand, column_names=['Gesamtsumme', 'Verlust'], filename = self.project_dir+'/Lastprofil_geordnet.png', title='Geordnetes Lastprofil')
-
-        progress_update.emit(70) # update progressBar
-
-        # order extra insulation
-        sorted_demand = demand_with_sum.sort_values(by='Gesamtsumme (extra Dämmung)', ascending=False)
-
-        # plot and save fig extra insulation
-        load_profile.plot_bar_chart(sorted_demand, column_names=['Gesamtsumme (extra Dämmung)', 'Verlust'], colors=['green','orange'], filename = self.project_dir+'/Lastprofil_extra_Daemmung_geordnet.png', ylabel='Wärmebedarf und Verlust bei extra Dämmung [MW]', title='Geordnetes Lastprofil (extra Dämmung)')
-
-        progress_update.emit(80) # update progressBar
-
-        # round columns of demand dataframe
-        demand_with_sum = demand_with_sum.round(decimals=3)
-
-        # Save load_profile as instance attribute
-        load_profile.demand_with_sum = demand_with_sum
-        self.load_profile = load_profile
+        # result tables, building statistic and load profile, the plots are saved in the project directory
+        self.result, self.load_profile = create_result(buildings_gdf, net_gdf, result_path, self.pipe_info, heat_attribute, t_supply, t_return,
+                                                       self.temp_profile['TT_TU'], self.project_dir, building_class=self.building_class,
+                                                       progress=self.task_progress(progress_update, 10, 90))
 
         self.result_status = 'complete'
 
@@ -1739,7 +1716,7 @@ class HeatNetTool:
         '''
         # Chek if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         
         gui_elements = {
@@ -1782,7 +1759,7 @@ class HeatNetTool:
     def start_download_zensus(self):
         # check if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         # define GUI elements
         gui_elements = {
@@ -1816,13 +1793,13 @@ class HeatNetTool:
     def start_adjust_files(self):
         # check if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         
         # import building_info ### Excel files have to be imported in main thread. Imports in background lead to a crasg because of windows acces violation
         excel_path = self.plugin_dir+'/data/building_info.xlsx'
-        self.excel_building_info = pd.read_excel(excel_path, sheet_name='database')
-        self.excel_building_demand_wg = pd.read_excel(excel_path, sheet_name='Grunddaten_Gebaeude', nrows=13, usecols='A:D')
+        self.excel_building_info = load_excel(excel_path, sheet_name='database', cache_dir=self.cache_dir)
+        self.excel_building_demand_wg = load_excel(excel_path, sheet_name='Grunddaten_Gebaeude', nrows=13, usecols='A:D', cache_dir=self.cache_dir)
 
         # define GUI elements
         gui_elements = {
@@ -1834,8 +1811,8 @@ class HeatNetTool:
             # Reset worker_running
             self.worker_running = False
             
-            # check if the backround task is complete
-            if self.bool_files_already_adjusted == False:
+            # check if the backround task is complete, a cancelled task leaves the layers untouched
+            if self.adjust_files_status == 'complete':
                 # get paths from layers
                 streets_path, streets_layer_name, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_streets)
                 buildings_path, buildings_layer_name, buildings_layer_obj = self.get_layer_path_from_combobox(self.dlg.adjust_comboBox_buildings)
@@ -1845,8 +1822,9 @@ class HeatNetTool:
                     buildings_path = self.dlg.adjust_lineEdit_buildings.text()
                     streets_path = self.dlg.adjust_lineEdit_streets.text()
 
-                # save shapes
-                self.buildings_gdf.to_file(buildings_path)
+                # save shapes, buildings adjusted in tiles are already saved by the background task
+                if self.buildings_tiles_path is None:
+                    self.buildings_gdf.to_file(buildings_path)
                 self.streets_gdf.to_file(streets_path)
 
                 # check if files are overwritten or newly created
@@ -1862,7 +1840,7 @@ class HeatNetTool:
                 self.dlg.adjust_progressBar.setValue(100) # update progressBar
 
                 self.dlg.adjust_label_feedback.setStyleSheet("color: rgb(0, 255, 0)")
-                self.dlg.adjust_label_feedback.setText(self.tr('Completed!'))
+                self.dlg.adjust_label_feedback.setText(' '.join(filter(None, [self.tr('Completed!'), self.topology_feedback])))
                 self.dlg.adjust_label_feedback.repaint()
             
         self.worker_running = True
@@ -1871,7 +1849,7 @@ class HeatNetTool:
     def start_status_analysis(self):
         # check if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         # define GUI elements
         gui_elements = {
@@ -1888,29 +1866,63 @@ class HeatNetTool:
                 # layer from combo box
                 streets_path, streets_layer_name, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.status_comboBox_streets)
                 
-                # path from lineEdit
-                polygon_path = self.dlg.status_lineEdit_polygons.text()
-
                 # save shapefiles
                 self.wld.to_file(streets_path)
-                self.polygons.to_file(polygon_path)
+                for polygon_path, polygons in self.polygons.items():
+                    polygons.to_file(polygon_path)
 
                 # add shapefiles to project
                 self.add_shapefile_to_project(streets_path, 'wld', self.tr('Heat Density'))
-                self.add_shapefile_to_project(polygon_path, 'polygons', self.tr('Heat Density'))
+                for polygon_path in self.polygons:
+                    self.add_shapefile_to_project(polygon_path, 'polygons', self.tr('Heat Density'))
 
                 # update progressBar
                 self.dlg.status_progressBar.setValue(100)
                 self.dlg.status_label_response.setStyleSheet("color: rgb(0, 255, 0)")
                 self.dlg.status_label_response.setText(self.tr('Completed!'))
 
+        # layers are read in the background task from snapshots taken in the main thread
+        self.layer_snapshots = self.get_layer_snapshots(self.dlg.status_comboBox_streets, self.dlg.status_comboBox_parcels, self.dlg.status_comboBox_buildings)
         self.worker_running = True
         self.run_long_task(self.status_analysis, gui_elements, on_task_finished)
     
+    def start_heat_map_preview(self):
+        # check if another process is already running
+        if self.worker_running == True:
+            self.cancel_running_task()
+            return
+        # define GUI elements
+        gui_elements = {
+            'progressBar': self.dlg.status_progressBar, # progress bar 
+            'label': self.dlg.status_label_response   # feedback label
+        }
+        def on_task_finished():
+            '''function that is executed, once the background task is complete'''
+            # Reset worker_running
+            self.worker_running = False
+            
+            # check if the backround task is complete
+            if self.heat_map_preview_status == 'complete':
+                # save shapefile
+                self.heat_map.to_file(self.heat_map_path)
+
+                # add shapefile to project
+                self.add_shapefile_to_project(self.heat_map_path, 'polygons', self.tr('Heat Density'))
+
+                # update progressBar
+                self.dlg.status_progressBar.setValue(100)
+                self.dlg.status_label_response.setStyleSheet("color: rgb(0, 255, 0)")
+                self.dlg.status_label_response.setText(self.tr('Completed!'))
+
+        # layers are read in the background task from snapshots taken in the main thread
+        self.layer_snapshots = self.get_layer_snapshots(self.dlg.status_comboBox_buildings)
+        self.worker_running = True
+        self.run_long_task(self.heat_map_preview, gui_elements, on_task_finished)
+
     def start_network_analysis(self):
         # check if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         
         # define GUI elements
@@ -1921,7 +1933,7 @@ class HeatNetTool:
 
         # pipe info
         excel_file_path = Path(self.plugin_dir) / 'data/pipe_data.xlsx'
-        self.pipe_info = pd.read_excel(excel_file_path, sheet_name='pipe_data')
+        self.pipe_info = load_excel(excel_file_path, sheet_name='pipe_data', cache_dir=self.cache_dir)
 
         def on_task_finished():
             '''function that is executed, once the background task is complete'''
@@ -1933,8 +1945,8 @@ class HeatNetTool:
                 # path to save net shape file
                 net_path = self.dlg.net_lineEdit_net.text()
 
-                # save net shapefile
-                self.net_gdf.to_file(net_path)
+                # save net shapefile and remember the written net for the result
+                save_net(self.net_gdf, net_path, StageCache(os.path.join(self.cache_dir, 'stages')))
 
                 # load net as layer
                 self.add_shapefile_to_project(net_path, 'net', group_name = self.tr('Net'))
@@ -1948,6 +1960,8 @@ class HeatNetTool:
             elif self.network_analysis_status == 'plot':
                 self.graph.plot_graph(self.graph.start_point, self.graph.connected_points, self.graph.disconnected_buildings)
             return
+        # layers are read in the background task from snapshots taken in the main thread
+        self.layer_snapshots = self.get_layer_snapshots(self.dlg.net_comboBox_buildings, self.dlg.net_comboBox_source, self.dlg.net_comboBox_streets, self.dlg.net_comboBox_polygon)
         self.worker_running = True
         self.run_long_task(self.network_analysis, gui_elements, on_task_finished)
     
@@ -1955,7 +1969,7 @@ class HeatNetTool:
         
         # check if another process is already running
         if self.worker_running == True:
-            QMessageBox.warning(self.dlg, self.tr('Warning'), self.tr('A process is already running. Please wait for completion to start a new process.'))
+            self.cancel_running_task()
             return
         
         # define GUI elements
@@ -1965,8 +1979,10 @@ class HeatNetTool:
         }
         # pipe info
         excel_file_path = Path(self.plugin_dir) / 'data/pipe_data.xlsx'
-        self.pipe_info = pd.read_excel(excel_file_path, sheet_name='pipe_data')
-        self.dn_list = self.pipe_info['DN'].to_list()
+        self.pipe_info = load_excel(excel_file_path, sheet_name='pipe_data', cache_dir=self.cache_dir)
+
+        # building age class of the load profiles of residential buildings
+        self.building_class = QSettings().value('fheat/building_class', BUILDING_CLASS, type=int)
 
         # temperature
         if self.dlg.net_checkBox_temperature.isChecked():
@@ -1980,7 +1996,7 @@ class HeatNetTool:
                 return
         else:
             temp_path = Path(self.plugin_dir) / 'data/example_temperature.xlsx'
-        self.temp_profile = pd.read_excel(temp_path)
+        self.temp_profile = load_excel(temp_path, cache_dir=self.cache_dir)
 
         def on_task_finished():
             '''function that is executed, once the background task is complete'''
@@ -1989,38 +2005,11 @@ class HeatNetTool:
 
             if self.result_status == 'complete':
 
-                result = self.result
-
-                # Copy result file to user path
-                costs_path = Path(self.plugin_dir) / 'data/result.xlsx'
-                result.copy_excel_file(costs_path)
-
-                # Save result
-                result.save_in_excel(result_table = result.df)
-
-                # Save Statistic
-                result.save_in_excel(result_table = result.statistic, sheet = 'Statistik')
-                
-                # get load_profile from instance attributes
-                load_profile = self.load_profile
-
-                # save demand profile in excel
-                load_profile.save_in_excel(load_profile.demand_with_sum, index_bool=True)
-
-                # save load curve plot in excel
-                load_profile.embed_image_in_excel(0,load_profile.demand_with_sum.shape[1]+1, image_filename = self.project_dir+'/Lastprofil.png')
-
-                # save sorted load curve plot in excel
-                load_profile.embed_image_in_excel(22,load_profile.demand_with_sum.shape[1]+1, image_filename = self.project_dir+'/Lastprofil_geordnet.png')
-
-                # save load curve plot in excel extra insulation
-                load_profile.embed_image_in_excel(44,load_profile.demand_with_sum.shape[1]+1, image_filename = self.project_dir+'/Lastprofil_extra_Daemmung.png')
-
-                # save sorted load curve plot in excel extra insulation
-                load_profile.embed_image_in_excel(66,load_profile.demand_with_sum.shape[1]+1, image_filename = self.project_dir+'/Lastprofil_extra_Daemmung_geordnet.png')
+                # save result, statistic, load profile and plots in the result file
+                save_result(self.result, self.load_profile, Path(self.plugin_dir) / 'data/result.xlsx', self.project_dir)
 
                 # open result
-                load_profile.open_excel_file()
+                self.load_profile.open_excel_file()
 
                 # update progressBar
                 self.dlg.net_progressBar.setValue(100)
@@ -2029,6 +2018,8 @@ class HeatNetTool:
                 self.dlg.net_label_response.setStyleSheet("color: rgb(0, 255, 0)")
                 self.dlg.net_label_response.repaint()
         
+        # layers are read in the background task from snapshots taken in the main thread
+        self.layer_snapshots = self.get_layer_snapshots(self.dlg.net_comboBox_buildings, self.dlg.net_comboBox_source, self.dlg.net_comboBox_streets, self.dlg.net_comboBox_polygon)
         self.worker_running = True
         self.run_long_task(self.create_result, gui_elements, on_task_finished)
 
@@ -2051,9 +2042,15 @@ class HeatNetTool:
                 import pandas as pd
                 import geopandas as gpd
                 from shapely import Point
-                from .src.download_files import file_list_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, filter_df, get_shape_from_wfs, clean_data, add_point, create_square, get_area_for_zensus
-                from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
-                from .src.status_analysis import WLD, Polygons
+                from .src.download_files import file_catalog_from_URL_QGIS, search_filename, read_file_from_zip_QGIS, read_csv_region_from_zip_QGIS, filter_df, get_shape_from_wfs, get_shapes_from_wfs, select_by_parcels, repair_geometries, combine_zensus, get_area_for_zensus
+                from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join, zensus_join, adjust_buildings_tiled, copy_layer
+                from .src.read_files import read_layer, layer_columns
+                from .src.qgis_layers import LayerSnapshot
+                from .src.reference_data import load_excel, load_cities
+                from .src.stage_cache import StageCache
+                from .src.stages import (BAK_BINS, BAK_LABELS, BUILDING_CLASS, download_layers, download_zensus_grid, adjust_buildings, adjust_streets,
+                                         analyse_heat_density, polygon_paths, net_graph, disconnected_buildings, route_net, net_buildings, save_net, create_result, save_result)
+                from .src.status_analysis import WLD, Polygons, HeatGrid
                 from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
                 from .src.load_curve import Temperature, LoadProfile
                 from workalendar.europe import Germany
@@ -2105,6 +2102,9 @@ class HeatNetTool:
             self.dlg.adjust_pushButton_streets.clicked.connect(
                 lambda: self.select_output_file(self.project_dir, self.dlg.adjust_lineEdit_streets,'*.gpkg;;*.shp'))
             
+            # optional zensus layer
+            self.dlg.adjust_comboBox_zensus.setLayer(None)
+
             # Start Adjust Files 
             # self.dlg.adjust_pushButton_start.clicked.connect(self.adjust_files_alt) # main thread
             self.dlg.adjust_pushButton_start.clicked.connect(self.start_adjust_files) # background thread
@@ -2118,6 +2118,9 @@ class HeatNetTool:
             # start status analysis
             self.dlg.status_pushButton_start.clicked.connect(self.start_status_analysis)
 
+            # start heat map preview
+            self.dlg.status_pushButton_preview.clicked.connect(self.start_heat_map_preview)
+
             ### Net ###
 
             # select output file
@@ -1,9 +1,14 @@
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import LineString,MultiLineString
+import shapely
 import re
-from collections import Counter
 import numpy as np
+from functools import partial
+try:
+    from .read_files import read_layer, layer_columns, layer_bounds
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from read_files import read_layer, layer_columns, layer_bounds
 
 class Streets_adj():
     '''
@@ -20,7 +25,10 @@ class Streets_adj():
     Methods
     -------
     round_streets():
-        Rounds the coordinates of street geometries to 3 decimal places.
+        Splits MultiLineStrings and rounds the coordinates of street geometries to 3 decimal places.
+
+    clean_topology(tolerance, grid_size):
+        Snaps close endpoints, nodes crossing streets and merges duplicate segments.
         
     add_bool_column():
         Adds a boolean column indicating possible routes.
@@ -34,73 +42,160 @@ class Streets_adj():
         ----------
         path : str
             The file path to the shapefile containing the street geometries.
+
+        Notes
+        -----
+        All attributes are read, because the adjusted streets are saved with their original attributes.
         '''
-        self.gdf = gpd.read_file(path)
+        self.gdf = read_layer(path)
         
     def round_streets(self):
         '''
         Rounds the coordinates of street geometries to 3 decimal places.
 
-        This method processes the geometries in the GeoDataFrame, converting any MultiLineString geometries
-        to LineString geometries, and then rounds their coordinates to 3 decimal places.
+        This method explodes MultiLineString geometries into their LineString parts and then rounds the 
+        coordinates of all geometries in one vectorized step.
 
         Notes
         -----
-        - If any MultiLineString geometries are found, they are converted to LineString geometries by taking
-          the first component of the MultiLineString.
-        - A warning is printed if any MultiLineString geometries are found and processed.
+        - Every part of a MultiLineString becomes a separate street, so no part of the street network gets lost.
+        - A message is printed if any MultiLineString geometries are found and processed.
         '''
-        # Helper functions
-        def convert_multilinestring_to_linestring(geometry, x):
-            '''
-            Converts a MultiLineString geometry to a LineString geometry.
-
-            Parameters
-            ----------
-            geometry : shapely.geometry.MultiLineString or shapely.geometry.LineString
-                The geometry to be converted.
-            x : int
-                A counter for tracking the number of MultiLineString geometries found.
-
-            Returns
-            -------
-            shapely.geometry.LineString
-                The converted LineString geometry.
-            int
-                The updated counter.
-            '''
-            if isinstance(geometry, MultiLineString):
-                x += 1
-                return LineString(list(geometry.geoms)[0].coords), x
-            else:
-                return geometry, x
-
-        def round_coordinates(line):
-            '''
-            Rounds the coordinates of a LineString geometry to 3 decimal places.
-
-            Parameters
-            ----------
-            line : shapely.geometry.LineString
-                The LineString geometry to be rounded.
-
-            Returns
-            -------
-            shapely.geometry.LineString
-                The rounded LineString geometry.
-            '''
-            rounded_coords = [(round(x, 3), round(y, 3)) for x, y in line.coords]
-            return LineString(rounded_coords)
-
         streets = self.gdf
-        x = 0
-        streets['geometry'], x = zip(*streets['geometry'].apply(lambda geom: convert_multilinestring_to_linestring(geom, x)))
-        streets['geometry'] = streets['geometry'].apply(round_coordinates)
-        
-        if max(x) > 0:
-            print('At least one street geometry is a MultiLineString! Continuing with the first LineString as the street. Check the street geometry if necessary.')
+        n_multi = (streets.geom_type == 'MultiLineString').sum()
+
+        # MultiLineStrings to separate LineStrings
+        streets = streets.explode(index_parts=False).reset_index(drop=True)
+
+        # round all coordinates at once
+        geometries = streets.geometry.to_numpy().copy()
+        coordinates = shapely.get_coordinates(geometries)
+        rounded = np.round(coordinates, 3)
+        # np.round scales the values and rounds halves to even, values close to a half are rounded
+        # with round() as before, which rounds the exact binary value
+        scaled = coordinates * 1000
+        half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        rounded[half] = [round(float(value), 3) for value in coordinates[half]]
+        streets['geometry'] = shapely.set_coordinates(geometries, rounded)
+
+        if n_multi > 0:
+            print(f'{n_multi} street geometries are MultiLineStrings! They were split into separate LineStrings. Check the street geometry if necessary.')
         self.gdf = streets 
     
+    def clean_topology(self, tolerance=0.5, grid_size=0.001):
+        '''
+        Cleans the topology of the street network before the graph is built.
+
+        The graph of the network analysis only connects streets that share exactly the same coordinates. This
+        method therefore closes small gaps and splits crossing streets, so that the street network is connected.
+
+        1. Endpoints of different streets within `tolerance` are snapped onto one endpoint of their cluster.
+           Junctions, i.e. endpoints shared by most streets, are kept in place and dangling ends are moved.
+        2. Remaining dead ends within `tolerance` of another street are snapped onto this street.
+        3. All streets are noded at crossings and snapped endpoints, and duplicate segments are merged.
+
+        The attributes of each new street segment are taken from the original street it lies on. A summary of
+        the changes is stored in `topology_report`.
+
+        Parameters
+        ----------
+        tolerance : float, optional
+            Maximum distance in meters for snapping endpoints (default is 0.5).
+        grid_size : float, optional
+            Precision grid of the noding in meters (default is 0.001, the rounding of `round_streets`).
+
+        Returns
+        -------
+        str
+            A summary of the changes for the feedback of the user.
+        '''
+        streets = self.gdf.explode(index_parts=False).reset_index(drop=True)
+        streets = streets[~streets.geometry.is_empty].reset_index(drop=True)
+        lines = streets.geometry.to_numpy().copy()
+        n_lines = len(lines)
+        length_before = shapely.length(lines).sum()
+
+        # Endpoints of all streets: first n_lines are start points, last n_lines are end points
+        coordinates, line_index = shapely.get_coordinates(lines, return_index=True)
+        first = np.searchsorted(line_index, np.arange(n_lines), side='left')
+        last = np.searchsorted(line_index, np.arange(n_lines), side='right') - 1
+        endpoint_position = np.concatenate([first, last])
+        endpoint_line = np.concatenate([np.arange(n_lines), np.arange(n_lines)])
+        endpoints = shapely.points(coordinates[endpoint_position])
+
+        # 1. Cluster endpoints of different streets within the tolerance
+        endpoint_tree = shapely.STRtree(endpoints)
+        i, j = endpoint_tree.query(endpoints, predicate='dwithin', distance=tolerance)
+        mask = endpoint_line[i] != endpoint_line[j]
+        i, j = i[mask], j[mask]
+
+        # label propagation: every endpoint gets the smallest index of its cluster
+        labels = np.arange(len(endpoints))
+        while len(i) > 0:
+            new_labels = labels.copy()
+            np.minimum.at(new_labels, i, labels[j])
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+        # target of each cluster: the endpoint shared by most streets, i.e. an existing junction
+        endpoint_coordinates = coordinates[endpoint_position]
+        count = np.bincount(labels, minlength=len(endpoints))
+        _, node, degree = np.unique(endpoint_coordinates, axis=0, return_inverse=True, return_counts=True)
+        order = np.lexsort((np.arange(len(endpoints)), -degree[node.ravel()], labels))
+        first_of_cluster = np.concatenate([[True], labels[order][1:] != labels[order][:-1]]) if len(order) else np.zeros(0, dtype=bool)
+        target = np.arange(len(endpoints))
+        target[labels[order][first_of_cluster]] = order[first_of_cluster]
+        snapped = endpoint_coordinates[target[labels]]
+        n_snapped_endpoints = int((np.abs(snapped - endpoint_coordinates).max(axis=1) > 0).sum())
+
+        # write snapped endpoints back to the lines
+        coordinates[endpoint_position] = snapped
+        lines = shapely.set_coordinates(lines, coordinates)
+        endpoints = shapely.points(snapped)
+
+        # 2. Snap dead ends onto the closest other street
+        dead_end = count[labels] == 1
+        line_tree = shapely.STRtree(lines)
+        points, candidates = line_tree.query(endpoints[dead_end], predicate='dwithin', distance=tolerance)
+        dead_end_index = np.flatnonzero(dead_end)[points]
+        mask = endpoint_line[dead_end_index] != candidates
+        dead_end_index, candidates = dead_end_index[mask], candidates[mask]
+        distance = shapely.distance(endpoints[dead_end_index], lines[candidates])
+        order = np.lexsort((distance, dead_end_index))
+        dead_end_index, candidates = dead_end_index[order], candidates[order]
+        unique = np.concatenate([[True], dead_end_index[1:] != dead_end_index[:-1]]) if len(order) else np.zeros(0, dtype=bool)
+        dead_end_index, candidates = dead_end_index[unique], candidates[unique]
+        projected = shapely.line_interpolate_point(
+            lines[candidates], shapely.line_locate_point(lines[candidates], endpoints[dead_end_index]))
+        snapped[dead_end_index] = shapely.get_coordinates(projected)
+        n_snapped_to_lines = len(dead_end_index)
+
+        # write snapped dead ends back to the lines
+        coordinates[endpoint_position] = snapped
+        lines = shapely.set_coordinates(lines, coordinates)
+
+        # 3. Node all streets and merge duplicate segments
+        noded = shapely.get_parts(shapely.union_all(lines, grid_size=grid_size))
+        noded = noded[shapely.get_type_id(noded) == 1] # only LineStrings
+        length_after = shapely.length(noded).sum()
+
+        # attributes of the original street each segment lies on
+        midpoints = shapely.line_interpolate_point(noded, 0.5, normalized=True)
+        segment_index, original_index = shapely.STRtree(lines).query_nearest(midpoints, all_matches=False)
+        cleaned = streets.drop(columns=streets.geometry.name).iloc[original_index].reset_index(drop=True)
+        cleaned = gpd.GeoDataFrame(cleaned, geometry=noded[segment_index], crs=streets.crs)
+
+        self.topology_report = {
+            'snapped_endpoints': n_snapped_endpoints,
+            'snapped_to_streets': n_snapped_to_lines,
+            'streets_before': n_lines,
+            'streets_after': len(cleaned),
+            'removed_duplicate_length [m]': max(length_before - length_after, 0.0)
+        }
+        self.gdf = cleaned
+        return 'Street topology cleaned: ' + ', '.join(f'{key}: {value:g}' for key, value in self.topology_report.items())
+
     def add_bool_column(self):
         '''
         Adds a boolean column to the GeoDataFrame indicating possible routes.
@@ -123,6 +218,10 @@ class Buildings_adj():
         A GeoDataFrame containing building geometries and associated attributes.
     heat_att : str
         The attribute name for heat data in the GeoDataFrame.
+    columns : list of str
+        The attributes read from the building file, used by the methods of this class.
+    text_columns : list of str
+        The text attributes of the adjusted buildings, see `rename_and_order_columns`.
 
     Methods
     -------
@@ -150,7 +249,11 @@ class Buildings_adj():
     add_custom_heat_demand(building_data):
         Adds custom heat demand data to the existing GeoDataFrame based on building characteristics.
     '''
-    def __init__(self, path, heat_att):
+    columns = ['Flurstueck', 'citygml_fu', 'Fortschrei', 'GEBAEUDETY', 'WG_NWG', 'Fest_ID', 'Nutzung',
+               'NF', 'RW', 'WW', 'RW_WW', 'RW_spez', 'WW_spez', 'RW_WW_spez']
+    text_columns = ['Funktion', 'Nutzung', 'typ', 'Lastprofil', 'Alter_LANUV', 'Alter_Flurstueck', 'BAK nach Flurstueck']
+
+    def __init__(self, path, heat_att, bbox=None):
         '''
          Initializes the Buildings_adj class with a GeoDataFrame of building geometries and attributes.
 
@@ -160,8 +263,17 @@ class Buildings_adj():
             The file path to the shapefile containing the building geometries.
         heat_att : str
             The attribute name for heat data.
+        bbox : tuple of float, optional
+            Only buildings intersecting this bounding box (minx, miny, maxx, maxy) are read (default is None).
+
+        Notes
+        -----
+        Only the attributes in `columns` and the heat attribute are read. If the heat attribute exists, only
+        buildings with a heat demand greater than zero are read. 'Leistung_th [kW]' is read to recognize
+        buildings that have already been adjusted.
         '''
-        self.gdf = gpd.read_file(path)
+        where = f'"{heat_att}" > 0' if heat_att in layer_columns(path) else None
+        self.gdf = read_layer(path, columns=self.columns + [heat_att, 'Leistung_th [kW]'], where=where, bbox=bbox)
         self.heat_att = heat_att
 
     def add_Vlh_Loadprofile(self, excel_data):
@@ -177,7 +289,7 @@ class Buildings_adj():
             A DataFrame containing the load profile data with 'Funktion', 'Lastprofil', and 'Vlh' columns.
         '''
         buildings = self.gdf
-        excel_data['Funktion'] = excel_data['Funktion'].astype(str)
+        excel_data = excel_data.assign(Funktion=excel_data['Funktion'].astype(str))
         buildings['GFK_last_four'] = buildings['citygml_fu'].str[-4:]
         buildings = buildings.merge(excel_data[['Funktion', 'Lastprofil', 'Vlh']], left_on='GFK_last_four', right_on='Funktion', how='left')
 
@@ -255,7 +367,8 @@ class Buildings_adj():
         Adds building age classification based on the provided bins and labels.
 
         This method classifies buildings into age groups based on the 'validFrom' attribute using the
-        provided bins and labels.
+        provided bins and labels. The years are parsed for all buildings at once and the age classes are
+        stored as categorical, so later merges on 'BAK' use the integer codes.
 
         Parameters
         ----------
@@ -270,11 +383,10 @@ class Buildings_adj():
         >>> labels = ["1800-1899", "1900-1949", "1950-1999", "2000-2024"]
         '''
         # Convert the validFrom attribute to year
-        self.gdf['jahr'] = self.gdf['validFrom'].apply(self.extract_year)
+        self.gdf['jahr'] = pd.to_numeric(self.gdf['validFrom'].astype('string').str[:4], errors='coerce')
 
-        # Classify buildings into age groups (Baualtersklassen BAK)
+        # Classify buildings into age groups (Baualtersklassen BAK), stored as categorical
         self.gdf['BAK'] = pd.cut(self.gdf['jahr'], bins=bins, labels=labels, right=True)
-        self.gdf['BAK'] = self.gdf['BAK'].astype(str)
         self.gdf.drop(columns=['jahr'], inplace = True)
 
     def add_LANUV_age_and_type(self):
@@ -290,128 +402,48 @@ class Buildings_adj():
         '''
         Merges building geometries and attributes, performing custom aggregations.
 
-        This method dissolves the building geometries based on 'Flurstueck', 'citygml_fu', and 'Fortschrei'
-        attributes and performs custom aggregations on the attributes.
-        '''
+        This method merges the buildings based on 'Flurstueck', 'citygml_fu', 'Fortschrei' and 'type' attributes.
+        All aggregations are done column-wise for all groups at once:
 
-        # Aggregation functions
-        def custom_agg_mix_str(s):
-            '''
-            Aggregates string attributes by returning the unique value or 'mix' if there are multiple unique values.
-
-            Parameters
-            ----------
-            s : Series
-                The series to aggregate.
-
-            Returns
-            -------
-            str
-                The aggregated value.
-            '''
-            unique_vals = s.unique()
-            if len(unique_vals) == 1:
-                return unique_vals[0]
-            else:
-                return 'mix'
-            
-        def custom_agg_mix_numeric(s):
-            '''
-            Aggregates numeric attributes by returning the unique value or None if there are multiple unique values.
-
-            Parameters
-            ----------
-            s : Series
-                The series to aggregate.
-
-            Returns
-            -------
-            int, float, or None
-                The aggregated value.
-            '''
-            unique_vals = s.unique()
-            if len(unique_vals) == 1:
-                return unique_vals[0]
-            else:
-                return None 
-            
-        def custom_agg_most_common(s):
-            '''
-            Aggregates by returning the most common value.
-
-            Parameters
-            ----------
-            s : Series
-                The series to aggregate.
-
-            Returns
-            -------
-            int, float, or str
-                The most common value.
-            '''
-            most_common = s.mode()
-            if len(most_common) > 0:
-                return most_common.iloc[0]
-            else:
-                return s.iloc[0]  # Fallback if no mode is found (should not occur in practice)
-
-        def mode_or_string(x):
-            ''' 
-            Aggregates by returning the most common value or a comma-separated string if there are ties.
-
-            Parameters
-            ----------
-            x : Series
-                The series to aggregate.
-
-            Returns
-            -------
-            str
-                The aggregated value.
-            '''
-            counts = Counter(x)
-            max_count = max(counts.values())
-            max_list = [val for val, count in counts.items() if count == max_count]
-            if len(max_list) == 1:
-                return str(max_list[0])
-            else:
-                sorted_list = sorted(max_list)
-                return ', '.join(map(str, sorted_list))
-            
-        def weighted_average(s, weights):
-            '''
-            Calculates the weighted average.
-
-            Parameters
-            ----------
-            s : Series
-                Series of values (e.g., RW_spez).
-            weights : Series
-                Series of weights (e.g., NF).
-
-            Returns
-            -------
-            float
-                The weighted average.
-            '''
-            return (s * weights).sum() / weights.sum()
-           
-        grouped_gdf = self.gdf.dissolve(
-            by=['Flurstueck', 'citygml_fu', 'Fortschrei', 'type'], 
-            as_index=False, 
-            aggfunc={
-            'Fest_ID': 'first', 
-            'Nutzung': 'first', 
-            'NF': 'sum', 
-            'RW_spez': lambda x: weighted_average(x, self.gdf.loc[x.index, 'NF']),
-            'RW': 'sum',
-            'WW_spez': lambda x: weighted_average(x, self.gdf.loc[x.index, 'NF']),
-            'WW': 'sum',
-            'RW_WW_spez': lambda x: weighted_average(x, self.gdf.loc[x.index, 'NF']),
-            'RW_WW': 'sum',
-            'age_LANUV': mode_or_string,
-            })
-        self.gdf = grouped_gdf
+        - 'Fest_ID' and 'Nutzung' take the first value of the group.
+        - 'NF', 'RW', 'WW' and 'RW_WW' are summed up.
+        - 'RW_spez', 'WW_spez' and 'RW_WW_spez' are averaged, weighted by 'NF'. The products with 'NF' are
+          summed up together with the other sums in a single groupby.
+        - 'age_LANUV' takes the most common value of the group or a comma-separated string if there are ties.
+        - The geometries of each group are united with `union_by_group`.
+        '''
+        keys = ['Flurstueck', 'citygml_fu', 'Fortschrei', 'type']
+        weighted = ['RW_spez', 'WW_spez', 'RW_WW_spez']
+        summed = ['NF', 'RW', 'WW', 'RW_WW']
+
+        # group code of each building, buildings with missing keys are dropped
+        gdf = self.gdf
+        # ngroup returns NaN (newer pandas) or -1 for missing keys
+        codes = gdf.groupby(keys, sort=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        gdf = gdf[codes >= 0]
+        codes = codes[codes >= 0]
+
+        # keys and first values
+        grouped = gdf.groupby(codes, sort=True)
+        merged = grouped[keys].first()
+        merged[['Fest_ID', 'Nutzung']] = grouped[['Fest_ID', 'Nutzung']].first()
+
+        # sums and weighted averages in one groupby
+        values = pd.DataFrame({col: gdf[col].to_numpy() for col in summed}, index=codes)
+        for col in weighted:
+            values[col] = gdf[col].to_numpy() * gdf['NF'].to_numpy()
+        sums = values.groupby(level=0, sort=True).sum()
+        merged[summed] = sums[summed]
+        for col in weighted:
+            merged[col] = sums[col] / sums['NF']
+
+        # most common age, ties are joined as sorted string
+        merged['age_LANUV'] = most_common_by_group(gdf['age_LANUV'], codes)
+
+        # united geometries
+        geometry = union_by_group(gdf.geometry.to_numpy(), codes, len(merged))
+
+        self.gdf = gpd.GeoDataFrame(merged.reset_index(drop=True), geometry=geometry, crs=self.gdf.crs)
     
     def add_custom_heat_demand(self, wg_data, nwg_data):
         '''
@@ -443,9 +475,18 @@ class Buildings_adj():
         The total heat demand is calculated by multiplying the net floor area ('NF') by the assigned specific heat demand.
         '''
         buildings = self.gdf
+
+        # use the categories of BAK for the building age class of wg_data to merge on integer codes
+        wg_data = wg_data[['Baualtersklasse', 'Waerme_MFH kWh/m²·a', 'Waerme_EFH kWh/m²·a']]
+        # classes that are no category (e.g. 'A', 'K', 'L', empty rows) would become NaN and match all
+        # buildings without age class, so they are removed before the cast
+        if isinstance(buildings['BAK'].dtype, pd.CategoricalDtype):
+            wg_data = wg_data[wg_data['Baualtersklasse'].isin(buildings['BAK'].cat.categories)]
+            wg_data = wg_data.astype({'Baualtersklasse': buildings['BAK'].dtype})
+
         # merge with wg_data
         merge1 = buildings.merge(
-            wg_data[['Baualtersklasse', 'Waerme_MFH kWh/m²·a', 'Waerme_EFH kWh/m²·a']],
+            wg_data,
             left_on='BAK',
             right_on='Baualtersklasse',
             how='left'
@@ -453,8 +494,9 @@ class Buildings_adj():
 
         # merge with nwg_data
         merge1['GFK_last_four'] = merge1['citygml_fu'].str[-4:]
+        nwg_data = nwg_data[['Funktion', 'WVBRpEBF']].astype({'Funktion': str})
         merged_df = merge1.merge(
-            nwg_data[['Funktion', 'WVBRpEBF']],
+            nwg_data,
             left_on='GFK_last_four',
             right_on='Funktion',
             how='left'
@@ -505,7 +547,7 @@ class Buildings_adj():
             'Lastprofil': old_df['Lastprofil'],
             'Alter_LANUV': old_df['age_LANUV'],
             'Alter_Flurstueck': old_df['validFrom'].str[:4],
-            'BAK nach Flurstueck': old_df['BAK'],
+            'BAK nach Flurstueck': old_df['BAK'].astype(str),
             'Spez_WB [kWh/a*m²]': old_df['Spez_Waermebedarf'],
             'WB [kWh/a]': old_df['Waermebedarf'],
             'geometry': old_df['geometry']
@@ -526,13 +568,17 @@ class Parcels_adj():
     ----------
     gdf : GeoDataFrame
         A GeoDataFrame containing the parcel geometries.
+    columns : list of str
+        The attributes read from the parcel file. Only the parcel age is joined to the buildings.
 
     Methods
     -------
-    __init__(path):
+    __init__(path, bbox):
         Initializes the Parcels_adj class with a GeoDataFrame of parcel geometries.
     '''
-    def __init__(self, path):
+    columns = ['validFrom']
+
+    def __init__(self, path, bbox=None):
         '''
         Initializes the Parcels_adj class with a GeoDataFrame of parcel geometries.
 
@@ -540,10 +586,150 @@ class Parcels_adj():
         ----------
         path : str
             The file path to the shapefile containing the parcel geometries.
+        bbox : tuple of float, optional
+            Only parcels intersecting this bounding box (minx, miny, maxx, maxy) are read (default is None).
         '''
-        self.gdf = gpd.read_file(path)
+        self.gdf = read_layer(path, columns=self.columns, bbox=bbox)
+
+def union_by_group(geometries, codes, n_groups):
+    '''
+    Unites geometries per group.
+
+    Groups with a single geometry keep their geometry. The geometries of larger groups are arranged in a 
+    padded 2D array per size class and united with `shapely.union_all` along the rows, so no Python 
+    function is called per group.
+
+    Parameters
+    ----------
+    geometries : np.ndarray
+        Array of shapely geometries.
+    codes : np.ndarray
+        Group code (0 to n_groups-1) of each geometry.
+    n_groups : int
+        Number of groups.
+
+    Returns
+    -------
+    np.ndarray
+        Array with the united geometry of each group.
+    '''
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    sorted_geometries = np.asarray(geometries, dtype=object)[order]
+
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    position = np.arange(len(codes)) - starts[sorted_codes]
+
+    result = np.empty(n_groups, dtype=object)
+
+    # single geometries
+    single = np.flatnonzero(sizes == 1)
+    result[single] = sorted_geometries[starts[single]]
+
+    # size classes 2, 3-4, 5-8, ... limit the padding of the 2D arrays
+    upper = 2
+    while upper // 2 < sizes.max(initial=0):
+        groups = np.flatnonzero((sizes > upper // 2) & (sizes <= upper))
+        if len(groups) > 0:
+            row = np.full(n_groups, -1)
+            row[groups] = np.arange(len(groups))
+            member = row[sorted_codes] >= 0
+            matrix = np.full((len(groups), upper), None, dtype=object)
+            matrix[row[sorted_codes[member]], position[member]] = sorted_geometries[member]
+            result[groups] = shapely.union_all(matrix, axis=1)
+        upper *= 2
+
+    return result
+
+def most_common_by_group(values, codes):
+    '''
+    Returns the most common value per group or a comma-separated string of all values if there are ties.
+
+    The values are counted for all (group, value) pairs at once.
+
+    Parameters
+    ----------
+    values : Series
+        The values to aggregate.
+    codes : np.ndarray
+        Group code of each value.
+
+    Returns
+    -------
+    Series
+        The aggregated value of each group as string, indexed by group code.
+    '''
+    counts = pd.DataFrame({'group': codes, 'value': values.to_numpy()}).value_counts(dropna=False).reset_index(name='count')
+    max_count = counts.groupby('group')['count'].transform('max')
+    modes = counts[counts['count'] == max_count].copy()
+    modes['value'] = modes['value'].astype(str)
+    modes = modes.sort_values(['group', 'value'])
+    return modes.groupby('group')['value'].agg(', '.join)
+
+def overlap_pairs(left, right, chunk_size=None):
+    '''
+    Yields all intersecting pairs of two GeoDataFrames with their intersection area.
+
+    The candidates are queried from the spatial index of `right` and the intersection areas of all pairs
+    are calculated in one vectorized call. With `chunk_size` the features of `left` are processed in chunks,
+    which bounds the memory needed for the candidate pairs.
+
+    Parameters
+    ----------
+    left : GeoDataFrame
+        The GeoDataFrame whose features are queried.
+    right : GeoDataFrame
+        The GeoDataFrame whose spatial index is used.
+    chunk_size : int, optional
+        Number of `left` features per chunk. By default all features are processed at once.
+
+    Yields
+    ------
+    DataFrame
+        A DataFrame per chunk with the positional indices 'left' and 'right' and the 'overlap_area' of each pair.
+    '''
+    left_geometries = left.geometry.to_numpy()
+    right_geometries = right.geometry.to_numpy()
+    tree = shapely.STRtree(right_geometries)
+    chunk_size = chunk_size or max(len(left_geometries), 1)
+
+    for start in range(0, len(left_geometries), chunk_size):
+        left_index, right_index = tree.query(left_geometries[start:start + chunk_size], predicate='intersects')
+        left_index = left_index + start
+        overlap_area = shapely.area(shapely.intersection(left_geometries[left_index], right_geometries[right_index]))
+        yield pd.DataFrame({'left': left_index, 'right': right_index, 'overlap_area': overlap_area})
+
+def largest_overlap(left, right, chunk_size=None):
+    '''
+    Finds the feature of `right` with the largest intersection area for each feature of `left`.
+
+    Parameters
+    ----------
+    left : GeoDataFrame
+        The GeoDataFrame for whose features the best fitting feature is searched.
+    right : GeoDataFrame
+        The GeoDataFrame with the candidate features.
+    chunk_size : int, optional
+        Number of `left` features per chunk, see `overlap_pairs`. By default all features are processed at once.
+
+    Returns
+    -------
+    DataFrame
+        A DataFrame indexed by the positional index of the `left` features that intersect any `right` feature,
+        with the positional index 'right' of the largest overlap and the 'overlap_area'.
+    '''
+    results = []
+    for pairs in overlap_pairs(left, right, chunk_size):
+        # argmax per left feature: sort by area and keep the first pair of each feature
+        pairs = pairs.sort_values(['left', 'overlap_area'], ascending=[True, False])
+        results.append(pairs.drop_duplicates(subset='left'))
+
+    if not results:
+        return pd.DataFrame({'right': pd.Series(dtype='int64'), 'overlap_area': pd.Series(dtype='float64')})
+    return pd.concat(results).set_index('left')
 
-def spatial_join(shape1, shape2, attributes):
+def spatial_join(shape1, shape2, attributes, chunk_size=None):
     '''
     Performs a spatial join to add attributes from shape2 to the best fitting feature in shape1.
 
@@ -558,6 +744,8 @@ def spatial_join(shape1, shape2, attributes):
         The GeoDataFrame from which attributes will be sourced.
     attributes : list of str
         List of attribute names to be transferred from `shape2` to `shape1`.
+    chunk_size : int, optional
+        Number of `shape1` features per chunk to bound the memory of the candidate pairs (default is None).
 
     Returns
     -------
@@ -566,12 +754,11 @@ def spatial_join(shape1, shape2, attributes):
 
     Notes
     -----
-    If columns named 'index_left' or 'index_right' exist in either `shape1` or `shape2`, 
-    they will be removed to avoid conflicts during the spatial join.
+    The best fitting feature is found by `largest_overlap`. Features of `shape1` without any intersecting 
+    feature get NaN values.
 
-    If an attribute specified in the `attributes` list does not exist in `shape2`, the function 
-    will attempt to use a column named `{attribute}_left` instead and will print a message 
-    indicating the update.
+    If an attribute specified in the `attributes` list does not exist in `shape2`, the attribute of 
+    `shape1` is kept and a message is printed.
 
     Examples
     --------
@@ -580,37 +767,320 @@ def spatial_join(shape1, shape2, attributes):
     >>> attributes = ["attr1", "attr2"]
     >>> updated_shape1 = spatial_join(shape1, shape2, attributes)
     '''
-    # Überprüfen, ob Spalten index_left und index_right vorhanden sind und sie gegebenenfalls entfernen
-    if 'index_left' in shape1.columns:
-        shape1 = shape1.drop(columns=['index_left'])
-        print('index_left was removed from shape1 to execute the spatial join')
-    if 'index_right' in shape1.columns:
-        shape1 = shape1.drop(columns=['index_right'])
-        print('index_right was removed from shape1 to execute the spatial join')
-    if 'index_left' in shape2.columns:
-        shape2 = shape2.drop(columns=['index_left'])
-        print('index_left was removed from shape2 to execute the spatial join')
-    if 'index_right' in shape2.columns:
-        shape2 = shape2.drop(columns=['index_right'])
-        print('index_right was removed from shape2 to execute the spatial join')
-
-    # Räumlichen Join durchführen
-    joined = gpd.sjoin(shape1, shape2, how='inner', predicate='intersects')
-
-    # Schnittfläche für jedes überlappende Paar berechnen
-    joined['intersection_area'] = joined.apply(lambda row: shape1.geometry.iloc[row.name].intersection(shape2.geometry.iloc[row['index_right']]).area, axis=1)
-
-    # Ergebnisse basierend auf der Schnittfläche sortieren
-    sorted_joined = joined.sort_values(by='intersection_area', ascending=False)
-
-    # Den Eintrag mit der größten Schnittfläche für jedes Gebäude-Feature behalten
-    max_intersection = sorted_joined.groupby(sorted_joined.index).first()
+    best = largest_overlap(shape1, shape2, chunk_size)
 
     # Attribute übertragen
     for attr in attributes:
-        try:
-            shape1[attr] = max_intersection[attr]
-        except:
-            shape1[attr] = max_intersection[(attr+'_left')]
-            print(f'{attr} got updated during spatial join')
-    return shape1
\ No newline at end of file
+        if attr not in shape2.columns:
+            print(f'{attr} not found in shape2 and was not updated during spatial join')
+            continue
+        values = pd.Series(shape2[attr].to_numpy()[best['right'].to_numpy()], index=best.index)
+        shape1[attr] = values.reindex(np.arange(len(shape1))).to_numpy()
+    return shape1
+
+def zensus_join(buildings, zensus, attributes=None, cell_size=100):
+    '''
+    Adds attributes of the Zensus grid cell of each building centroid to the buildings.
+
+    The Zensus data is organized in a regular 100 m grid in EPSG:3035. Instead of a spatial join the cell of
+    each building centroid is calculated with integer arithmetic (floor(x/100), floor(y/100)) and the Zensus
+    attributes are merged on this cell key.
+
+    Parameters
+    ----------
+    buildings : GeoDataFrame
+        The GeoDataFrame of buildings to which the attributes will be added.
+    zensus : GeoDataFrame
+        The Zensus GeoDataFrame with one square polygon per grid cell, e.g. created by the Zensus download.
+    attributes : list of str, optional
+        The Zensus attributes to add. By default all attributes except grid ids and coordinates are added.
+    cell_size : int, optional
+        The edge length of the grid cells in meters (default is 100).
+
+    Returns
+    -------
+    GeoDataFrame
+        The buildings with the added Zensus attributes. Buildings outside the Zensus grid get NaN values.
+
+    Examples
+    --------
+    >>> buildings = gpd.read_file("path/to/buildings.gpkg")
+    >>> zensus = gpd.read_file("path/to/zensus.gpkg")
+    >>> buildings = zensus_join(buildings, zensus, ['Fernheizung', 'Gas'])
+    '''
+    if attributes is None:
+        attributes = [col for col in zensus.columns
+                      if col != zensus.geometry.name and not re.match(r'(?i)(gitter_id|x_mp|y_mp|index_)', col)]
+
+    # cell key of the Zensus squares from their center
+    bounds = zensus.geometry.to_crs(epsg=3035).bounds
+    zensus_table = pd.DataFrame(zensus[attributes]).reset_index(drop=True)
+    zensus_table['cell_x'] = np.floor((bounds['minx'].to_numpy() + bounds['maxx'].to_numpy()) / 2 / cell_size).astype(np.int64)
+    zensus_table['cell_y'] = np.floor((bounds['miny'].to_numpy() + bounds['maxy'].to_numpy()) / 2 / cell_size).astype(np.int64)
+    zensus_table = zensus_table.drop_duplicates(subset=['cell_x', 'cell_y'])
+
+    # cell key of the building centroids
+    centroids = buildings.geometry.centroid.to_crs(epsg=3035)
+    building_cells = pd.DataFrame({
+        'cell_x': np.floor(centroids.x.to_numpy() / cell_size).astype(np.int64),
+        'cell_y': np.floor(centroids.y.to_numpy() / cell_size).astype(np.int64)
+    })
+
+    # hash join on the cell key
+    joined = building_cells.merge(zensus_table, on=['cell_x', 'cell_y'], how='left')
+
+    buildings = buildings.copy()
+    for attr in attributes:
+        buildings[attr] = joined[attr].to_numpy()
+    return buildings
+
+def tile_grid(bounds, tile_size):
+    '''
+    Partitions a bounding box into square tiles.
+
+    Parameters
+    ----------
+    bounds : tuple of float
+        The bounding box (minx, miny, maxx, maxy) to partition.
+    tile_size : float
+        The edge length of the tiles in the units of the coordinate reference system.
+
+    Returns
+    -------
+    list of tuple
+        The tiles as (column, row, (minx, miny, maxx, maxy)), ordered row by row. Together the tiles cover
+        the bounding box, the last column and row reach beyond it.
+    '''
+    minx, miny, maxx, maxy = bounds
+    n_columns = int((maxx - minx) // tile_size) + 1
+    n_rows = int((maxy - miny) // tile_size) + 1
+    return [(i, j, (minx + i * tile_size, miny + j * tile_size, minx + (i + 1) * tile_size, miny + (j + 1) * tile_size))
+            for j in range(n_rows) for i in range(n_columns)]
+
+def adjust_building_tile(buildings_path, parcels_path, heat_att, tile, halo, origin, tile_size,
+                         building_info, building_demand_wg, bak_bins, bak_labels, zensus=None):
+    '''
+    Adjusts the buildings of one tile with the steps of `Buildings_adj`.
+
+    Buildings and parcels are read within the tile extended by the halo. The buildings are merged as in 
+    `Buildings_adj.merge_buildings` and only merged buildings owned by the tile are kept: a merged building is 
+    owned by the tile that contains the lower left corner of its bounds. So every merged building is 
+    adjusted exactly once, as long as the buildings of a parcel do not reach further than the halo beyond the tile.
+
+    Parameters
+    ----------
+    buildings_path : str
+        The file path to the buildings.
+    parcels_path : str
+        The file path to the parcels.
+    heat_att : str
+        The attribute name for heat data.
+    tile : tuple
+        The tile as (column, row, bounds), see `tile_grid`.
+    halo : float
+        The overlap added to each side of the tile when reading.
+    origin : tuple of float
+        The lower left corner (x, y) of the tile grid.
+    tile_size : float
+        The edge length of the tiles.
+    building_info : DataFrame
+        The 'database' sheet of building_info.xlsx with load profiles, full load hours and heat demands.
+    building_demand_wg : DataFrame
+        The specific heat demands of residential buildings per building age class.
+    bak_bins : list of int
+        The bin edges of the building age classes.
+    bak_labels : list of str
+        The labels of the building age classes.
+    zensus : GeoDataFrame, optional
+        Zensus grid whose attributes are added to the buildings with `zensus_join` (default is None).
+
+    Returns
+    -------
+    GeoDataFrame
+        The adjusted buildings of the tile with the columns of `Buildings_adj.rename_and_order_columns`. 
+        'new_ID' is only unique within the tile.
+    '''
+    i, j, (minx, miny, maxx, maxy) = tile
+    read_bbox = (minx - halo, miny - halo, maxx + halo, maxy + halo)
+
+    buildings = Buildings_adj(buildings_path, heat_att, bbox=read_bbox)
+    buildings.gdf = buildings.gdf[buildings.gdf[heat_att]>0].reset_index(drop=True) # only buildings with heat demand
+    if buildings.gdf.empty:
+        return None
+    buildings.add_LANUV_age_and_type()
+    buildings.merge_buildings()
+
+    # keep merged buildings owned by this tile
+    bounds = buildings.gdf.geometry.bounds
+    column = np.floor((bounds['minx'].to_numpy() - origin[0]) / tile_size)
+    row = np.floor((bounds['miny'].to_numpy() - origin[1]) / tile_size)
+    buildings.gdf = buildings.gdf[(column == i) & (row == j)].reset_index(drop=True)
+    if buildings.gdf.empty:
+        return None
+    buildings.gdf['new_ID'] = buildings.gdf.index.astype('int32')
+
+    # parcels around the kept buildings
+    parcels = Parcels_adj(parcels_path, bbox=tuple(buildings.gdf.total_bounds))
+    buildings.gdf = spatial_join(buildings.gdf.copy(), parcels.gdf, ['validFrom']) # building age from parcels
+    del parcels
+
+    buildings.add_BAK(bak_bins, bak_labels)
+    buildings.add_Vlh_Loadprofile(building_info)
+    buildings.drop_unwanted()
+    buildings.add_power()
+    buildings.add_custom_heat_demand(building_demand_wg, building_info)
+    buildings.add_connect_option()
+    buildings.rename_and_order_columns()
+    if zensus is not None:
+        buildings.gdf = zensus_join(buildings.gdf, zensus)
+    return buildings.gdf
+
+def tile_schema(gdf, text_columns=()):
+    '''
+    Returns the column types of a layer that is written tile by tile.
+
+    The first tile written to a file defines the field types of the file, so all tiles are cast to the same
+    types with `apply_schema`. Integer columns become nullable integers and columns without values become
+    floats, as other tiles may have missing values. Columns with text values and `text_columns` become strings.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        The first tile.
+    text_columns : list of str, optional
+        Columns that are always strings, also if they have no values in the first tile (default is ()).
+
+    Returns
+    -------
+    dict
+        The type of each column: 'text', 'Int64' or 'float64'. The geometry is not included.
+    '''
+    schema = {}
+    for col in gdf.columns:
+        if col == gdf.geometry.name:
+            continue
+        values = gdf[col]
+        if col in text_columns or (not pd.api.types.is_numeric_dtype(values) and values.notna().any()):
+            schema[col] = 'text'
+        elif pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+            schema[col] = 'Int64'
+        else:
+            schema[col] = 'float64'
+    return schema
+
+def apply_schema(gdf, schema):
+    '''
+    Casts the columns of a tile to the types of `tile_schema`. Missing columns are added without values,
+    columns that are not in the schema are dropped.
+    '''
+    data = {}
+    for col, dtype in schema.items():
+        values = gdf[col] if col in gdf.columns else pd.Series(None, index=gdf.index, dtype=object)
+        if dtype == 'text':
+            data[col] = values.astype(object).map(lambda value: None if pd.isna(value) else str(value))
+        else:
+            data[col] = pd.to_numeric(values, errors='coerce').astype(dtype)
+    return gpd.GeoDataFrame(data, geometry=gdf.geometry.values, index=gdf.index, crs=gdf.crs)
+
+def adjust_buildings_tiled(buildings_path, parcels_path, output_path, heat_att, building_info, building_demand_wg,
+                           bak_bins, bak_labels, zensus=None, tile_size=2000, halo=100, workers=1, progress=None):
+    '''
+    Adjusts the buildings tile by tile and appends the results to the output file.
+
+    The extent of the buildings is partitioned with `tile_grid` and each tile is adjusted with 
+    `adjust_building_tile`. Only one tile per worker is held in memory, so the peak memory is bounded by the 
+    tile size instead of the size of the municipality. The merged buildings get ids that are unique in the output.
+    All tiles are written with the column types of the first tile, see `tile_schema`.
+
+    Parameters
+    ----------
+    buildings_path : str
+        The file path to the buildings.
+    parcels_path : str
+        The file path to the parcels.
+    output_path : str
+        The file path of the adjusted buildings, e.g. a GeoPackage. An existing file is overwritten. It must not 
+        be the file of the buildings.
+    heat_att : str
+        The attribute name for heat data.
+    building_info : DataFrame
+        The 'database' sheet of building_info.xlsx.
+    building_demand_wg : DataFrame
+        The specific heat demands of residential buildings per building age class.
+    bak_bins : list of int
+        The bin edges of the building age classes.
+    bak_labels : list of str
+        The labels of the building age classes.
+    zensus : GeoDataFrame, optional
+        Zensus grid whose attributes are added to the buildings (default is None).
+    tile_size : float, optional
+        The edge length of the tiles in meters (default is 2000).
+    halo : float, optional
+        The overlap of the tiles in meters, larger than the extent of the buildings of a parcel (default is 100).
+    workers : int, optional
+        The number of processes adjusting tiles in parallel (default is 1, no parallel processing).
+    progress : callable, optional
+        Called with the number of finished tiles and the number of tiles after each tile (default is None).
+
+    Returns
+    -------
+    int
+        The number of adjusted buildings written to the output file.
+    '''
+    # stored layer extents may be rounded, so the grid gets a margin of 1 m
+    minx, miny, maxx, maxy = layer_bounds(buildings_path)
+    bounds = (minx - 1, miny - 1, maxx + 1, maxy + 1)
+    tiles = tile_grid(bounds, tile_size)
+    args = (buildings_path, parcels_path, heat_att)
+    kwargs = dict(halo=halo, origin=bounds[:2], tile_size=tile_size, building_info=building_info,
+                  building_demand_wg=building_demand_wg, bak_bins=bak_bins, bak_labels=bak_labels, zensus=zensus)
+
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(partial(adjust_building_tile, *args, **kwargs), tiles)
+    else:
+        executor = None
+        results = (adjust_building_tile(*args, tile, **kwargs) for tile in tiles)
+
+    n_buildings = 0
+    schema = None
+    try:
+        for n_tiles, gdf in enumerate(results, start=1):
+            if gdf is not None and not gdf.empty:
+                if schema is None:
+                    schema = tile_schema(gdf, Buildings_adj.text_columns)
+                gdf = apply_schema(gdf, schema)
+                gdf['new_ID'] = np.arange(n_buildings, n_buildings + len(gdf), dtype='int32')
+                gdf.to_file(output_path, mode='w' if n_buildings == 0 else 'a')
+                n_buildings += len(gdf)
+            if progress is not None:
+                progress(n_tiles, len(tiles))
+    finally:
+        # queued tiles are dropped if the loop stops early, e.g. if the task was cancelled in the progress callback
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return n_buildings
+
+def copy_layer(source_path, target_path, chunk_size=100000):
+    '''
+    Copies the features of a vector layer to a new file in chunks.
+
+    Parameters
+    ----------
+    source_path : str
+        The file path of the layer to copy.
+    target_path : str
+        The file path of the copy. The format is derived from the file extension, an existing file is overwritten.
+    chunk_size : int, optional
+        The number of features read and written at once (default is 100000).
+    '''
+    start = 0
+    while True:
+        chunk = gpd.read_file(source_path, rows=slice(start, start + chunk_size))
+        if chunk.empty and start > 0:
+            break
+        chunk.to_file(target_path, mode='w' if start == 0 else 'a')
+        if len(chunk) < chunk_size:
+            break
+        start += chunk_size
@@ -1,104 +1,462 @@
 import urllib.request
+import urllib.error
 import ast
 from zipfile import ZipFile
 from io import BytesIO
 import geopandas as gpd
 import pandas as pd
+import numpy as np
 import os
 import shutil
+import hashlib
+import re
+import json
+import tempfile
+import time
+import threading
+import requests
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from owslib.wfs import WebFeatureService
-from shapely.geometry import Point, Polygon, box
+import shapely
+from shapely.geometry import box
 from shapely.ops import unary_union
-from qgis.PyQt.QtNetwork import QNetworkRequest
-from qgis.core import QgsNetworkAccessManager
-from qgis.PyQt.QtCore import QEventLoop, QUrl
+try:
+    from qgis.PyQt.QtNetwork import QNetworkRequest
+    from qgis.core import QgsNetworkAccessManager
+    from qgis.PyQt.QtCore import QEventLoop, QUrl
+except ImportError:
+    # outside of QGIS (see src/pipeline.py) only the functions without suffix '_QGIS' can be used
+    QNetworkRequest = QgsNetworkAccessManager = QEventLoop = QUrl = None
+try:
+    from .reference_data import read_table, write_table, file_lock, read_json, write_json
+    from .task_control import TaskCancelled
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from reference_data import read_table, write_table, file_lock, read_json, write_json
+    from task_control import TaskCancelled
     
-def file_list_from_URL(url):
-    '''lists downloadable files from given URL
+# default settings of the download cache
+DOWNLOAD_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'fheat_download_cache')
+DOWNLOAD_CACHE_SIZE = 4 * 1024**3 # 4 GB
+DOWNLOAD_CACHE_MAX_AGE = 3600 # s
+DOWNLOAD_CACHE_IN_USE = 600 # s, files used within this time are not evicted, another task may still read them
+DOWNLOAD_CHUNK_SIZE = 1024**2 # 1 MB
+
+def _load_cache_index(cache_dir):
+    '''
+    Loads the index of the download cache, a dict of URL and cache entry.
+    '''
+    return read_json(os.path.join(cache_dir, 'index.json'))
+
+def _save_cache_index(cache_dir, index):
+    '''
+    Saves the index of the download cache. Has to be called within `_locked_cache_index`.
+    '''
+    write_json(os.path.join(cache_dir, 'index.json'), index)
+
+def _locked_cache_index(cache_dir):
+    '''
+    Locks the index of the download cache against other threads and processes for a read-modify-write.
+    '''
+    return file_lock(os.path.join(cache_dir, 'index.json'))
+
+def _download_tmp_file(cache_dir):
+    '''
+    Creates a uniquely named temporary file for a download in the cache directory, opened for writing.
+    '''
+    return tempfile.NamedTemporaryFile(dir=cache_dir, prefix='download_', suffix='.tmp', delete=False)
 
-    This function downloads the content from the specified URL, decodes the content,
-    evaluates it as a dictionary, and extracts a list of files from all dataset entries.
+def cache_lookup(url, cache_dir=None, max_age=DOWNLOAD_CACHE_MAX_AGE):
+    '''
+    Looks up a URL in the download cache.
 
     Parameters
     ----------
     url : str
-        The URL from which to download and extract the file list.
+        The URL of the file.
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    max_age : float, optional
+        Entries validated within this number of seconds are fresh and can be used without a request 
+        (default is `DOWNLOAD_CACHE_MAX_AGE`).
+
+    Returns
+    -------
+    path : str or None
+        The path of the cached file or None if the URL is not cached.
+    fresh : bool
+        True if the cached file can be used without a request.
+    headers : dict
+        Headers for a conditional request ('If-None-Match', 'If-Modified-Since') to revalidate the cached file.
+    '''
+    cache_dir = cache_dir or DOWNLOAD_CACHE_DIR
+    entry = _load_cache_index(cache_dir).get(url)
+    if entry is None or not os.path.exists(os.path.join(cache_dir, entry['file'])):
+        return None, False, {}
+
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    fresh = time.time() - entry['validated'] < max_age
+    return os.path.join(cache_dir, entry['file']), fresh, headers
+
+def cache_touch(url, cache_dir=None, validated=False):
+    '''
+    Marks a cache entry as used, and as validated if the server confirmed it (HTTP 304).
+
+    Parameters
+    ----------
+    url : str
+        The URL of the file.
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    validated : bool, optional
+        True if the cached file was confirmed by the server (default is False).
+    '''
+    cache_dir = cache_dir or DOWNLOAD_CACHE_DIR
+    with _locked_cache_index(cache_dir):
+        index = _load_cache_index(cache_dir)
+        if url in index:
+            now = time.time()
+            index[url]['accessed'] = now
+            if validated:
+                index[url]['validated'] = now
+            _save_cache_index(cache_dir, index)
+
+def cache_store(url, tmp_path, etag=None, last_modified=None, cache_dir=None, max_size=DOWNLOAD_CACHE_SIZE):
+    '''
+    Adds a downloaded file to the download cache and evicts least recently used files.
+
+    The cached file is named by the hash of the URL and its validators (ETag, Last-Modified), so a new version 
+    of the file gets a new name and replaces the old version. Afterwards, least recently used files are removed 
+    until the cache is smaller than `max_size`. The new file and files used within `DOWNLOAD_CACHE_IN_USE` 
+    seconds are never removed, as other threads or processes may still read them.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the file.
+    tmp_path : str
+        The path of the downloaded file in the cache directory. It is moved into the cache.
+    etag : str, optional
+        The ETag header of the response (default is None).
+    last_modified : str, optional
+        The Last-Modified header of the response (default is None).
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    max_size : int, optional
+        The maximum size of the cache in bytes (default is `DOWNLOAD_CACHE_SIZE`).
+
+    Returns
+    -------
+    str
+        The path of the cached file.
+    '''
+    cache_dir = cache_dir or DOWNLOAD_CACHE_DIR
+    key = hashlib.sha256(f'{url}\n{etag}\n{last_modified}'.encode()).hexdigest()[:32]
+    file = key + os.path.splitext(url.split('?')[0])[1]
+
+    with _locked_cache_index(cache_dir):
+        index = _load_cache_index(cache_dir)
+        os.replace(tmp_path, os.path.join(cache_dir, file))
+
+        # remove the old version
+        old = index.get(url)
+        if old is not None and old['file'] != file and os.path.exists(os.path.join(cache_dir, old['file'])):
+            try:
+                os.remove(os.path.join(cache_dir, old['file']))
+            except OSError:
+                pass # still opened by another task
+
+        now = time.time()
+        index[url] = {'file': file, 'etag': etag, 'last_modified': last_modified, 
+                      'size': os.path.getsize(os.path.join(cache_dir, file)), 'validated': now, 'accessed': now}
+
+        # evict least recently used files
+        total = sum(entry['size'] for entry in index.values())
+        for old_url, entry in sorted(index.items(), key=lambda item: item[1]['accessed']):
+            if total <= max_size or now - entry['accessed'] < DOWNLOAD_CACHE_IN_USE:
+                break
+            try:
+                os.remove(os.path.join(cache_dir, entry['file']))
+            except OSError:
+                continue # still opened by another task
+            total -= entry['size']
+            del index[old_url]
+
+        _save_cache_index(cache_dir, index)
+    return os.path.join(cache_dir, file)
+
+def download_cached(url, cache_dir=None, max_size=DOWNLOAD_CACHE_SIZE, max_age=DOWNLOAD_CACHE_MAX_AGE, progress=None):
+    '''
+    Downloads a file into the download cache and returns its local path.
+
+    A fresh cached file is returned without a request. Otherwise a conditional request with the validators
+    of the cached file is sent and the cached file is used if the server answers 304 (Not Modified). 
+    If the server cannot be reached, an existing cached file is used.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the file.
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    max_size : int, optional
+        The maximum size of the cache in bytes (default is `DOWNLOAD_CACHE_SIZE`).
+    max_age : float, optional
+        Cached files validated within this number of seconds are used without a request 
+        (default is `DOWNLOAD_CACHE_MAX_AGE`).
+    progress : callable, optional
+        Called with the received and the total number of bytes while downloading. The total is 0 if 
+        the server does not send the size (default is None).
+
+    Returns
+    -------
+    str
+        The local path of the downloaded file.
+
+    Notes
+    -----
+    The response is written to a temporary file in chunks of `DOWNLOAD_CHUNK_SIZE` bytes, so the memory 
+    use does not depend on the size of the file.
+    '''
+    cache_dir = cache_dir or DOWNLOAD_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path, fresh, headers = cache_lookup(url, cache_dir, max_age)
+    if fresh:
+        cache_touch(url, cache_dir)
+        return path
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers))
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            cache_touch(url, cache_dir, validated=True)
+            return path
+        raise
+    except urllib.error.URLError as e:
+        if path is None:
+            raise
+        print(f'Network error, cached file is used: {e}')
+        cache_touch(url, cache_dir)
+        return path
+
+    with response:
+        total = int(response.headers.get('Content-Length') or 0)
+        received = 0
+        with _download_tmp_file(cache_dir) as f:
+            tmp_path = f.name
+            try:
+                for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    received += len(chunk)
+                    if progress is not None:
+                        progress(received, total)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        return cache_store(url, tmp_path, response.headers.get('ETag'), response.headers.get('Last-Modified'), cache_dir, max_size)
+
+def download_cached_QGIS(url, cache_dir=None, max_size=DOWNLOAD_CACHE_SIZE, max_age=DOWNLOAD_CACHE_MAX_AGE, progress=None):
+    '''
+    Downloads a file into the download cache using QgsNetworkAccessManager (QGIS compatible).
+
+    See `download_cached` for the parameters and the cache behavior. The received data is written to a 
+    temporary file whenever the reply has new data, so the reply buffer stays small.
+
+    Exceptions raised in a Qt slot do not reach the caller of the event loop. If `progress` raises 
+    TaskCancelled, the reply is therefore aborted in the slot and the exception is raised again after 
+    the event loop returned.
+    '''
+    cache_dir = cache_dir or DOWNLOAD_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path, fresh, headers = cache_lookup(url, cache_dir, max_age)
+    if fresh:
+        cache_touch(url, cache_dir)
+        return path
+
+    nam = QgsNetworkAccessManager.instance()
+    request = QNetworkRequest(QUrl(url))
+    for name, value in headers.items():
+        request.setRawHeader(name.encode(), value.encode())
+    reply = nam.get(request)
+
+    # cancellation of the task, raised after the event loop
+    cancelled = []
+
+    def report_progress(received, total):
+        try:
+            progress(received, max(total, 0))
+        except TaskCancelled as e:
+            if not cancelled:
+                cancelled.append(e)
+                reply.abort()
+
+    # write the data to a temporary file as soon as it arrives
+    with _download_tmp_file(cache_dir) as f:
+        tmp_path = f.name
+        reply.readyRead.connect(lambda: f.write(bytes(reply.readAll())))
+        if progress is not None:
+            reply.downloadProgress.connect(report_progress)
+
+        loop = QEventLoop()
+        reply.finished.connect(loop.quit)
+        loop.exec_()
+        f.write(bytes(reply.readAll()))
+
+    if cancelled:
+        os.remove(tmp_path)
+        reply.deleteLater()
+        raise cancelled[0]
+
+    status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    if status == 304 or reply.error():
+        os.remove(tmp_path)
+        reply.deleteLater()
+        if status == 304:
+            cache_touch(url, cache_dir, validated=True)
+            return path
+        if path is None:
+            raise Exception(f"Network error: {reply.errorString()}")
+        print(f'Network error, cached file is used: {reply.errorString()}')
+        cache_touch(url, cache_dir)
+        return path
+
+    etag = bytes(reply.rawHeader(b'ETag')).decode('latin1') or None
+    last_modified = bytes(reply.rawHeader(b'Last-Modified')).decode('latin1') or None
+    reply.deleteLater()
+    return cache_store(url, tmp_path, etag, last_modified, cache_dir, max_size)
+
+def parse_file_list(content):
+    '''
+    Parses the index of a download site and lists its files.
+
+    The index is parsed as JSON. Indexes that are no valid JSON are evaluated as Python literal, 
+    like in earlier versions of this function.
+
+    Parameters
+    ----------
+    content : bytes
+        The content of the index, e.g. 'index.json'.
 
     Returns
     -------
     list
         A list of files found in all entries under 'datasets'.
     '''
-    filestring = ''
-    for line in urllib.request.urlopen(url):
-        d = line.decode('latin1')
-        d = d.strip()
-        filestring += d
-    data_dict = ast.literal_eval(filestring)
+    try:
+        data_dict = json.loads(content)
+    except ValueError:
+        data_dict = ast.literal_eval(''.join(line.strip() for line in content.decode('latin1').splitlines()))
 
     files = []
     for dataset in data_dict.get('datasets', []):
         files.extend(dataset.get('files', []))
-    
     return files
 
-def file_list_from_URL_QGIS(url: str):
-    """
-    Lists downloadable files from given URL using QgsNetworkAccessManager.
+@lru_cache(maxsize=8)
+def _catalog_from_file(path, mtime_ns):
+    '''
+    Reads a downloaded index and indexes its files by the municipality keys in their names.
+    The catalog is kept in memory as long as the file is unchanged.
+    '''
+    with open(path, 'rb') as f:
+        files = parse_file_list(f.read())
+
+    keys = {}
+    for item in files:
+        for key in re.findall(r'(?<!\d)\d{8}(?!\d)', item.get('name', '')):
+            keys.setdefault(key, item['name'])
+    return {'files': files, 'keys': keys}
+
+def file_catalog_from_URL(url, cache_dir=None, max_age=DOWNLOAD_CACHE_MAX_AGE):
+    '''
+    Returns the catalog of downloadable files from the index at the given URL.
+
+    The index is kept in the download cache and requested again only if it is older than `max_age` 
+    seconds, then with the ETag of the cached index, so an unchanged index is not transferred again 
+    (see `download_cached`). The parsed catalog is kept in memory.
 
     Parameters
     ----------
     url : str
-        The URL from which to download and extract the file list.
+        The URL of the index, e.g. 'https://.../index.json'.
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    max_age : int, optional
+        The time in seconds within which the cached index is used without request 
+        (default is `DOWNLOAD_CACHE_MAX_AGE`).
 
     Returns
     -------
-    list
-        A list of files found in all entries under 'datasets'.
-    """
-    nam = QgsNetworkAccessManager.instance()
-    request = QNetworkRequest(QUrl(url))
+    dict
+        The catalog with the list of files ('files') and the file name of each 
+        eight-digit municipality key in the file names ('keys'), see `search_filename`.
+    '''
+    path = download_cached(url, cache_dir, max_age=max_age)
+    return _catalog_from_file(path, os.stat(path).st_mtime_ns)
 
-    # Start the request
-    reply = nam.get(request)
+def file_catalog_from_URL_QGIS(url, cache_dir=None, max_age=DOWNLOAD_CACHE_MAX_AGE):
+    '''
+    Returns the catalog of downloadable files from the index at the given URL using 
+    QgsNetworkAccessManager. See `file_catalog_from_URL` for the parameters.
+    '''
+    path = download_cached_QGIS(url, cache_dir, max_age=max_age)
+    return _catalog_from_file(path, os.stat(path).st_mtime_ns)
 
-    # Event loop to wait for the reply (blocking)
-    loop = QEventLoop()
-    reply.finished.connect(loop.quit)
-    loop.exec_()
+def file_list_from_URL(url):
+    '''lists downloadable files from given URL
 
-    if reply.error():
-        raise Exception(f"Network error: {reply.errorString()}")
+    This function downloads the index from the specified URL, parses it as JSON
+    and extracts a list of files from all dataset entries. The index is cached, see `file_catalog_from_URL`.
 
-    # Get data and decode
-    data_bytes = reply.readAll()
-    reply.deleteLater()
+    Parameters
+    ----------
+    url : str
+        The URL from which to download and extract the file list.
 
-    # Deine ursprüngliche latin1-Dekodierung
-    filestring = bytes(data_bytes).decode("latin1").strip()
+    Returns
+    -------
+    list
+        A list of files found in all entries under 'datasets'.
+    '''
+    return file_catalog_from_URL(url)['files']
 
-    # In dict umwandeln
-    data_dict = ast.literal_eval(filestring)
+def file_list_from_URL_QGIS(url: str):
+    """
+    Lists downloadable files from given URL using QgsNetworkAccessManager.
 
-    # Dateien extrahieren
-    files = []
-    for dataset in data_dict.get("datasets", []):
-        files.extend(dataset.get("files", []))
+    The index is cached, see `file_catalog_from_URL_QGIS`.
 
-    return files
+    Parameters
+    ----------
+    url : str
+        The URL from which to download and extract the file list.
+
+    Returns
+    -------
+    list
+        A list of files found in all entries under 'datasets'.
+    """
+    return file_catalog_from_URL_QGIS(url)['files']
 
 def search_filename(files, city_id):
     '''Searches for a city in a list of files and returns the file name.
 
-    This function iterates through a list of file dictionaries, searching for the specified
-    city identifier in the file names. The city identifier can be either a city name or a
-    Gemeindeschlüssel. If a matching file is found, its name is returned; otherwise, a default
-    message indicating that no file was found is returned.
+    This function searches for the specified city identifier in the file names. 
+    The city identifier can be either a city name or a Gemeindeschlüssel. If a catalog 
+    (see `file_catalog_from_URL`) is given, a Gemeindeschlüssel is looked up in its key index; 
+    otherwise the files are searched one after another. If a matching file is found, 
+    its name is returned; otherwise, a default message indicating that no file was found is returned.
 
     Parameters
     ----------
-    files : list of dict
-        A list of dictionaries, each representing a file with at least a 'name' key.
+    files : list of dict or dict
+        A list of dictionaries, each representing a file with at least a 'name' key, or a catalog.
     city_id : str or int
         The city identifier to search for in the file names. This can be a city name or a
         Gemeindeschlüssel.
@@ -106,18 +464,76 @@ def search_filename(files, city_id):
     Returns
     -------
     str
-        The name of the file that contains the city identifier, or 'Keine Datei gefunden'
+        The name of the file that contains the city identifier, or 'No data found'
         if no matching file is found.
     '''
+    if isinstance(files, dict):
+        file_name = files['keys'].get(str(city_id))
+        if file_name is not None:
+            return file_name
+        files = files['files']
+
     file_name = 'No data found'
     for item in files:
-        print(item)
         if str(city_id) in item['name']:
             file_name = item['name']
             break
     return file_name
 
-def read_file_from_zip(url, zipfile, file_pattern, file_type='.shp', encoding='utf-8', delimiter = ';'):
+def extract_from_zip(zip_path, file_pattern, file_type, temp_dir):
+    '''
+    Extracts the first file matching a pattern and file type from a zip file.
+
+    Only the matching file is extracted. For shapefiles, all files with the same name and another extension
+    ('.shx', '.dbf', '.prj', '.cpg', ...) are extracted as well.
+
+    Parameters
+    ----------
+    zip_path : str
+        The path of the zip file.
+    file_pattern : str
+        The pattern to search for in the file names within the zip file.
+    file_type : str
+        The file extension of the file, e.g. '.shp' or '.csv'.
+    temp_dir : str
+        The directory to extract the files to.
+
+    Returns
+    -------
+    str
+        The path of the extracted file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If no file in the zip file matches the pattern and file type.
+    '''
+    with ZipFile(zip_path) as my_zip_file:
+        file_list = my_zip_file.namelist()
+        matching_files = [file for file in file_list if file_pattern in file and file.endswith(file_type)]
+        if not matching_files:
+            raise FileNotFoundError(f"No file matching {file_pattern}{file_type} found in archive.")
+        file = matching_files[0]
+
+        # file and sidecar files
+        stem = os.path.splitext(file)[0]
+        members = [member for member in file_list if member == file or 
+                   (file_type == '.shp' and os.path.splitext(member)[0] == stem)]
+        for member in members:
+            my_zip_file.extract(member, temp_dir)
+    return os.path.join(temp_dir, file)
+
+def read_extracted_file(path, file_type, encoding, delimiter):
+    '''
+    Reads an extracted file as GeoDataFrame (shapefile, GeoPackage) or DataFrame (CSV).
+    '''
+    if file_type in ['.shp', '.gpkg']:
+        return gpd.read_file(path, encoding=encoding)
+    elif file_type == '.csv':
+        return pd.read_csv(path, encoding=encoding, delimiter=delimiter)
+    raise ValueError(f"Unsupported file type: {file_type}")
+
+def read_file_from_zip(url, zipfile, file_pattern, file_type='.shp', encoding='utf-8', delimiter = ';', cache_dir=None, progress=None):
     '''
     Reads a file (GeoDataFrame for shapefiles or DataFrame for CSV) from a downloadable zip file.
 
@@ -138,6 +554,11 @@ def read_file_from_zip(url, zipfile, file_pattern, file_type='.shp', encoding='u
         The type of file to be read (e.g., '.shp', '.csv', '.gpkg'), by default '.shp'.
     encoding : str, optional
         The encoding to use when reading the file, by default 'utf-8'.
+    cache_dir : str, optional
+        The directory of the download cache, by default `DOWNLOAD_CACHE_DIR`. The zip file is downloaded
+        only once for several files of the same archive, see `download_cached`.
+    progress : callable, optional
+        Called with the received and the total number of bytes while downloading, by default None.
 
     Returns
     -------
@@ -158,91 +579,209 @@ def read_file_from_zip(url, zipfile, file_pattern, file_type='.shp', encoding='u
     Notes
     -----
     - The function supports both spatial files (e.g., '.shp', '.gpkg') and CSV files.
-    - Temporary files are extracted to '/tmp/extracted_zip' and cleaned up after reading.
+    - Only the matching file and, for shapefiles, its sidecar files are extracted to a temporary directory, 
+      which is removed after reading.
     - The file type must be specified via the 'file_type' argument, which defaults to '.shp'.
     '''
-    with urllib.request.urlopen(url + zipfile) as response:
-        with ZipFile(BytesIO(response.read())) as my_zip_file:
-            # Create a temporary directory
-            temp_dir = '/tmp/extracted_zip'
-            os.makedirs(temp_dir, exist_ok=True)
-
-            # Extract the entire Zip archive to the temporary directory
-            my_zip_file.extractall(temp_dir)
-            
-            # search matching file
-            file_list = my_zip_file.namelist()
-
-            matching_files = [file for file in file_list if 
-                                file_pattern in file and file.endswith(file_type)]
-
-            file = matching_files[0]
-
-            # check file type
-            if file_type in ['.shp','.gpkg']:
-                # Read the shapefile directly from the extracted directory
-                data = gpd.read_file(os.path.join(temp_dir, file), encoding=encoding)
-            elif file_type == '.csv':
-                # Read csv as pd.Dataframe
-                data = pd.read_csv(os.path.join(temp_dir, file), encoding=encoding, delimiter = delimiter)
-
-            # Clean up: Remove the temporary directory
-            shutil.rmtree(temp_dir)
+    zip_path = download_cached(url + zipfile, cache_dir, progress=progress)
+
+    # extract the matching file to a temporary directory
+    temp_dir = tempfile.mkdtemp(prefix='fheat_')
+    try:
+        path = extract_from_zip(zip_path, file_pattern, file_type, temp_dir)
+        data = read_extracted_file(path, file_type, encoding, delimiter)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
     return data
 
-def read_file_from_zip_QGIS(url, zipfile, file_pattern, file_type='.shp', encoding='utf-8', delimiter=';'):
+def read_file_from_zip_QGIS(url, zipfile, file_pattern, file_type='.shp', encoding='utf-8', delimiter=';', cache_dir=None, progress=None):
     """
     Reads a file (GeoDataFrame for shapefiles or DataFrame for CSV) from a downloadable zip file
     using QgsNetworkAccessManager (QGIS compatible).
+
+    The zip file is downloaded into the download cache with `download_cached_QGIS`, so several files of 
+    the same archive are read from one download. See `read_file_from_zip` for the parameters.
     """
 
     # Download file 
-    nam = QgsNetworkAccessManager.instance()
-    request = QNetworkRequest(QUrl(url + zipfile))
-    reply = nam.get(request)
-
-    loop = QEventLoop()
-    reply.finished.connect(loop.quit)
-    loop.exec_()
+    zip_path = download_cached_QGIS(url + zipfile, cache_dir, progress=progress)
 
-    if reply.error():
-        raise Exception(f"Network error: {reply.errorString()}")
+    # Extract the matching file to a temporary directory
+    temp_dir = tempfile.mkdtemp(prefix='fheat_')
+    try:
+        path = extract_from_zip(zip_path, file_pattern, file_type, temp_dir)
+        data = read_extracted_file(path, file_type, encoding, delimiter)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return data
 
-    zip_bytes = reply.readAll()
-    reply.deleteLater()
+# rows per chunk when streaming CSV files from zip files
+CSV_CHUNK_SIZE = 500000
+# columns of CSV files read as strings (e.g. 'GITTER_ID_100m'), all other columns are numbers
+CSV_ID_PATTERN = r'(?i)(^|_)id(_|$)'
+# values of numeric CSV columns read as NaN, e.g. the dash of suppressed Zensus values
+CSV_NA_VALUES = ['\x96', '\u2013', '-', '']
 
-    # Extract zip to temp folder
-    temp_dir = '/tmp/extracted_zip'
-    os.makedirs(temp_dir, exist_ok=True)
+def read_csv_from_zip_in_bbox(zip_path, file_pattern, bbox, columns=None, x_column='x_mp_100m', y_column='y_mp_100m', 
+                              encoding='utf-8', delimiter=';', chunk_size=CSV_CHUNK_SIZE, id_columns=None):
+    '''
+    Reads the rows of a CSV file within a bounding box directly from a zip file.
 
-    with ZipFile(BytesIO(bytes(zip_bytes))) as my_zip_file:
-        my_zip_file.extractall(temp_dir)
+    The CSV file is parsed from the zip file in chunks of `chunk_size` rows and only the rows with 
+    coordinates inside the bounding box are kept, so the whole file is neither extracted nor held in memory.
+    The ID columns are read as strings and all other columns as floats, so the chunks have the same types 
+    and the values are parsed only once. Dashes of suppressed values (`CSV_NA_VALUES`) are read as NaN. 
+    If a value column contains other text, the file is read again with the value columns as strings, and 
+    the columns whose values are all numbers are converted afterwards.
 
-        # search matching file
-        file_list = my_zip_file.namelist()
-        matching_files = [
-            file for file in file_list
-            if file_pattern in file and file.endswith(file_type)
-        ]
+    Parameters
+    ----------
+    zip_path : str
+        The path of the zip file.
+    file_pattern : str
+        The pattern to search for in the file names within the zip file.
+    bbox : tuple
+        The bounding box (xmin, ymin, xmax, ymax) in the coordinates of the CSV file.
+    columns : list of str, optional
+        The columns to read besides the coordinates (default is None, all columns).
+    x_column, y_column : str, optional
+        The columns of the coordinates (default is 'x_mp_100m' and 'y_mp_100m').
+    encoding : str, optional
+        The encoding of the CSV file (default is 'utf-8').
+    delimiter : str, optional
+        The delimiter of the CSV file (default is ';').
+    chunk_size : int, optional
+        The number of rows per chunk (default is `CSV_CHUNK_SIZE`).
+    id_columns : list of str, optional
+        The columns read as strings (default is None, the columns matching `CSV_ID_PATTERN`).
 
+    Returns
+    -------
+    DataFrame
+        The rows within the bounding box, the borders are excluded.
+    '''
+    xmin, ymin, xmax, ymax = bbox[:4]
+    with ZipFile(zip_path) as my_zip_file:
+        matching_files = [file for file in my_zip_file.namelist() if file_pattern in file and file.endswith('.csv')]
         if not matching_files:
-            shutil.rmtree(temp_dir)
-            raise FileNotFoundError(f"No file matching {file_pattern}{file_type} found in archive.")
+            raise FileNotFoundError(f"No file matching {file_pattern}.csv found in archive.")
+
+        with my_zip_file.open(matching_files[0]) as f:
+            header = pd.read_csv(f, encoding=encoding, delimiter=delimiter, nrows=0).columns.tolist()
+        usecols = [col for col in header if columns is None or col in columns or col in (x_column, y_column)]
+        if id_columns is None:
+            id_columns = [col for col in usecols if re.search(CSV_ID_PATTERN, col)]
+        dtype = {col: str if col in id_columns else 'float64' for col in usecols}
+
+        def read_chunks():
+            chunks = []
+            with my_zip_file.open(matching_files[0]) as f:
+                for chunk in pd.read_csv(f, encoding=encoding, delimiter=delimiter, usecols=usecols, dtype=dtype, 
+                                         na_values=CSV_NA_VALUES, keep_default_na=False, chunksize=chunk_size):
+                    x, y = chunk[x_column], chunk[y_column]
+                    chunks.append(chunk[(x > xmin) & (x < xmax) & (y > ymin) & (y < ymax)])
+            return chunks
+
+        try:
+            chunks = read_chunks()
+            text_columns = []
+        except ValueError:
+            # a value column contains text, read the value columns as strings
+            text_columns = [col for col in usecols if col not in id_columns and col not in (x_column, y_column)]
+            dtype.update({col: str for col in text_columns})
+            chunks = read_chunks()
+
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=dtype[col]) for col in usecols})
+    df = pd.concat(chunks, ignore_index=True)
+    for col in text_columns:
+        numbers = pd.to_numeric(df[col], errors='coerce')
+        if numbers.notna().sum() == df[col].notna().sum():
+            df[col] = numbers
+    return df
 
-        file = matching_files[0]
+def _read_csv_region(download_function, url, zipfile, file_pattern, bbox, columns, encoding, delimiter, 
+                     cache_dir, region_cache_dir, progress):
+    '''
+    Reads the rows of a CSV file within a bounding box from a downloadable zip file, using the regional cache.
+    See `read_csv_region_from_zip` for the parameters.
+    '''
+    if region_cache_dir is None:
+        region_cache_dir = os.path.join(cache_dir or DOWNLOAD_CACHE_DIR, 'regions')
+    key = hashlib.sha256(json.dumps([url + zipfile, file_pattern, [float(v) for v in bbox[:4]], columns, 'typed']).encode()).hexdigest()[:24]
+    base = os.path.join(region_cache_dir, f'{file_pattern}_{key}')
+
+    # regional extract of a previous run
+    for path in (base + '.parquet', base + '.pkl'):
+        if os.path.exists(path):
+            try:
+                return read_table(path)
+            except Exception:
+                pass
+
+    zip_path = download_function(url + zipfile, cache_dir, progress=progress)
+    df = read_csv_from_zip_in_bbox(zip_path, file_pattern, bbox, columns, encoding=encoding, delimiter=delimiter)
+    try:
+        os.makedirs(region_cache_dir, exist_ok=True)
+        write_table(df, base)
+    except OSError as e:
+        print(f'Regional extract of {file_pattern} not saved: {e}')
+    return df
 
-        # Read file depending on type
-        if file_type in ['.shp', '.gpkg']:
-            data = gpd.read_file(os.path.join(temp_dir, file), encoding=encoding)
-        elif file_type == '.csv':
-            data = pd.read_csv(os.path.join(temp_dir, file), encoding=encoding, delimiter=delimiter)
-        else:
-            shutil.rmtree(temp_dir)
-            raise ValueError(f"Unsupported file type: {file_type}")
+def read_csv_region_from_zip(url, zipfile, file_pattern, bbox, columns=None, encoding='utf-8', delimiter=';', 
+                             cache_dir=None, region_cache_dir=None, progress=None):
+    '''
+    Reads the rows of a CSV file within a bounding box from a downloadable zip file (e.g. Zensus grid data).
 
-    # Cleanup
-    shutil.rmtree(temp_dir)
-    return data
+    The zip file is downloaded with `download_cached` and the CSV file is filtered while it is read, see 
+    `read_csv_from_zip_in_bbox`. The regional extract is saved in `region_cache_dir` by URL, file pattern, 
+    bounding box and columns, so later calls for the same area neither download nor parse the whole file.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the site where the zip file can be downloaded.
+    zipfile : str
+        The name of the zip file to be downloaded.
+    file_pattern : str
+        The pattern to search for in the file names within the zip file.
+    bbox : tuple
+        The bounding box (xmin, ymin, xmax, ymax) in the coordinates of the CSV file.
+    columns : list of str, optional
+        The columns to read besides the coordinates (default is None, all columns).
+    encoding : str, optional
+        The encoding of the CSV file (default is 'utf-8').
+    delimiter : str, optional
+        The delimiter of the CSV file (default is ';').
+    cache_dir : str, optional
+        The directory of the download cache (default is None, `DOWNLOAD_CACHE_DIR`).
+    region_cache_dir : str, optional
+        The directory of the regional extracts (default is None, a 'regions' directory in the download cache).
+    progress : callable, optional
+        Called with the received and the total number of bytes while downloading (default is None).
+
+    Returns
+    -------
+    DataFrame
+        The rows within the bounding box.
+
+    Examples
+    --------
+    >>> url = 'https://www.destatis.de/static/DE/zensus/gitterdaten/'
+    >>> df = read_csv_region_from_zip(url, 'Zensus2022_Heizungsart.zip', 'Zensus2022_Heizungsart_100m-Gitter',
+    ...                               (4100000, 3100000, 4110000, 3110000), encoding='latin1')
+    '''
+    return _read_csv_region(download_cached, url, zipfile, file_pattern, bbox, columns, encoding, delimiter, 
+                            cache_dir, region_cache_dir, progress)
+
+def read_csv_region_from_zip_QGIS(url, zipfile, file_pattern, bbox, columns=None, encoding='utf-8', delimiter=';', 
+                                  cache_dir=None, region_cache_dir=None, progress=None):
+    '''
+    Reads the rows of a CSV file within a bounding box from a downloadable zip file
+    using QgsNetworkAccessManager (QGIS compatible). See `read_csv_region_from_zip` for the parameters.
+    '''
+    return _read_csv_region(download_cached_QGIS, url, zipfile, file_pattern, bbox, columns, encoding, delimiter, 
+                            cache_dir, region_cache_dir, progress)
 
 def filter_df(name, dataframe, parameter):
     '''
@@ -277,13 +816,405 @@ def filter_df(name, dataframe, parameter):
         print(f'{name} not found')
         return None
 
+# number of threads loading Gemarkungen and pages per Gemarkung
+WFS_WORKERS = 4
+WFS_PAGE_WORKERS = 4
+# number of simultaneous WFS requests of all threads, to not overload the server
+WFS_MAX_REQUESTS = 4
+_wfs_requests = threading.BoundedSemaphore(WFS_MAX_REQUESTS)
+# features per WFS request and maximum number of bounding box divisions
+WFS_PAGE_SIZE = 100000
+WFS_MAX_DEPTH = 4
+
+@lru_cache(maxsize=None)
+def wfs_service(wfs_url, version='2.0.0'):
+    '''
+    Connects to a WFS service. The capabilities are requested only once per session and URL.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    version : str, optional
+        The WFS version (default is '2.0.0').
+
+    Returns
+    -------
+    WebFeatureService
+        The WFS service with its capabilities.
+    '''
+    return WebFeatureService(wfs_url, version=version)
+
+@lru_cache(maxsize=None)
+def wfs_session():
+    '''
+    Returns the HTTP session for WFS requests, which keeps the connections open for the following requests.
+    '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=WFS_MAX_REQUESTS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def wfs_output_format(wfs_url):
+    '''
+    Selects the output format for GetFeature requests from the capabilities of a WFS service.
+
+    GeoJSON is smaller and faster to parse than GML, so it is used if the service offers it. 
+    Otherwise the features are requested as 'text/xml' (GML).
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+
+    Returns
+    -------
+    str
+        The value of the outputFormat parameter.
+    '''
+    try:
+        formats = wfs_service(wfs_url).getOperationByName('GetFeature').parameters['outputFormat']['values']
+    except (KeyError, AttributeError):
+        formats = []
+    for output_format in formats:
+        if 'json' in output_format.lower():
+            return output_format
+    return 'text/xml'
+
+def wfs_constraint(wfs_url, name):
+    '''
+    Returns a constraint of the GetFeature operations from the capabilities of a WFS service.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    name : str
+        The name of the constraint, e.g. 'CountDefault' (maximum number of features per response) or
+        'ImplementsSorting'.
+
+    Returns
+    -------
+    str or None
+        The value of the constraint or None if the service does not report it.
+    '''
+    capabilities = getattr(wfs_service(wfs_url), '_capabilities', None)
+    if capabilities is None:
+        return None
+    for element in capabilities.iter():
+        if isinstance(element.tag, str) and element.tag.endswith('}Constraint') and element.get('name') == name:
+            for value in element.iter():
+                if isinstance(value.tag, str) and value.tag.endswith(('}DefaultValue', '}Value')) and value.text:
+                    return value.text.strip()
+    return None
+
+def wfs_count_default(wfs_url):
+    '''
+    Returns the maximum number of features per response of a WFS service (CountDefault) or None.
+    '''
+    value = wfs_constraint(wfs_url, 'CountDefault')
+    return int(value) if value is not None and value.isdigit() and int(value) > 0 else None
+
+def _number_matched(path, size=65536):
+    '''
+    Reads the number of features matching a request (numberMatched) from a GetFeature response.
+
+    GML responses report it in the root element, GeoJSON responses (e.g. of GeoServer) after the features,
+    so only the beginning and the end of the file are read.
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(size)
+        f.seek(max(f.seek(0, os.SEEK_END) - size, 0))
+        tail = f.read()
+    match = re.search(rb'numberMatched"?\s*[=:]\s*"?(\d+)', head) or re.search(rb'numberMatched"?\s*[=:]\s*"?(\d+)', tail)
+    return int(match.group(1)) if match else None
+
+def wfs_filter(wfs, layer_name, bbox, key):
+    '''
+    Creates a FES 2.0 filter selecting the features within a bounding box whose 
+    'nationalCadastralReference' starts with 'key'.
+
+    The bounding box is part of the filter, because the BBOX and FILTER parameters of a request 
+    exclude each other.
+
+    Parameters
+    ----------
+    wfs : WebFeatureService
+        The WFS service, see `wfs_service`.
+    layer_name : str
+        The name of the layer containing the desired shapes.
+    bbox : tuple
+        The bounding box in the format (minx, miny, maxx, maxy).
+    key : str
+        The beginning of 'nationalCadastralReference' (e.g., Gemeinde or Gemarkung).
+
+    Returns
+    -------
+    str
+        The filter as XML.
+    '''
+    srs = wfs.contents[layer_name].crsOptions[0]
+    minx, miny, maxx, maxy = bbox[:4]
+    if srs.encoding == 'urn' and srs.axisorder == 'yx':
+        minx, miny, maxx, maxy = miny, minx, maxy, maxx
+    srs_name = srs.getcodeurn() if srs.encoding == 'urn' else srs.getcode()
+    prefix = layer_name.split(':')[0] + ':' if ':' in layer_name else ''
+    return ('<fes:Filter xmlns:fes="http://www.opengis.net/fes/2.0" xmlns:gml="http://www.opengis.net/gml/3.2">'
+            '<fes:And>'
+            '<fes:PropertyIsLike wildCard="*" singleChar="." escapeChar="!">'
+            f'<fes:ValueReference>{prefix}nationalCadastralReference</fes:ValueReference>'
+            f'<fes:Literal>{key}*</fes:Literal>'
+            '</fes:PropertyIsLike>'
+            f'<fes:BBOX><gml:Envelope srsName="{srs_name}">'
+            f'<gml:lowerCorner>{minx} {miny}</gml:lowerCorner><gml:upperCorner>{maxx} {maxy}</gml:upperCorner>'
+            '</gml:Envelope></fes:BBOX>'
+            '</fes:And>'
+            '</fes:Filter>')
+
+def wfs_get_feature_params(wfs_url, layer_name, bbox, key=None):
+    '''
+    Returns the URL and the parameters of a GetFeature request within a bounding box.
+
+    Without key, the bounding box is sent as BBOX parameter. With key, the bounding box and the key 
+    are sent as FILTER parameter, see `wfs_filter`.
+
+    Returns
+    -------
+    str
+        The URL for GetFeature requests.
+    dict
+        The parameters of the request.
+    '''
+    wfs = wfs_service(wfs_url)
+    base_url = next(method['url'] for method in wfs.getOperationByName('GetFeature').methods 
+                    if method['type'].lower() == 'get')
+    params = {
+        'service': 'WFS',
+        'version': wfs.version,
+        'request': 'GetFeature',
+        'typenames': layer_name
+    }
+    if key is None:
+        params['bbox'] = wfs.getBBOXKVP(bbox, [layer_name])
+    else:
+        params['filter'] = wfs_filter(wfs, layer_name, bbox, key)
+    return base_url, params
+
+def wfs_get_features(wfs_url, layer_name, bbox, start_index=0, count=None, key=None, sort_by=None):
+    '''
+    Requests one page of features within a bounding box from a WFS service.
+
+    The features are requested in the output format of `wfs_output_format`. The response is 
+    transferred compressed if the server supports it (Accept-Encoding: gzip) and is written to a 
+    temporary file while it is received, so it is not kept in memory as a whole before parsing.
+    At most `WFS_MAX_REQUESTS` requests of all threads are sent at the same time.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    layer_name : str
+        The name of the layer containing the desired shapes.
+    bbox : tuple
+        The bounding box in the format (minx, miny, maxx, maxy).
+    start_index : int, optional
+        The index of the first feature of the page (default is 0).
+    count : int, optional
+        The maximum number of features of the page (default is None, the limit of the server).
+    key : str, optional
+        Only features whose 'nationalCadastralReference' starts with the key are requested
+        (default is None, all features).
+    sort_by : str, optional
+        The attribute the features are sorted by, so that the pages of a request do not overlap
+        (default is None, the order of the server).
+
+    Returns
+    -------
+    GeoDataFrame
+        The features of the page. The number of features matching the request is stored in
+        `gdf.attrs['numberMatched']` if the server reports it.
+    '''
+    base_url, params = wfs_get_feature_params(wfs_url, layer_name, bbox, key)
+    output_format = wfs_output_format(wfs_url)
+    params['outputFormat'] = output_format
+    if start_index:
+        params['startIndex'] = start_index
+    if count:
+        params['count'] = count
+    if sort_by:
+        params['sortBy'] = sort_by
+
+    suffix = '.json' if 'json' in output_format.lower() else '.gml'
+    fd, tmp_path = tempfile.mkstemp(prefix='fheat_wfs_', suffix=suffix)
+    try:
+        with _wfs_requests, os.fdopen(fd, 'wb') as f, wfs_session().get(base_url, params=params, timeout=300, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        gdf = gpd.read_file(tmp_path)
+        number_matched = _number_matched(tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+    # GeoJSON without 'crs' member is read as EPSG:4326, even if the server sends projected coordinates
+    if suffix == '.json' and len(gdf) and gdf.crs is not None and gdf.crs.to_epsg() == 4326:
+        minx, miny, maxx, maxy = gdf.total_bounds
+        if max(abs(minx), abs(maxx)) > 180 or max(abs(miny), abs(maxy)) > 90:
+            srs = wfs_service(wfs_url).contents[layer_name].crsOptions[0]
+            gdf = gdf.set_crs(srs.getcode(), allow_override=True)
+    if number_matched is not None:
+        gdf.attrs['numberMatched'] = number_matched
+    return gdf
+
+def wfs_number_matched(wfs_url, layer_name, bbox, key=None):
+    '''
+    Requests the number of features within a bounding box (resultType=hits).
+
+    Returns
+    -------
+    int or None
+        The number of features or None if the server does not report it.
+    '''
+    base_url, params = wfs_get_feature_params(wfs_url, layer_name, bbox, key)
+    params['resultType'] = 'hits'
+    try:
+        with _wfs_requests:
+            response = wfs_session().get(base_url, params=params, timeout=300)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    match = re.search(rb'numberMatched="(\d+)"', response.content)
+    return int(match.group(1)) if match else None
+
+def wfs_get_features_paged(wfs_url, layer_name, bbox, page_size=WFS_PAGE_SIZE, key=None):
+    '''
+    Requests all features within a bounding box page by page (WFS 2.0 startIndex/count).
+
+    The page size is limited to the maximum number of features per response of the server (CountDefault),
+    and the features are sorted by 'nationalCadastralReference' if the server implements sorting, so the
+    pages do not overlap. Whether the first page holds all features is decided from the number of matching
+    features (numberMatched of the response or of a hits request). The remaining pages are requested
+    concurrently, with the number of features the server actually returned per page. If the server does
+    not report the number, the pages are requested one after another until a page is not full.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    layer_name : str
+        The name of the layer containing the desired shapes.
+    bbox : tuple
+        The bounding box in the format (minx, miny, maxx, maxy).
+    page_size : int, optional
+        The number of features per page, at most the limit of the server (default is `WFS_PAGE_SIZE`).
+    key : str, optional
+        Only features whose 'nationalCadastralReference' starts with the key are requested
+        (default is None, all features).
+
+    Returns
+    -------
+    GeoDataFrame
+        The features within the bounding box.
+    bool
+        False if the server refuses paging, so only the first page is returned, or if fewer features than
+        matching were received.
+    '''
+    count_default = wfs_count_default(wfs_url)
+    if count_default is not None:
+        page_size = min(page_size, count_default)
+    sort_by = None
+    if (wfs_constraint(wfs_url, 'ImplementsSorting') or '').upper() == 'TRUE':
+        sort_by = (layer_name.split(':')[0] + ':' if ':' in layer_name else '') + 'nationalCadastralReference'
+
+    first = wfs_get_features(wfs_url, layer_name, bbox, count=page_size, key=key, sort_by=sort_by)
+    if len(first) == 0:
+        return first, True
+
+    # number of matching features, a hits request is only needed if the page may be cut by the server
+    n_features = first.attrs.get('numberMatched')
+    if n_features is None and (len(first) >= page_size or count_default is None):
+        n_features = wfs_number_matched(wfs_url, layer_name, bbox, key)
+    if n_features is not None and len(first) >= n_features:
+        return first, True
+    if n_features is None and count_default is not None and len(first) < page_size:
+        return first, True
+
+    # the server may return fewer features per page than requested
+    step = len(first)
+
+    def get_page(start_index):
+        page = wfs_get_features(wfs_url, layer_name, bbox, start_index, step, key, sort_by)
+        # a server ignoring startIndex returns the first page again
+        if len(page) and page['nationalCadastralReference'].iloc[0] == first['nationalCadastralReference'].iloc[0]:
+            raise ValueError('startIndex not supported')
+        return page
+
+    pages = [first]
+    try:
+        if n_features is not None:
+            with ThreadPoolExecutor(max_workers=WFS_PAGE_WORKERS) as executor:
+                pages.extend(executor.map(get_page, range(step, n_features, step)))
+        else:
+            while len(pages[-1]) == step:
+                pages.append(get_page(len(pages) * step))
+    except Exception as e: # HTTP error, exception report instead of features or ignored startIndex
+        print(f'Paging refused by the WFS service: {e}')
+        return first, False
+    gdf = pd.concat(pages, ignore_index=True)
+    return gdf, n_features is None or len(gdf) >= n_features
+
+def wfs_get_features_tiled(wfs_url, layer_name, bbox, page_size=WFS_PAGE_SIZE, max_depth=WFS_MAX_DEPTH, key=None):
+    '''
+    Requests all features within a bounding box, dividing the bounding box if the server refuses paging.
+
+    The bounding box is divided into four quarters (quadtree) as long as a quarter contains a full page and 
+    the server refuses paging. Features in several quarters are returned more than once.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    layer_name : str
+        The name of the layer containing the desired shapes.
+    bbox : tuple
+        The bounding box in the format (minx, miny, maxx, maxy).
+    page_size : int, optional
+        The number of features per page, at most the limit of the server (default is `WFS_PAGE_SIZE`).
+    max_depth : int, optional
+        The maximum number of divisions (default is `WFS_MAX_DEPTH`).
+    key : str, optional
+        Only features whose 'nationalCadastralReference' starts with the key are requested
+        (default is None, all features).
+
+    Returns
+    -------
+    GeoDataFrame
+        The features within the bounding box.
+    bool
+        False if the features are incomplete after `max_depth` divisions.
+    '''
+    gdf, complete = wfs_get_features_paged(wfs_url, layer_name, bbox, page_size, key)
+    if complete or max_depth == 0:
+        return gdf, complete
+
+    minx, miny, maxx, maxy = bbox[:4]
+    midx, midy = (minx + maxx) / 2, (miny + maxy) / 2
+    quarters = [(minx, miny, midx, midy), (midx, miny, maxx, midy), (minx, midy, midx, maxy), (midx, midy, maxx, maxy)]
+    results = [wfs_get_features_tiled(wfs_url, layer_name, quarter, page_size, max_depth - 1, key) for quarter in quarters]
+    return pd.concat([result[0] for result in results], ignore_index=True), all(result[1] for result in results)
+
 def get_shape_from_wfs(wfs_url, key, bbox, layer_name):
     '''
     Loads shapefiles within a bounding box from a WFS service and filters for 'key'.
 
     This function connects to a Web Feature Service (WFS), retrieves shapefiles within a specified
-    bounding box, and filters the shapefiles based on the given key (Gemeinde or Gemarkung). If the
-    number of features exceeds 100,000, a warning is printed.
+    bounding box, and filters the shapefiles based on the given key (Gemeinde or Gemarkung). 
+    The key is sent to the server as filter, so only the features of the key are transmitted. If the server 
+    rejects the filter, all features of the bounding box are requested and filtered locally.
+    Bounding boxes with more features than the server transmits per request are loaded page by page or,
+    if the server refuses paging, divided into smaller bounding boxes (see `wfs_get_features_tiled`).
+    Duplicate features are removed by 'nationalCadastralReference'.
 
     Parameters
     ----------
@@ -301,7 +1232,7 @@ def get_shape_from_wfs(wfs_url, key, bbox, layer_name):
     GeoDataFrame
         A GeoDataFrame containing the filtered shapes.
     int or None
-        An exception flag. If the number of features exceeds 100,000, returns 1; otherwise, None.
+        An exception flag. If the shapes are still incomplete, returns 1; otherwise, None.
 
     Examples
     --------
@@ -317,32 +1248,162 @@ def get_shape_from_wfs(wfs_url, key, bbox, layer_name):
 
     Notes
     -----
-    The function assumes that the WFS service supports version 2.0.0 and returns data in 'text/xml' format.
-    If the bounding box contains more than 100,000 features, a warning is printed, and the returned
-    GeoDataFrame may be incomplete.
+    The function assumes that the WFS service supports version 2.0.0 and returns data in 'text/xml' format 
+    or GeoJSON, see `wfs_output_format`.
+    The capabilities of the service and the HTTP connections are reused for following calls, so the function 
+    can be called from several threads, see `get_shapes_from_wfs`.
     '''
-    # Connect to the WFS service
-    wfs = WebFeatureService(wfs_url, version='2.0.0')
-
-    # Retrieve the layer attributes as a GeoDataFrame
-    response = wfs.getfeature(typename=layer_name, outputFormat='text/xml', bbox=bbox)
-
-    # Reset the position of the BytesIO object for GeoPandas to read it
-    response.seek(0)
-
-    # Read the BytesIO object with GeoPandas
-    gdf = gpd.read_file(response)
-
-    # Warn if too many features are within the bounding box
+    try:
+        gdf, complete = wfs_get_features_tiled(wfs_url, layer_name, bbox, key=key)
+    except Exception as e: # HTTP error or exception report instead of features
+        print(f'Filter refused by the WFS service: {e}')
+        gdf = None
+    if gdf is None or len(gdf) == 0:
+        gdf, complete = wfs_get_features_tiled(wfs_url, layer_name, bbox)
+
+    # Warn if the features are incomplete
     exception = None
-    if len(gdf)>=100000:
-        print('The selected area contains over 100,000 parcels! As the WFS service transmits only 100,000 features per request, some parcels may be missing.')
+    if not complete:
+        print('The selected area contains too many parcels! Some parcels may be missing.')
         exception = 1
 
-    # Select features based on the key
+    # Remove duplicates of pages and divided bounding boxes
+    gdf = gdf.drop_duplicates(subset='nationalCadastralReference')
+
+    # Select features based on the key, also if the server ignored the filter
     selected_rows = gdf[gdf['nationalCadastralReference'].str.startswith(key)].reset_index(drop=True)
     return selected_rows, exception
 
+def get_shapes_from_wfs(wfs_url, keys, bboxes, layer_name, max_workers=WFS_WORKERS, progress=None):
+    '''
+    Loads the shapes of several keys (e.g. Gemarkungen) concurrently from a WFS service.
+
+    `get_shape_from_wfs` is called for each key and bounding box in a thread pool. The capabilities of the
+    service are requested before the threads start, so all requests share them.
+
+    Parameters
+    ----------
+    wfs_url : str
+        The URL of the WFS service.
+    keys : list of str
+        The keys for filtering (e.g., Gemeinde or Gemarkung).
+    bboxes : list of tuple
+        The bounding box of each key in the format (minx, miny, maxx, maxy).
+    layer_name : str
+        The name of the layer containing the desired shapes.
+    max_workers : int, optional
+        The number of keys loaded concurrently (default is `WFS_WORKERS`). The requests of all keys and pages
+        are limited to `WFS_MAX_REQUESTS` at the same time.
+    progress : callable, optional
+        Called with the number of finished keys and the number of keys (default is None). If it raises an
+        exception, the queued requests are dropped.
+
+    Returns
+    -------
+    GeoDataFrame
+        The shapes of all keys in the order of the keys.
+    list of str
+        The keys whose shapes may be incomplete, see `get_shape_from_wfs`.
+    '''
+    wfs_service(wfs_url)
+
+    results = {}
+    incomplete = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_shape_from_wfs, wfs_url, key, bbox, layer_name): i 
+                   for i, (key, bbox) in enumerate(zip(keys, bboxes))}
+        try:
+            for n, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                results[i], exception = future.result()
+                if exception == 1:
+                    incomplete.append(keys[i])
+                if progress is not None:
+                    progress(n, len(futures))
+        except BaseException:
+            # drop the queued requests, e.g. if the task was cancelled in the progress callback
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    gdf = pd.concat([results[i] for i in sorted(results)], ignore_index=True)
+    return gdf, incomplete
+
+
+def select_by_parcels(gdf, parcels_gdf):
+    '''
+    Selects the features that intersect at least one parcel.
+
+    Instead of intersecting the features with the union of all parcels, the features are queried 
+    against the spatial index of the individual parcels. Features on several parcels are selected once.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        The features to select from, e.g. buildings or streets.
+    parcels_gdf : GeoDataFrame
+        The parcels of the selected area.
+
+    Returns
+    -------
+    GeoDataFrame
+        The features intersecting the parcels in their original order.
+
+    Examples
+    --------
+    >>> buildings_gdf = select_by_parcels(buildings_gdf, parcels_gdf)
+    '''
+    geometries = gdf.geometry
+    if parcels_gdf.crs is not None and gdf.crs is not None and parcels_gdf.crs != gdf.crs:
+        geometries = geometries.to_crs(parcels_gdf.crs)
+    feature_index, _ = parcels_gdf.sindex.query(geometries, predicate='intersects')
+    return gdf.iloc[np.unique(feature_index)]
+
+def repair_geometries(gdf):
+    '''
+    Repairs the invalid geometries of a GeoDataFrame.
+
+    The validity of all geometries is checked at once and only the invalid geometries are repaired
+    with `make_valid`. Polygons are repaired with the 'structure' method, which unites overlapping parts
+    and drops collapsed parts like `buffer(0)` does, but keeps all parts of self-intersecting rings.
+    With shapely < 2.1, polygons are repaired with `buffer(0)`.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        The features to repair, e.g. buildings or parcels.
+
+    Returns
+    -------
+    GeoDataFrame
+        The features with valid geometries. The input is not changed.
+    int
+        The number of repaired geometries.
+
+    Examples
+    --------
+    >>> parcels_gdf, n_repaired = repair_geometries(parcels_gdf)
+    '''
+    geometries = gdf.geometry.to_numpy()
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    n_invalid = int(invalid.sum())
+    if n_invalid == 0:
+        return gdf, 0
+
+    repaired = geometries[invalid].copy()
+    polygonal = np.isin(shapely.get_type_id(repaired), [3, 6]) # Polygon, MultiPolygon
+    repaired[~polygonal] = shapely.make_valid(repaired[~polygonal])
+    try:
+        # overlapping parts are united and collapsed parts are dropped, like buffer(0) does
+        repaired[polygonal] = shapely.make_valid(repaired[polygonal], method='structure', keep_collapsed=False)
+    except TypeError:
+        # shapely < 2.1 has no structure method
+        repaired[polygonal] = shapely.buffer(repaired[polygonal], 0)
+
+    gdf = gdf.copy()
+    geometries = geometries.copy()
+    geometries[invalid] = repaired
+    gdf[gdf.geometry.name] = gpd.GeoSeries(geometries, index=gdf.index, crs=gdf.crs)
+    return gdf, n_invalid
 
 def clean_data(df):
     '''
@@ -351,6 +1412,7 @@ def clean_data(df):
     This method replaces specific invalid characters in the given DataFrame with valid alternatives. 
     The following replacements are made:
     - '\x96' and '' are replaced with '-'.
+    Only the string columns are searched, numeric columns cannot contain these characters.
 
     Parameters
     ----------
@@ -362,7 +1424,9 @@ def clean_data(df):
     pd.DataFrame
         The cleaned DataFrame with invalid characters replaced.
     '''
-    df.replace({'\x96': '-', 'â': '-', '': '-'}, regex=True, inplace=True)
+    string_columns = df.select_dtypes(include=['object', 'string']).columns
+    if len(string_columns):
+        df[string_columns] = df[string_columns].replace({'\x96': '-', 'â': '-', '': '-'}, regex=True)
     return df
 
 def add_point(df):
@@ -370,7 +1434,8 @@ def add_point(df):
     Adds a point geometry to the DataFrame based on X and Y coordinates.
 
     This method creates a 'point' column in the DataFrame by generating Point geometries 
-    from the 'X_MP_100m' and 'Y_MP_100m' coordinate columns.
+    from the 'X_MP_100m' and 'Y_MP_100m' coordinate columns. The points are created from the 
+    coordinate arrays at once.
 
     Parameters
     ----------
@@ -383,7 +1448,8 @@ def add_point(df):
     pd.DataFrame
         The DataFrame with an additional 'point' column containing the Point geometries.
     '''
-    df['point'] = df.apply(lambda row: Point(row['x_mp_100m'], row['y_mp_100m']), axis=1)
+    df['point'] = gpd.GeoSeries(shapely.points(df['x_mp_100m'].to_numpy(dtype=float), df['y_mp_100m'].to_numpy(dtype=float)), 
+                                index=df.index)
     return df
 
 def create_square(point, size):
@@ -392,28 +1458,64 @@ def create_square(point, size):
 
     This method generates a square-shaped polygon centered on the provided point. 
     The square's side length is determined by the size parameter, and the square is 
-    oriented parallel to the axes.
+    oriented parallel to the axes. An array or GeoSeries of points is processed at once.
 
     Parameters
     ----------
-    point : shapely.geometry.Point
+    point : shapely.geometry.Point or array-like of Points
         The central point around which the square will be created. It should have 'x' and 'y' coordinates.
     size : float
         The total side length of the square.
 
     Returns
     -------
-    shapely.geometry.Polygon
-        A square-shaped polygon centered around the input point.
+    shapely.geometry.Polygon or numpy.ndarray of Polygons
+        A square-shaped polygon centered around the input point, or one square per point.
     '''
-    x, y = point.x, point.y
+    x, y = shapely.get_x(point), shapely.get_y(point)
     half_size = size / 2
-    return Polygon([
-        (x - half_size, y - half_size),
-        (x + half_size, y - half_size),
-        (x + half_size, y + half_size),
-        (x - half_size, y + half_size)
-    ])
+    return shapely.box(x - half_size, y - half_size, x + half_size, y + half_size)
+
+def combine_zensus(df_heating, df_energy, cell_size=100):
+    '''
+    Combines the heating types and the energy carriers of the Zensus grid into one layer of grid cells.
+
+    Both tables are cleaned (see `clean_data`) and joined on the coordinates of the cell centers, as they
+    use the same grid. Columns of both tables get the suffixes '_left' and '_right'.
+
+    Parameters
+    ----------
+    df_heating : pd.DataFrame
+        The Zensus table of heating types ('Heizungsart') with the columns 'x_mp_100m' and 'y_mp_100m'.
+    df_energy : pd.DataFrame
+        The Zensus table of energy carriers ('Energietraeger') with the same columns.
+    cell_size : float, optional
+        The edge length of the grid cells in meters (default is 100).
+
+    Returns
+    -------
+    GeoDataFrame
+        One square polygon per grid cell in EPSG:3035 with the attributes of both tables.
+
+    Examples
+    --------
+    >>> df_heating = read_csv_region_from_zip(url, 'Zensus2022_Heizungsart.zip', 'Zensus2022_Heizungsart_100m-Gitter', bbox)
+    >>> df_energy = read_csv_region_from_zip(url, 'Zensus2022_Energietraeger.zip', 'Zensus2022_Energietraeger_100m-Gitter', bbox)
+    >>> zensus_gdf = combine_zensus(df_heating, df_energy)
+    '''
+    df_heating = add_point(clean_data(df_heating))
+    df_energy = clean_data(df_energy)
+
+    # join on the grid cell coordinates, both tables use the same grid
+    shared_columns = [col for col in df_heating.columns if col in df_energy.columns and col != 'point']
+    df_heating = df_heating.rename(columns={col: f'{col}_left' for col in shared_columns})
+    df_energy = df_energy.rename(columns={col: f'{col}_right' for col in shared_columns})
+    combined = df_heating.merge(df_energy, how='inner', 
+                                left_on=['x_mp_100m_left', 'y_mp_100m_left'], right_on=['x_mp_100m_right', 'y_mp_100m_right'])
+
+    # square of each grid cell
+    combined['geometry'] = create_square(combined['point'], cell_size)
+    return gpd.GeoDataFrame(combined.drop(columns=['point']), geometry='geometry', crs='EPSG:3035')
 
 def get_area_for_zensus(df):
     # Prüfe, ob die 'bbox'-Spalte existiert und konvertiere sie zu Polygonen
@@ -7,6 +7,11 @@ import matplotlib.pyplot as plt
 from openpyxl import load_workbook
 import sys
 import os
+try:
+    from .read_files import read_layer, layer_columns
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from read_files import read_layer, layer_columns
 
 def get_closest_point(line, point):
     '''
@@ -142,12 +147,15 @@ class Streets:
     ----------
     gdf : GeoDataFrame
         A GeoDataFrame containing street geometries and attributes.
+    columns : list of str
+        The attributes read from the street file. Only the possible routes are needed for the network.
 
     Methods
     -------
-    add_connection_to_streets(buildings, sources):
+    add_connection_to_streets(buildings, sources, progress=None):
         Inserts connection points into the street lines based on buildings and energy sources.
     '''
+    columns = ['Moegliche_Route']
 
     def __init__(self, path, layer = None):
         '''
@@ -160,12 +168,9 @@ class Streets:
         layer : str, optional
             The layer to read from the file (default is None).
         '''
-        if layer == None:
-            self.gdf = gpd.read_file(path)
-        else: 
-            self.gdf = gpd.read_file(path, layer=layer)
+        self.gdf = read_layer(path, layer=layer, columns=self.columns)
 
-    def add_connection_to_streets(self, buildings, sources):
+    def add_connection_to_streets(self, buildings, sources, progress=None):
         '''
         Inserts connection points from buildings and energy sources into the street lines.
 
@@ -175,10 +180,16 @@ class Streets:
             A GeoDataFrame containing building geometries and attributes, including 'street_id' and 'Anschlusspunkt'.
         sources : GeoDataFrame
             A GeoDataFrame containing energy source geometries and attributes, including 'street_id' and 'Anschlusspunkt'.
+        progress : callable, optional
+            Called with the number of inserted and the number of all connection points (default is None).
         '''
-
+        total = len(buildings) + len(sources)
+        done = 0
         for df in [buildings, sources]:
             for index, row in df.iterrows():
+                done += 1
+                if progress is not None:
+                    progress(done, total)
                 street_id = row['street_id']
                 if not pd.isna(street_id):
                     anschlusspunkt = row['Anschlusspunkt']
@@ -210,12 +221,15 @@ class Source:
     ----------
     gdf : GeoDataFrame
         A GeoDataFrame containing source geometries and attributes.
+    columns : list of str
+        The attributes read from the source file. Only the geometry of the sources is needed.
 
     Methods
     -------
     closest_points_sources(streets):
         Finds the closest points on the street network for each energy source and adds these points to the GeoDataFrame.
     '''
+    columns = []
 
     def __init__(self, path, layer = None):
         '''
@@ -228,10 +242,7 @@ class Source:
         layer : str, optional
             The layer to read from the file (default is None).
         '''
-        if layer == None:
-            self.gdf = gpd.read_file(path)
-        else: 
-            self.gdf = gpd.read_file(path, layer=layer)
+        self.gdf = read_layer(path, layer=layer, columns=self.columns)
         
     def closest_points_sources(self, streets):
         '''
@@ -276,7 +287,8 @@ class Buildings:
     Attributes
     ----------
     buildings_all : GeoDataFrame
-        A GeoDataFrame containing all building geometries and attributes.
+        A GeoDataFrame containing the building geometries and attributes read from the file. If the heat 
+        attribute exists, only buildings with a heat consumption greater than zero are read.
     gdf : GeoDataFrame
         A GeoDataFrame containing buildings with a specified heat attribute greater than zero.
 
@@ -284,7 +296,7 @@ class Buildings:
     -------
     add_centroid():
         Adds the centroid of each building's geometry to the GeoDataFrame.
-    closest_points_buildings(streets):
+    closest_points_buildings(streets, progress=None):
         Finds the closest point on the street network for each building and adds these points to the GeoDataFrame.
     '''
 
@@ -301,10 +313,9 @@ class Buildings:
         layer : str, optional
             The layer to read from the file (default is None).
         '''
-        if layer == None:
-            self.buildings_all = gpd.read_file(path)
-        else: 
-            self.buildings_all = gpd.read_file(path, layer=layer)
+        # Read only buildings with heat consumption if the attribute exists
+        where = f'"{heat_att}" > 0' if heat_att in layer_columns(path, layer) else None
+        self.buildings_all = read_layer(path, layer=layer, where=where)
         
         # Filter buildings with heat consumption
         try:
@@ -325,7 +336,7 @@ class Buildings:
         self.gdf = self.gdf.copy() # Suppress warning
         self.gdf['centroid'] = self.gdf.loc[:, 'geometry'].centroid
 
-    def closest_points_buildings(self, streets):
+    def closest_points_buildings(self, streets, progress=None):
         '''
         Finds the closest point on the street network for each building and adds these points to the GeoDataFrame.
 
@@ -333,6 +344,8 @@ class Buildings:
         ----------
         streets : GeoDataFrame
             A GeoDataFrame containing street geometries and attributes.
+        progress : callable, optional
+            Called with the number of snapped and the number of all buildings (default is None).
 
         Notes
         -----
@@ -343,7 +356,9 @@ class Buildings:
         sindex = streets.sindex
 
         # Iterate over each building centroid
-        for index, row_p in self.gdf.iterrows():
+        for n, (index, row_p) in enumerate(self.gdf.iterrows(), start=1):
+            if progress is not None:
+                progress(n, len(self.gdf))
             centroid = row_p['centroid']
 
             # Use spatial index to get the nearest lines to the centroid
@@ -602,7 +617,7 @@ class Net:
         Adds or updates an attribute to an edge in the network graph.
     add_edge_attributes(pipe_info):
         Adds attributes to the network edges such as GLF, power_th_GLF, volumeflow, DN, velocity, and loss.
-    network_analysis(G, buildings, sources, pipe_info, power_th_att, weight='length', progressBar=None):
+    network_analysis(G, buildings, sources, pipe_info, power_th_att, weight='length', progress=None):
         Calculates the network by finding the shortest path to each building.
     plot_network(streets, buildings, sources, filename, title='Street network and calculated network'):
         Plots the street network, buildings, and calculated network, and saves the image.
@@ -668,7 +683,7 @@ class Net:
             data['loss [kWh/a]'] = loss
             data['loss_extra_insulation [kWh/a]'] = loss_extra
 
-    def network_analysis(self, G, buildings, sources, pipe_info, power_th_att, weight='length [m]', progressBar=None):
+    def network_analysis(self, G, buildings, sources, pipe_info, power_th_att, weight='length [m]', progress=None):
         '''
         Calculates the network by finding the shortest path to each building.
 
@@ -686,13 +701,15 @@ class Net:
             Attribute name for thermal power in the buildings GeoDataFrame.
         weight : str, optional
             Edge weight attribute for shortest path calculation (default is 'length [m]').
-        progressBar : callable, optional
-            Progress bar function (default is None).
+        progress : callable, optional
+            Called with the number of routed and the number of all buildings (default is None).
         '''
 
         start_point = (sources['geometry'][0].x, sources['geometry'][0].y)
 
-        for idx, row in buildings.iterrows():
+        for n, (idx, row) in enumerate(buildings.iterrows(), start=1):
+            if progress is not None:
+                progress(n, len(buildings))
             end_point = (row['centroid'].x, row['centroid'].y)
             power_th = row[power_th_att]
             buildings_count = 1
@@ -880,10 +897,10 @@ class Result:
             # Initialize an empty DataFrame for the result
             result = pd.DataFrame({'DN [mm]': dn_list}, index=dn_list)
             result['Anzahl Hausanschluesse'] = 0
-            result['Hausanschlusslaenge [m]'] = 0
-            result['Trassenlaenge [m]'] = 0
-            result['Verlust [MWh/a]'] = 0
-            result['Verlust bei extra Daemmung [MWh/a]'] = 0
+            result['Hausanschlusslaenge [m]'] = 0.0
+            result['Trassenlaenge [m]'] = 0.0
+            result['Verlust [MWh/a]'] = 0.0
+            result['Verlust bei extra Daemmung [MWh/a]'] = 0.0
 
             # Group by DN and type
             grouped = df.groupby(['DN [mm]', 'Typ'])
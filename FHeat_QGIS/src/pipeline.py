@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+
+try:
+    from .download_files import file_catalog_from_URL, read_file_from_zip, read_csv_region_from_zip, filter_df
+    from .adjust_files import adjust_buildings_tiled
+    from .read_files import read_layer, layer_columns
+    from .reference_data import load_excel, load_cities, user_cache_dir
+    from .stage_cache import StageCache
+    from .stages import (BAK_BINS, BAK_LABELS, BUILDING_CLASS, download_layers, download_zensus_grid, adjust_buildings,
+                         adjust_streets, analyse_heat_density, polygon_paths, net_graph, disconnected_buildings, route_net,
+                         net_buildings, save_net, create_result, save_result)
+    from .net_analysis import Result
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from download_files import file_catalog_from_URL, read_file_from_zip, read_csv_region_from_zip, filter_df
+    from adjust_files import adjust_buildings_tiled
+    from read_files import read_layer, layer_columns
+    from reference_data import load_excel, load_cities, user_cache_dir
+    from stage_cache import StageCache
+    from stages import (BAK_BINS, BAK_LABELS, BUILDING_CLASS, download_layers, download_zensus_grid, adjust_buildings,
+                        adjust_streets, analyse_heat_density, polygon_paths, net_graph, disconnected_buildings, route_net,
+                        net_buildings, save_net, create_result, save_result)
+    from net_analysis import Result
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(PLUGIN_DIR, 'data')
+CACHE_DIR = user_cache_dir()
+STAGE_CACHE_DIR = os.path.join(CACHE_DIR, 'stages')
+
+STAGES = ['download', 'zensus', 'adjust', 'status', 'net', 'result']
+
+# settings of a run, each run of the config file can overwrite them
+DEFAULT_CONFIG = {
+    'output_dir': 'fheat_batch',
+    'workers': 1,
+    'stages': ['download', 'adjust', 'status', 'net', 'result'],
+    'area': 'municipality', # 'municipality' or 'city' (district)
+    'file_format': '.gpkg',
+    'adjust_heat_attribute': 'RW_WW',
+    'heat_attribute': 'RW_WW [kWh/a]',
+    'power_attribute': 'Leistung_th [kW]',
+    'tile_size': None, # tiled adjust mode with this tile size in m
+    'tile_workers': 1,
+    'clean_topology': False, # snap near-miss street endpoints and node crossing streets
+    'wld_thresholds': [0.1],
+    't_supply': 80,
+    't_return': 50,
+    'temperature': None, # temperature file, default data/example_temperature.xlsx
+    'building_class': BUILDING_CLASS, # building age class of the load profiles of residential buildings
+    'paths': {}
+}
+
+def load_config(path):
+    '''
+    Reads a batch configuration from a JSON file.
+
+    The file contains the default settings of `DEFAULT_CONFIG` and a list 'runs'. Each run is a name of a
+    municipality (or district, with 'area': 'city') or a dict with 'name' and settings that overwrite the
+    defaults. Relative paths are resolved relative to the directory of the config file.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the config file.
+
+    Returns
+    -------
+    list of dict
+        The complete settings of each run.
+
+    Examples
+    --------
+    A config file for two municipalities, one of them with an existing source layer::
+
+        {
+            "output_dir": "results",
+            "workers": 2,
+            "runs": [
+                "Borken",
+                {"name": "Ahaus", "t_supply": 90, "paths": {"source": "sources/ahaus.gpkg"}}
+            ]
+        }
+    '''
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    defaults = dict(DEFAULT_CONFIG)
+    defaults.update({key: value for key, value in config.items() if key != 'runs'})
+
+    runs = []
+    for entry in config.get('runs', []):
+        run = dict(defaults)
+        run.update({'name': entry} if isinstance(entry, str) else entry)
+        run['paths'] = dict(defaults['paths'], **run.get('paths', {}))
+        run['output_dir'] = os.path.join(base_dir, run['output_dir'])
+        run['paths'] = {key: os.path.join(base_dir, value) for key, value in run['paths'].items()}
+        if run['temperature'] is not None:
+            run['temperature'] = os.path.join(base_dir, run['temperature'])
+        runs.append(run)
+    return runs
+
+def run_paths(run):
+    '''
+    Returns the file paths of the inputs and outputs of a run.
+
+    All files are written to '<output_dir>/<name>'. Paths given in 'paths' of the run are used instead,
+    e.g. to start with existing files or to add a 'source' and a 'polygon' layer for the network analysis.
+    '''
+    directory = os.path.join(run['output_dir'], run['name'])
+    layers = ['buildings', 'streets', 'parcels', 'zensus', 'buildings_adj', 'streets_adj', 'streets_wld', 'polygons', 'net']
+    paths = {layer: os.path.join(directory, layer + run['file_format']) for layer in layers}
+    paths.update({'dir': directory, 'result': os.path.join(directory, 'result.xlsx'), 'source': None, 'polygon': None})
+    paths.update(run['paths'])
+    return paths
+
+def stage_download(run, paths):
+    '''
+    Downloads buildings, streets and parcels of the municipality or district, see `download_layers`.
+    '''
+    cities = load_cities(os.path.join(DATA_DIR, 'cities.xlsx'), cache_dir=CACHE_DIR)
+    filtered_df = filter_df(run['name'], cities, run['area'])
+    if filtered_df is None or filtered_df.empty:
+        raise ValueError(f"{run['name']} not found in the {run['area']} names")
+
+    buildings_gdf, streets_gdf, parcels_gdf, incomplete_keys = download_layers(filtered_df, run['area'], file_catalog_from_URL,
+                                                                               read_file_from_zip)
+    for key in incomplete_keys:
+        print(f'{run["name"]}: parcels of key {key} may be incomplete')
+
+    buildings_gdf.to_file(paths['buildings'])
+    streets_gdf.to_file(paths['streets'])
+    parcels_gdf.to_file(paths['parcels'])
+
+def stage_zensus(run, paths):
+    '''
+    Downloads the heating types and energy carriers of the Zensus grid, see `download_zensus_grid`.
+    '''
+    cities = load_cities(os.path.join(DATA_DIR, 'cities.xlsx'), cache_dir=CACHE_DIR)
+    filtered_df = filter_df(run['name'], cities, run['area'])
+    zensus_gdf = download_zensus_grid(filtered_df, os.path.join(CACHE_DIR, 'zensus'), read_csv_region_from_zip)
+    zensus_gdf.to_file(paths['zensus'])
+
+def stage_adjust(run, paths):
+    '''
+    Adjusts buildings and streets, see `adjust_buildings`, `adjust_buildings_tiled` and `adjust_streets`.
+    Buildings that are already adjusted are used as they are.
+    '''
+    excel_path = os.path.join(DATA_DIR, 'building_info.xlsx')
+    building_info = load_excel(excel_path, sheet_name='database', cache_dir=CACHE_DIR)
+    building_demand_wg = load_excel(excel_path, sheet_name='Grunddaten_Gebaeude', nrows=13, usecols='A:D', cache_dir=CACHE_DIR)
+    heat_att = run['adjust_heat_attribute']
+    zensus = read_layer(paths['zensus']) if os.path.exists(paths['zensus']) else None
+
+    if 'Leistung_th [kW]' in layer_columns(paths['buildings']):
+        print(f'{run["name"]}: buildings already adjusted')
+        paths['buildings_adj'] = paths['buildings']
+    elif run['tile_size']:
+        adjust_buildings_tiled(paths['buildings'], paths['parcels'], paths['buildings_adj'], heat_att, building_info,
+                               building_demand_wg, BAK_BINS, BAK_LABELS, zensus=zensus, tile_size=run['tile_size'],
+                               workers=run['tile_workers'])
+    else:
+        buildings_gdf = adjust_buildings(paths['buildings'], paths['parcels'], heat_att, building_info, building_demand_wg, zensus=zensus)
+        buildings_gdf.to_file(paths['buildings_adj'])
+
+    streets_gdf, feedback = adjust_streets(paths['streets'], run['clean_topology'])
+    if feedback:
+        print(f'{run["name"]}: {feedback}')
+    streets_gdf.to_file(paths['streets_adj'])
+
+def stage_status(run, paths):
+    '''
+    Calculates the heat line density of the streets and the heat density polygons, see `analyse_heat_density`.
+    '''
+    wld_values = sorted({float(value) for value in run['wld_thresholds']}, reverse=True)
+    streets_gdf, polygons_dict = analyse_heat_density(paths['buildings_adj'], paths['streets_adj'], paths['parcels'], wld_values,
+                                                 run['heat_attribute'], run['power_attribute'])
+    streets_gdf.to_file(paths['streets_wld'])
+    for polygon_path, gdf in polygon_paths(paths['polygons'], polygons_dict).items():
+        gdf.to_file(polygon_path)
+
+def net_graph_key(stage_cache, run, paths):
+    '''
+    Returns the stage cache key of the buildings, sources and street graph of a run, see `HeatNetTool.net_graph_key`.
+    '''
+    return stage_cache.key('net_graph', [paths['buildings_adj'], paths['source'], paths['streets_adj'], paths['polygon']],
+                           heat_attribute=run['heat_attribute'])
+
+def stage_net(run, paths):
+    '''
+    Calculates the heat network from the source along the streets to the buildings, see `net_graph` and `route_net`.
+    The connection points, the graph and the routed net of unchanged inputs are loaded from the stage cache.
+    '''
+    if paths['source'] is None:
+        raise ValueError("The network analysis needs a 'source' layer in 'paths'")
+    if run['t_supply'] <= run['t_return']:
+        raise ValueError('The return temperature has to be smaller than the supply temperature')
+    pipe_info = load_excel(os.path.join(DATA_DIR, 'pipe_data.xlsx'), sheet_name='pipe_data', cache_dir=CACHE_DIR)
+    stage_cache = StageCache(STAGE_CACHE_DIR)
+
+    graph_key = net_graph_key(stage_cache, run, paths)
+    buildings_gdf, source_gdf, graph = net_graph(stage_cache, graph_key, paths['buildings_adj'], paths['source'], paths['streets_adj'],
+                                                 run['heat_attribute'], paths['polygon'])
+
+    # all buildings have to be connected to the source
+    start_point, connected_points, disconnected = disconnected_buildings(graph, buildings_gdf, source_gdf)
+    if disconnected:
+        raise ValueError(f'{len(disconnected)} buildings are not connected to the street network')
+
+    net_gdf = route_net(stage_cache, graph_key, graph, buildings_gdf, source_gdf, pipe_info, run['t_supply'], run['t_return'],
+                        run['power_attribute'])
+    save_net(net_gdf, paths['net'], stage_cache)
+
+def stage_result(run, paths):
+    '''
+    Creates the result file with the summary, the building statistic and the load profile, see `create_result`.
+    The plots are saved in the directory of the run.
+    '''
+    pipe_info = load_excel(os.path.join(DATA_DIR, 'pipe_data.xlsx'), sheet_name='pipe_data', cache_dir=CACHE_DIR)
+    temp_path = run['temperature'] or os.path.join(DATA_DIR, 'example_temperature.xlsx')
+    temp_profile = load_excel(temp_path, cache_dir=CACHE_DIR)
+
+    # buildings and net of the network analysis if its inputs and the net file are unchanged
+    stage_cache = StageCache(STAGE_CACHE_DIR)
+    graph_artifact = stage_cache.load('net_graph', net_graph_key(stage_cache, run, paths))
+    if graph_artifact is not None:
+        buildings_gdf = graph_artifact['buildings']
+    else:
+        buildings_gdf = net_buildings(paths['buildings_adj'], run['heat_attribute'], paths['polygon']).gdf
+    net_gdf = stage_cache.load('net_file', stage_cache.key('net_file', [paths['net']]))
+    if net_gdf is None:
+        net_gdf = gpd.read_file(paths['net'])
+
+    if Result(paths['result']).is_excel_file_open():
+        raise ValueError('The result file is open in another application')
+    result, load_profile = create_result(buildings_gdf, net_gdf, paths['result'], pipe_info, run['heat_attribute'], run['t_supply'],
+                                         run['t_return'], temp_profile['TT_TU'], paths['dir'], building_class=run['building_class'])
+    save_result(result, load_profile, os.path.join(DATA_DIR, 'result.xlsx'), paths['dir'])
+
+STAGE_FUNCTIONS = {
+    'download': stage_download,
+    'zensus': stage_zensus,
+    'adjust': stage_adjust,
+    'status': stage_status,
+    'net': stage_net,
+    'result': stage_result
+}
+
+def run_pipeline(run):
+    '''
+    Runs the stages of one run one after another.
+
+    Errors are caught, so a failing municipality does not stop the other runs of a batch.
+
+    Parameters
+    ----------
+    run : dict
+        The settings of the run, see `load_config`.
+
+    Returns
+    -------
+    dict
+        The name, the status ('complete' or 'error'), the finished stages, the error message and the run time.
+    '''
+    paths = run_paths(run)
+    os.makedirs(paths['dir'], exist_ok=True)
+    summary = {'name': run['name'], 'status': 'complete', 'stages': [], 'message': '', 'seconds': 0.0}
+    start = time.perf_counter()
+    for stage in [stage for stage in STAGES if stage in run['stages']]:
+        try:
+            print(f'{run["name"]}: {stage}...')
+            STAGE_FUNCTIONS[stage](run, paths)
+            summary['stages'].append(stage)
+        except Exception as e:
+            summary['status'] = 'error'
+            summary['message'] = f'{stage}: {e}'
+            traceback.print_exc()
+            break
+    summary['seconds'] = round(time.perf_counter() - start, 1)
+    return summary
+
+def run_batch(runs, workers=1):
+    '''
+    Runs several municipalities or scenarios, in a process pool if `workers` is greater than 1.
+
+    Parameters
+    ----------
+    runs : list of dict
+        The settings of each run, see `load_config`.
+    workers : int, optional
+        The number of processes (default is 1, one run after another).
+
+    Returns
+    -------
+    list of dict
+        The summary of each run in the order of the runs, see `run_pipeline`.
+    '''
+    if workers > 1 and len(runs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run_pipeline, runs))
+    return [run_pipeline(run) for run in runs]
+
+def main(argv=None):
+    '''
+    Command line interface of the headless pipeline.
+
+    Runs download, adjustment, status analysis, network analysis and result of the runs in a config file
+    (see `load_config`) without QGIS. From the plugin directory::
+
+        python -m src.pipeline batch.json --workers 4
+    '''
+    parser = argparse.ArgumentParser(description='F|Heat pipeline without QGIS: download, adjust, status, net and result for the runs of a config file.')
+    parser.add_argument('config', help='JSON config file with the settings and the runs')
+    parser.add_argument('--workers', type=int, help='number of runs in parallel (overwrites "workers" of the config file)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help='stages to run (overwrites "stages" of the config file)')
+    args = parser.parse_args(argv)
+
+    runs = load_config(args.config)
+    if args.stages:
+        for run in runs:
+            run['stages'] = args.stages
+    workers = args.workers if args.workers is not None else max([run['workers'] for run in runs], default=1)
+
+    summaries = run_batch(runs, workers)
+    for summary in summaries:
+        print(f"{summary['name']}: {summary['status']} ({', '.join(summary['stages'])}) {summary['seconds']} s {summary['message']}")
+    if runs:
+        with open(os.path.join(runs[0]['output_dir'], 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+    return 0 if all(summary['status'] == 'complete' for summary in summaries) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+try:
+    from qgis.core import QgsFeatureRequest, QgsRectangle, QgsVectorLayerFeatureSource
+    from qgis.PyQt.QtCore import QVariant
+except ImportError:
+    QgsFeatureRequest = QgsRectangle = QgsVectorLayerFeatureSource = QVariant = None
+
+# number of features whose geometries are converted at once
+LAYER_BATCH_SIZE = 50000
+
+def _python_values(values):
+    '''
+    Converts attribute values of QGIS features to Python values. NULL becomes None, dates and times become
+    datetime objects.
+    '''
+    converted = []
+    for value in values:
+        if QVariant is not None and isinstance(value, QVariant):
+            value = None
+        elif hasattr(value, 'toPyDateTime'):
+            value = value.toPyDateTime()
+        elif hasattr(value, 'toPyDate'):
+            value = value.toPyDate()
+        elif hasattr(value, 'toPyTime'):
+            value = value.toPyTime()
+        converted.append(value)
+    return converted
+
+def _single_parts(geometries):
+    '''
+    Returns the single part of multi geometries with only one part, as QGIS promotes the features of
+    some formats (e.g. shapefiles) to multi geometries.
+    '''
+    single = np.isin(shapely.get_type_id(geometries), [4, 5, 6]) & (shapely.get_num_geometries(geometries) == 1)
+    if single.any():
+        geometries = geometries.copy()
+        geometries[single] = shapely.get_geometry(geometries[single], 0)
+    return geometries
+
+class LayerSnapshot:
+    '''
+    A class to read the features of a QGIS vector layer into a GeoDataFrame without reading its file.
+
+    The feature source is taken from the layer in the main thread and can then be read in a background
+    thread. The features include unsaved edits, and memory layers can be read as well.
+
+    Attributes
+    ----------
+    source : QgsVectorLayerFeatureSource
+        The thread-safe feature source of the layer.
+    fields : QgsFields
+        The attributes of the layer.
+    crs : str
+        The CRS of the layer as authority code or WKT.
+    name : str
+        The name of the layer in the project.
+    path : str or None
+        The file path of the layer if the features equal the file content (no unsaved edits, no subset
+        filter), else None. Used as key for cached results.
+    layer_name : str or None
+        The name of the layer within the file, e.g. of a GeoPackage.
+
+    Methods
+    -------
+    columns():
+        Returns the attribute names of the layer.
+    to_gdf(columns=None, where=None, bbox=None, batch_size=LAYER_BATCH_SIZE):
+        Reads the features into a GeoDataFrame.
+    '''
+    def __init__(self, layer):
+        '''
+        Initializes the LayerSnapshot class. Has to be called in the main thread.
+
+        Parameters
+        ----------
+        layer : QgsVectorLayer
+            The vector layer of the project.
+        '''
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.fields = layer.fields()
+        self.crs = layer.crs().authid() or layer.crs().toWkt() or None
+        self.name = layer.name()
+
+        # file of the layer
+        parts = layer.source().split('|')
+        options = dict(part.split('=', 1) for part in parts[1:] if '=' in part)
+        self.layer_name = options.get('layername')
+        unchanged = layer.providerType() == 'ogr' and not layer.isModified() and not layer.subsetString()
+        self.path = parts[0] if unchanged and os.path.exists(parts[0]) else None
+
+    def columns(self):
+        '''
+        Returns the attribute names of the layer.
+
+        Returns
+        -------
+        list of str
+            The attribute names, the geometry is not included.
+        '''
+        return [field.name() for field in self.fields]
+
+    def to_gdf(self, columns=None, where=None, bbox=None, batch_size=LAYER_BATCH_SIZE):
+        '''
+        Reads the features of the layer into a GeoDataFrame.
+
+        Only the requested attributes are fetched. The geometries are collected as WKB and converted in
+        batches, the attributes are collected per column and converted once.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            The attributes to read. Attributes missing in the layer are ignored. An empty list reads the
+            geometry only (default is None, all attributes).
+        where : str, optional
+            QGIS expression to filter the features, e.g. '"RW_WW" > 0' (default is None).
+        bbox : tuple of float, optional
+            Bounding box (minx, miny, maxx, maxy) in the CRS of the layer (default is None).
+        batch_size : int, optional
+            The number of geometries converted at once (default is LAYER_BATCH_SIZE).
+
+        Returns
+        -------
+        GeoDataFrame
+            The features with the requested attributes and the geometry.
+        '''
+        fields = self.columns()
+        names = fields if columns is None else [column for column in dict.fromkeys(columns) if column in fields]
+        indices = [self.fields.indexOf(name) for name in names]
+
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes(indices)
+        if where:
+            request.setFilterExpression(where)
+        if bbox is not None:
+            request.setFilterRect(QgsRectangle(*bbox))
+
+        # column buffers
+        values = [[] for _ in names]
+        geometry_batches = []
+        wkb = []
+        for feature in self.source.getFeatures(request):
+            geometry = feature.geometry()
+            wkb.append(None if geometry.isNull() else bytes(geometry.asWkb()))
+            attributes = feature.attributes()
+            for column, index in zip(values, indices):
+                column.append(attributes[index])
+            if len(wkb) == batch_size:
+                geometry_batches.append(shapely.from_wkb(np.array(wkb, dtype=object)))
+                wkb = []
+        geometry_batches.append(shapely.from_wkb(np.array(wkb, dtype=object)))
+
+        geometries = _single_parts(np.concatenate(geometry_batches))
+        data = {name: pd.Series(_python_values(column)) for name, column in zip(names, values)}
+        return gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(geometries, crs=self.crs), crs=self.crs)
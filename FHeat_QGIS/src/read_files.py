@@ -0,0 +1,122 @@
+import geopandas as gpd
+
+try:
+    from .qgis_layers import LayerSnapshot
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from qgis_layers import LayerSnapshot
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+def arrow_available():
+    '''
+    Checks if the Arrow based read path of pyogrio can be used.
+
+    Returns
+    -------
+    bool
+        True if pyogrio and pyarrow can be imported.
+    '''
+    if pyogrio is None:
+        return False
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+def layer_columns(path, layer=None):
+    '''
+    Returns the attribute names of a vector layer without reading its features.
+
+    Parameters
+    ----------
+    path : str or LayerSnapshot
+        The file path to the vector layer or a snapshot of a project layer.
+    layer : str, optional
+        The layer to read from the file (default is None).
+
+    Returns
+    -------
+    list of str
+        The attribute names of the layer, the geometry column is not included.
+    '''
+    if isinstance(path, LayerSnapshot):
+        return path.columns()
+    if pyogrio is not None:
+        return list(pyogrio.read_info(path, layer=layer)['fields'])
+    return [column for column in gpd.read_file(path, layer=layer, rows=0).columns if column != 'geometry']
+
+def layer_bounds(path, layer=None):
+    '''
+    Returns the total bounds of a vector layer.
+
+    Parameters
+    ----------
+    path : str or LayerSnapshot
+        The file path to the vector layer or a snapshot of a project layer.
+    layer : str, optional
+        The layer to read from the file (default is None).
+
+    Returns
+    -------
+    tuple of float
+        The bounds (minx, miny, maxx, maxy) of all features.
+    '''
+    if isinstance(path, LayerSnapshot):
+        return tuple(path.to_gdf(columns=[]).total_bounds)
+    if pyogrio is not None:
+        return tuple(pyogrio.read_info(path, layer=layer, force_total_bounds=True)['total_bounds'])
+    return tuple(read_layer(path, layer=layer, columns=[]).total_bounds)
+
+def read_layer(path, layer=None, columns=None, where=None, bbox=None):
+    '''
+    Reads a vector layer into a GeoDataFrame, loading only the requested columns and features.
+
+    With pyogrio, the column selection, the attribute filter and the bounding box are passed to GDAL, so
+    unneeded data is never loaded. If pyarrow is installed, the features are transferred as Arrow table.
+    Without pyogrio, the file is read with `gpd.read_file` and only the column selection and the bounding
+    box are applied. A `LayerSnapshot` of a project layer is read from QGIS instead of the file.
+
+    Parameters
+    ----------
+    path : str or LayerSnapshot
+        The file path to the vector layer or a snapshot of a project layer.
+    layer : str, optional
+        The layer to read from the file (default is None).
+    columns : list of str, optional
+        The attributes to read. Attributes missing in the layer are ignored. An empty list reads the
+        geometry only (default is None, all attributes).
+    where : str, optional
+        SQL WHERE clause to filter the features, e.g. '"RW_WW" > 0'. Only applied with pyogrio, so callers
+        should repeat the filter on the result (default is None).
+    bbox : tuple of float, optional
+        Bounding box (minx, miny, maxx, maxy) in the CRS of the layer (default is None).
+
+    Returns
+    -------
+    GeoDataFrame
+        The features of the layer with the requested attributes and the geometry.
+
+    Examples
+    --------
+    >>> buildings = read_layer("path/to/buildings.shp", columns=['RW_WW', 'NF'], where='"RW_WW" > 0')
+    '''
+    if isinstance(path, LayerSnapshot):
+        return path.to_gdf(columns=columns, where=where, bbox=bbox)
+
+    if columns is not None:
+        fields = layer_columns(path, layer)
+        columns = [column for column in dict.fromkeys(columns) if column in fields]
+
+    if pyogrio is not None:
+        return pyogrio.read_dataframe(path, layer=layer, columns=columns, where=where, bbox=bbox,
+                                      use_arrow=arrow_available())
+
+    gdf = gpd.read_file(path, layer=layer, bbox=bbox)
+    if columns is not None:
+        gdf = gdf[columns + [gdf.geometry.name]]
+    return gdf
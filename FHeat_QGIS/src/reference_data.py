@@ -0,0 +1,351 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import pandas as pd
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# compiled tables of the current session, keyed by file path and read options
+_session = {}
+
+# locks of the index files for the threads of this process, keyed by file path
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(path):
+    '''
+    Locks a file against other threads and processes, e.g. for the read-modify-write of a cache index.
+
+    The lock is held on a separate file `path + '.lock'`. If the lock file cannot be created, e.g. in a
+    read-only directory, only the threads of this process are locked out.
+
+    Parameters
+    ----------
+    path : str
+        The file path to lock.
+
+    Examples
+    --------
+    >>> with file_lock(index_path):
+    ...     index = read_json(index_path)
+    ...     index[url] = entry
+    ...     write_json(index_path, index)
+    '''
+    path = os.path.abspath(path)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+
+    with thread_lock:
+        try:
+            lock_file = open(path + '.lock', 'a+b')
+        except OSError:
+            yield
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass # LK_LOCK gives up after 10 s
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            lock_file.close()
+
+def user_cache_dir():
+    '''
+    Returns the cache directory of F-Heat in the profile of the user.
+
+    The plugin directory may be read-only and is replaced by plugin updates, so cached data is kept in the
+    settings directory of the QGIS profile. Outside of QGIS (see src/pipeline.py) the cache directory of the
+    platform is used.
+
+    Returns
+    -------
+    str
+        The directory path, it may not exist yet.
+    '''
+    try:
+        from qgis.core import QgsApplication
+        settings_dir = QgsApplication.qualifiedSettingsDirPath()
+    except ImportError:
+        settings_dir = ''
+    if settings_dir:
+        return os.path.join(settings_dir, 'cache', 'fheat')
+
+    try:
+        import platformdirs
+        return platformdirs.user_cache_dir('fheat', appauthor=False)
+    except ImportError:
+        base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'fheat')
+
+def read_json(path):
+    '''
+    Reads a JSON file, e.g. a cache index. Returns an empty dict if the file is missing or invalid.
+    '''
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_json(path, data):
+    '''
+    Writes a JSON file atomically, so readers never see a partly written file.
+
+    The data is written to a uniquely named temporary file in the same directory, which then replaces the file.
+    '''
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path) or '.',
+                                     prefix=os.path.basename(path) + '.', suffix='.tmp', delete=False) as f:
+        json.dump(data, f)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+def file_fingerprint(path, known=None):
+    '''
+    Returns modification time, size and SHA-256 hash of a file.
+
+    The hash is only computed if the modification time or the size differ from a known fingerprint, so
+    unchanged files are not read again.
+
+    Parameters
+    ----------
+    path : str
+        The file path.
+    known : dict, optional
+        A previously computed fingerprint with the keys 'mtime_ns', 'size' and 'sha256' (default is None).
+
+    Returns
+    -------
+    dict
+        The fingerprint with the keys 'mtime_ns', 'size' and 'sha256'.
+    '''
+    stat = os.stat(path)
+    fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if known and known.get('mtime_ns') == stat.st_mtime_ns and known.get('size') == stat.st_size:
+        fingerprint['sha256'] = known['sha256']
+        return fingerprint
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    fingerprint['sha256'] = sha.hexdigest()
+    return fingerprint
+
+def _options_key(options):
+    '''
+    Returns a short, stable key for the read options of a table.
+    '''
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+def write_table(df, base):
+    '''
+    Saves a table as Parquet or as pickle if Parquet is not available or cannot store the columns.
+
+    The table is written to a temporary file first, so readers never see a partly written table.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The table to save.
+    base : str
+        The file path without extension.
+
+    Returns
+    -------
+    str
+        The file path of the saved table ('.parquet' or '.pkl').
+    '''
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(base) or '.', prefix=os.path.basename(base) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+    try:
+        try:
+            df.to_parquet(tmp_path)
+            path = base + '.parquet'
+        except Exception:
+            df.to_pickle(tmp_path, compression=None)
+            path = base + '.pkl'
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def read_table(path):
+    '''
+    Reads a table saved by `write_table`.
+    '''
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+def compiled_table(path, name, compile_function, options=None, cache_dir=None):
+    '''
+    Returns a table compiled from a source file, using the session memory and a binary file cache.
+
+    The table is compiled with `compile_function` only if neither the session nor the cache directory hold
+    a table for the current content of the source file. Cached tables are found by the SHA-256 hash of the
+    source file; the hash is stored together with the modification time, so unchanged files are not hashed again.
+    Tables of earlier versions of the source file and fingerprints of deleted source files are removed.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the source file.
+    name : str
+        A name for the table, used to tell apart several tables of one source file.
+    compile_function : callable
+        A function without arguments that reads the source file and returns a DataFrame.
+    options : dict, optional
+        Options that change the compiled table, e.g. the read options (default is None).
+    cache_dir : str, optional
+        The directory for compiled tables (default is None, the 'tables' directory of `user_cache_dir`).
+        If the directory is not writable, the table is only kept in the session memory.
+
+    Returns
+    -------
+    DataFrame
+        The compiled table. The same object is returned for repeated calls within a session, so it must
+        not be modified in place.
+    '''
+    path = os.path.abspath(path)
+    key = f'{name}_{_options_key(options or {})}'
+    if cache_dir is None:
+        cache_dir = os.path.join(user_cache_dir(), 'tables')
+    index_path = os.path.join(cache_dir, 'index.json')
+
+    # session memory
+    stat = os.stat(path)
+    entry = _session.get((path, key))
+    if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['table']
+
+    # fingerprint of the source file
+    index = read_json(index_path)
+    fingerprint = file_fingerprint(path, index.get(path))
+    prefix = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(path))[0]}_{key}_')
+    base = prefix + fingerprint['sha256'][:16]
+
+    # compiled table of the cache directory
+    table = None
+    for cache_path in (base + '.parquet', base + '.pkl'):
+        if os.path.exists(cache_path):
+            try:
+                table = read_table(cache_path)
+                break
+            except Exception:
+                pass
+
+    # compile and save the table
+    if table is None:
+        table = compile_function()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_table(table, base)
+        except OSError as e:
+            print(f'Compiled table of {path} not saved: {e}')
+
+        # remove tables of earlier versions of the source file
+        old_paths = glob.glob(glob.escape(prefix) + '?' * 16 + '.parquet') + glob.glob(glob.escape(prefix) + '?' * 16 + '.pkl')
+        for old_path in old_paths:
+            if os.path.splitext(old_path)[0] != base:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    # remember fingerprint, forget fingerprints of deleted source files
+    if index.get(path) != fingerprint:
+        try:
+            with file_lock(index_path):
+                index = read_json(index_path)
+                index[path] = fingerprint
+                index = {source: known for source, known in index.items() if os.path.exists(source)}
+                write_json(index_path, index)
+        except OSError:
+            pass
+
+    _session[(path, key)] = {'mtime_ns': fingerprint['mtime_ns'], 'size': fingerprint['size'], 'table': table}
+    return table
+
+def load_excel(path, sheet_name=0, cache_dir=None, **kwargs):
+    '''
+    Reads a sheet of an Excel file through the compiled table cache.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the Excel file.
+    sheet_name : str or int, optional
+        The sheet to read (default is 0, the first sheet).
+    cache_dir : str, optional
+        The directory for compiled tables (default is None, see `compiled_table`).
+    **kwargs
+        Further arguments for `pd.read_excel`, e.g. `nrows` or `usecols`.
+
+    Returns
+    -------
+    DataFrame
+        The content of the sheet. Modify only copies of it.
+
+    Examples
+    --------
+    >>> pipe_info = load_excel("data/pipe_data.xlsx", sheet_name='pipe_data')
+    '''
+    options = dict(kwargs, sheet_name=sheet_name)
+    return compiled_table(path, 'excel', lambda: pd.read_excel(path, sheet_name=sheet_name, **kwargs), options, cache_dir)
+
+def load_cities(path, cache_dir=None):
+    '''
+    Reads the table of municipalities and cities with their bounding boxes.
+
+    The 'bbox' strings like '(minx, miny, maxx, maxy)' are parsed once for all rows and stored as four float
+    columns in the compiled table. The returned table has a 'bbox' column with lists of four floats.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the Excel file with the columns 'name', 'schluessel', 'gemeinde', 'gmdschl' and 'bbox'.
+    cache_dir : str, optional
+        The directory for compiled tables (default is None, see `compiled_table`).
+
+    Returns
+    -------
+    DataFrame
+        The municipalities and cities. 'schluessel' and 'gmdschl' are strings.
+    '''
+    bbox_columns = ['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy']
+
+    def compile_cities():
+        df = pd.read_excel(path, dtype={'schluessel': str, 'gmdschl': str})
+        df[bbox_columns] = df['bbox'].str.replace(r'[()\s]', '', regex=True).str.split(',', expand=True).astype(float)
+        return df.drop(columns='bbox')
+
+    df = compiled_table(path, 'cities', compile_cities, cache_dir=cache_dir).copy()
+    df['bbox'] = df[bbox_columns].to_numpy().tolist()
+    return df.drop(columns=bbox_columns)
@@ -0,0 +1,228 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import pandas as pd
+
+try:
+    from .reference_data import file_fingerprint, file_lock, read_json, write_json
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from reference_data import file_fingerprint, file_lock, read_json, write_json
+
+# artifacts of the current session, keyed by cache directory and stage
+_session = {}
+
+def dataset_files(path):
+    '''
+    Returns the files that hold the features of a vector dataset.
+
+    Parameters
+    ----------
+    path : str
+        The file path of the dataset. For shapefiles, the sidecar files are included, for GeoPackages the
+        write-ahead log of open edits.
+
+    Returns
+    -------
+    list of str
+        The existing files of the dataset.
+    '''
+    if path is None:
+        return []
+    path = os.path.abspath(str(path))
+    base, ext = os.path.splitext(path)
+    if ext.lower() == '.shp':
+        files = [base + extension for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg')]
+    else:
+        files = [path, path + '-wal']
+    return [file for file in files if os.path.exists(file)]
+
+def _param_value(value):
+    '''
+    Returns a JSON serializable value of a stage parameter. Tables are replaced by a hash of their content.
+    '''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return hashlib.sha256(pd.util.hash_pandas_object(value, index=True).values.tobytes()).hexdigest()
+    return value
+
+class StageCache:
+    '''
+    A class to persist intermediate results of the network stages, keyed by a fingerprint of their inputs.
+
+    The key of a stage is the SHA-256 hash of its input files and parameters, so a stage whose inputs are
+    unchanged can load its result instead of computing it again. The last result of each stage is kept in
+    the session memory, older results are read from pickle files in the cache directory.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory of the pickle files and of the file fingerprints.
+    max_entries : int
+        The number of results kept per stage in the cache directory.
+
+    Methods
+    -------
+    key(stage, paths=(), parents=(), **params):
+        Returns the key of a stage for its input files, previous stages and parameters.
+    load(stage, key):
+        Returns the cached result of a stage or None.
+    save(stage, key, artifact):
+        Saves the result of a stage.
+    '''
+    def __init__(self, cache_dir, max_entries=4):
+        '''
+        Initializes the StageCache class.
+
+        Parameters
+        ----------
+        cache_dir : str
+            The directory of the pickle files and of the file fingerprints.
+        max_entries : int, optional
+            The number of results kept per stage in the cache directory (default is 4).
+        '''
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'fingerprints.json')
+
+    def _artifact_path(self, stage, key):
+        return os.path.join(self.cache_dir, f'{stage}_{key[:16]}.pkl')
+
+    def key(self, stage, paths=(), parents=(), **params):
+        '''
+        Returns the key of a stage for its input files, previous stages and parameters.
+
+        The hash of a file is only computed if its modification time or size changed since the last call.
+        A stage that depends on an uncached stage is not cached either.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        paths : list of str, optional
+            The input datasets of the stage, None entries are allowed for optional inputs (default is ()).
+        parents : list of str or None, optional
+            The keys of the previous stages whose results are inputs of the stage (default is ()).
+        **params :
+            Further inputs, e.g. attribute names or temperatures. DataFrames are hashed by their content.
+
+        Returns
+        -------
+        str or None
+            The key of the stage, None if the key of a previous stage is None.
+        '''
+        if any(parent is None for parent in parents):
+            return None
+
+        index = read_json(self._index_path())
+        fingerprints = []
+        changed = {}
+        for path in paths:
+            files = []
+            for file in dataset_files(path):
+                fingerprint = file_fingerprint(file, index.get(file))
+                if index.get(file) != fingerprint:
+                    changed[file] = fingerprint
+                files.append([os.path.basename(file), fingerprint['sha256']])
+            fingerprints.append(files)
+
+        # remember fingerprints, the index is read again as other processes may have changed it
+        if changed:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with file_lock(self._index_path()):
+                    index = read_json(self._index_path())
+                    index.update(changed)
+                    write_json(self._index_path(), index)
+            except OSError:
+                pass
+
+        inputs = {'stage': stage, 'files': fingerprints, 'parents': list(parents),
+                  'params': {name: _param_value(value) for name, value in params.items()}}
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self, stage, key):
+        '''
+        Returns the cached result of a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        key : str or None
+            The key of the stage, see `key`. None disables the cache, e.g. for layers with unsaved edits.
+
+        Returns
+        -------
+        object or None
+            The result of the stage or None if no result is cached for the key. The same object is returned
+            for repeated calls within a session, so it must not be modified in place.
+        '''
+        if key is None:
+            return None
+
+        entry = _session.get((self.cache_dir, stage))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        path = self._artifact_path(stage, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                stored_key, artifact = pickle.load(f)
+        except Exception as e:
+            print(f'Cached {stage} not loaded: {e}')
+            return None
+        if stored_key != key:
+            return None
+
+        _session[(self.cache_dir, stage)] = (key, artifact)
+        return artifact
+
+    def save(self, stage, key, artifact):
+        '''
+        Saves the result of a stage in the session memory and in the cache directory.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        key : str or None
+            The key of the stage, see `key`. Nothing is saved for None.
+        artifact : object
+            The result of the stage, e.g. a GeoDataFrame or a graph. It must be picklable.
+        '''
+        if key is None:
+            return
+
+        _session[(self.cache_dir, stage)] = (key, artifact)
+
+        path = self._artifact_path(stage, key)
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=f'{stage}_', suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                pickle.dump((key, artifact), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f'Cached {stage} not saved: {e}')
+            return
+
+        # remove the oldest results of the stage
+        try:
+            paths = sorted(glob.glob(os.path.join(self.cache_dir, f'{stage}_{"?" * 16}.pkl')), key=os.path.getmtime, reverse=True)
+        except OSError:
+            return # removed by another process meanwhile
+        for old_path in paths[self.max_entries:]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
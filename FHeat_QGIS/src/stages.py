@@ -0,0 +1,617 @@
+import os
+import geopandas as gpd
+import pandas as pd
+
+try:
+    from .download_files import (file_catalog_from_URL, search_filename, read_file_from_zip, read_csv_region_from_zip,
+                                 get_shapes_from_wfs, select_by_parcels, repair_geometries, combine_zensus,
+                                 get_area_for_zensus)
+    from .adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join, zensus_join
+    from .read_files import read_layer, layer_columns
+    from .status_analysis import WLD, Polygons
+    from .net_analysis import Streets, Source, Buildings, Graph, Net, Result
+    from .task_control import progress_callback
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from download_files import (file_catalog_from_URL, search_filename, read_file_from_zip, read_csv_region_from_zip,
+                                get_shapes_from_wfs, select_by_parcels, repair_geometries, combine_zensus,
+                                get_area_for_zensus)
+    from adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join, zensus_join
+    from read_files import read_layer, layer_columns
+    from status_analysis import WLD, Polygons
+    from net_analysis import Streets, Source, Buildings, Graph, Net, Result
+    from task_control import progress_callback
+
+# data sources
+URL_BUILDINGS = 'https://www.opengeodata.nrw.de/produkte/umwelt_klima/energie/kwp/'
+URL_PARCELS = 'https://www.wfs.nrw.de/geobasis/wfs_nw_inspire-flurstuecke_alkis'
+LAYER_PARCELS = 'cp:CadastralParcel'
+URL_ZENSUS = 'https://www.destatis.de/static/DE/zensus/gitterdaten/'
+
+# building age classes
+BAK_BINS = [0, 1918, 1948, 1957, 1968, 1978, 1983, 1994, 2001, 9999]
+BAK_LABELS = ['B','C','D','E','F','G','H','I','J']
+
+# Baualtersklasse NRW:3 Quelle:Praxisinformation P 2006 / 8 Gastransport / Betriebswirtschaft, BGW, 2006, Seite 43 Tabelle 2 und 3
+BUILDING_CLASS = 3
+
+# load profiles of the result
+LOAD_PROFILES = ['EFH', 'MFH', 'GHA', 'GMK', 'GKO']
+
+# plots of the load profile and their rows in the result file
+LOAD_PROFILE_IMAGES = {'Lastprofil': 0, 'Lastprofil_geordnet': 22, 'Lastprofil_extra_Daemmung': 44,
+                       'Lastprofil_extra_Daemmung_geordnet': 66}
+
+def _report(progress, value):
+    '''
+    Reports the progress of a stage in percent.
+    '''
+    if progress is not None:
+        progress(value, 100)
+
+def _step(progress, start, end):
+    '''
+    Returns a callback that maps the progress of a step to a range of the progress of the stage.
+    '''
+    if progress is None:
+        return None
+    return progress_callback(lambda value: progress(value, 100), start, end)
+
+def download_layers(filtered_df, parameter, file_catalog=file_catalog_from_URL, read_zip=read_file_from_zip, progress=None):
+    '''
+    Downloads buildings, streets and parcels of a municipality or district.
+
+    Invalid geometries are repaired. For a district, only the buildings and streets on its parcels are kept,
+    as the buildings and streets can only be downloaded for the whole municipality.
+
+    Parameters
+    ----------
+    filtered_df : DataFrame
+        The districts of the municipality or the district, see `filter_df`.
+    parameter : str
+        'municipality' or 'city' (district).
+    file_catalog : callable, optional
+        Returns the catalog of the building files, e.g. `file_catalog_from_URL_QGIS` in QGIS (default is
+        `file_catalog_from_URL`).
+    read_zip : callable, optional
+        Reads a file from a zip file, e.g. `read_file_from_zip_QGIS` in QGIS (default is `read_file_from_zip`).
+    progress : callable, optional
+        Called with the progress in percent and 100, e.g. a callback of `progress_callback` (default is None).
+
+    Returns
+    -------
+    tuple
+        The buildings, streets and parcels as GeoDataFrames and the keys whose parcels may be incomplete.
+
+    Raises
+    ------
+    ValueError
+        If no building data is found for the municipality.
+    '''
+    municipality_key = filtered_df['gmdschl'][0]
+    _report(progress, 5)
+
+    # buildings and streets, the file patterns maybe have to be renamed, when changes on the website occur
+    buildings_zip = search_filename(file_catalog(URL_BUILDINGS + 'index.json'), municipality_key)
+    if buildings_zip == 'No data found':
+        raise ValueError('No data found. Data source was possibly renamed.')
+    _report(progress, 15)
+    buildings_gdf = read_zip(URL_BUILDINGS, buildings_zip, f'WBM-NRW_{municipality_key}', progress=_step(progress, 15, 35))
+    _report(progress, 35)
+    streets_gdf = read_zip(URL_BUILDINGS, buildings_zip, f'WBM-NRW-Waermelinien_{municipality_key}')
+    _report(progress, 55)
+
+    # parcels, the districts of a municipality are requested concurrently and merged
+    parcels_gdf, incomplete_keys = get_shapes_from_wfs(URL_PARCELS, filtered_df['schluessel'].tolist(), filtered_df['bbox'].tolist(),
+                                                       LAYER_PARCELS, progress=_step(progress, 55, 90))
+    _report(progress, 90)
+
+    # repair invalid geometries, valid geometries are kept as they are
+    buildings_gdf, n_repaired_buildings = repair_geometries(buildings_gdf)
+    parcels_gdf, n_repaired_parcels = repair_geometries(parcels_gdf)
+    print(f'Repaired geometries: {n_repaired_buildings} buildings, {n_repaired_parcels} parcels')
+
+    # only buildings and streets on the parcels of the district, the others only extend the calculation time
+    if parameter == 'city':
+        buildings_gdf = select_by_parcels(buildings_gdf, parcels_gdf)
+        streets_gdf = select_by_parcels(streets_gdf, parcels_gdf)
+    _report(progress, 98)
+
+    return buildings_gdf, streets_gdf, parcels_gdf, incomplete_keys
+
+def download_zensus_grid(filtered_df, region_cache_dir=None, read_csv=read_csv_region_from_zip, progress=None):
+    '''
+    Downloads the heating types and energy carriers of the Zensus grid within the area of a municipality or district.
+
+    Parameters
+    ----------
+    filtered_df : DataFrame
+        The districts of the municipality or the district, see `filter_df`.
+    region_cache_dir : str, optional
+        The directory of the regional extracts of the Zensus tables (default is None).
+    read_csv : callable, optional
+        Reads the rows of a CSV file in a zip file within a bbox, e.g. `read_csv_region_from_zip_QGIS` in QGIS
+        (default is `read_csv_region_from_zip`).
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    GeoDataFrame
+        The grid cells with heating types and energy carriers, see `combine_zensus`.
+    '''
+    zensus_bbox, zensus_area = get_area_for_zensus(filtered_df)
+    _report(progress, 5)
+
+    # only data within bbox, read in chunks and saved as regional extract for later runs
+    df_Heizungsart = read_csv(URL_ZENSUS, 'Zensus2022_Heizungsart.zip', 'Zensus2022_Heizungsart_100m-Gitter', zensus_bbox,
+                              encoding='latin1', region_cache_dir=region_cache_dir, progress=_step(progress, 5, 20))
+    _report(progress, 20)
+    df_Energietraeger = read_csv(URL_ZENSUS, 'Zensus2022_Energietraeger.zip', 'Zensus2022_Energietraeger_100m-Gitter', zensus_bbox,
+                                 encoding='latin1', region_cache_dir=region_cache_dir, progress=_step(progress, 20, 35))
+    _report(progress, 40)
+
+    # clean and join both tables, add the square of each grid cell
+    zensus_gdf = combine_zensus(df_Heizungsart, df_Energietraeger)
+    _report(progress, 80)
+    return zensus_gdf
+
+def adjust_buildings(buildings_path, parcels_path, heat_att, building_info, building_demand_wg, zensus=None, progress=None):
+    '''
+    Adjusts the buildings of a file at once, see `adjust_buildings_tiled` for large files.
+
+    Buildings without heat demand are removed, the parts of a building are merged and the building age,
+    the load profile, the thermal power and the custom heat demand are added.
+
+    Parameters
+    ----------
+    buildings_path : str
+        The file path of the buildings.
+    parcels_path : str
+        The file path of the parcels.
+    heat_att : str
+        The heat demand attribute of the buildings.
+    building_info : DataFrame
+        The 'database' sheet of building_info.xlsx.
+    building_demand_wg : DataFrame
+        The 'Grunddaten_Gebaeude' sheet of building_info.xlsx.
+    zensus : GeoDataFrame, optional
+        The Zensus grid, whose heating types and energy carriers are added (default is None).
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    GeoDataFrame
+        The adjusted buildings.
+    '''
+    parcels = Parcels_adj(parcels_path)
+    buildings = Buildings_adj(buildings_path, heat_att)
+    buildings.gdf = buildings.gdf[buildings.gdf[heat_att]>0].reset_index(drop=True) # only buildings with heat demand
+    _report(progress, 10)
+    buildings.add_LANUV_age_and_type() # add building age and type by LANUV
+    _report(progress, 20)
+    buildings.merge_buildings()
+    buildings.gdf['new_ID'] = buildings.gdf.index.astype('int32')
+    _report(progress, 30)
+    buildings.gdf = spatial_join(buildings.gdf.copy(), parcels.gdf, ['validFrom']) # building age from parcels
+    _report(progress, 40)
+    buildings.add_BAK(BAK_BINS, BAK_LABELS) # add building age class
+    _report(progress, 50)
+    buildings.add_Vlh_Loadprofile(building_info)
+    _report(progress, 60)
+    buildings.drop_unwanted()
+    _report(progress, 70)
+    buildings.add_power()
+    buildings.add_custom_heat_demand(building_demand_wg, building_info)
+    buildings.add_connect_option()
+    buildings.rename_and_order_columns()
+
+    # heating types and energy carriers from the Zensus grid
+    if zensus is not None:
+        buildings.gdf = zensus_join(buildings.gdf, zensus)
+    return buildings.gdf
+
+def adjust_streets(streets_path, clean_topology=False):
+    '''
+    Rounds the coordinates of the streets, optionally cleans their topology and marks the possible routes.
+
+    Parameters
+    ----------
+    streets_path : str
+        The file path of the streets.
+    clean_topology : bool, optional
+        Snap near-miss endpoints and node crossing streets, see `Streets_adj.clean_topology` (default is False).
+
+    Returns
+    -------
+    tuple
+        The adjusted streets as GeoDataFrame and the summary of the topology cleaning ('' if not cleaned).
+    '''
+    streets = Streets_adj(streets_path)
+    streets.round_streets()
+    feedback = streets.clean_topology() if clean_topology else ''
+    streets.add_bool_column() # possible routes
+    return streets.gdf, feedback
+
+def analyse_heat_density(buildings_layer, streets_layer, parcels_layer, wld_values, heat_attribute, power_attribute, progress=None):
+    '''
+    Calculates the heat line density (WLD) of the streets and the heat density polygons for each WLD threshold.
+
+    Parameters
+    ----------
+    buildings_layer, streets_layer, parcels_layer : str or LayerSnapshot
+        The adjusted buildings, the adjusted streets and the parcels, see `read_layer`.
+    wld_values : list of float
+        The WLD thresholds in descending order.
+    heat_attribute : str
+        The heat demand attribute of the buildings.
+    power_attribute : str
+        The thermal power attribute of the buildings.
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    tuple
+        The streets with WLD as GeoDataFrame and a dict of the polygons of each threshold.
+    '''
+    streets = read_layer(streets_layer)
+    parcels = read_layer(parcels_layer, columns=[])
+    buildings = read_layer(buildings_layer, columns=['new_ID', heat_attribute, power_attribute])
+
+    # HLD/WLD
+    wld = WLD(buildings, streets)
+    _report(progress, 5)
+    wld.get_centroid()
+    _report(progress, 20)
+    wld.closest_street_buildings(progress=_step(progress, 20, 30))
+    _report(progress, 30)
+    wld.add_lenght()
+    _report(progress, 40)
+    wld.add_heat_att(heat_att=heat_attribute)
+    _report(progress, 50)
+    wld.add_WLD(heat_att=heat_attribute)
+    _report(progress, 60)
+
+    # polygons
+    polygons = Polygons(parcels, wld.streets, buildings)
+    polygons.calculate_building_coverage()
+    _report(progress, 70)
+    polygons_dict = polygons.heat_density_sweep(wld_values, 0.5, heat_attribute, power_attribute, progress=_step(progress, 70, 90))
+    _report(progress, 90)
+
+    # translate columns
+    wld.rename_columns()
+    return wld.streets, polygons_dict
+
+def polygon_paths(polygon_path, polygons_dict):
+    '''
+    Returns the file path of the polygons of each WLD threshold. Several thresholds get the suffix '_WLD_<value>'.
+
+    Parameters
+    ----------
+    polygon_path : str
+        The file path of the heat density output.
+    polygons_dict : dict
+        The polygons of each threshold, see `analyse_heat_density`.
+
+    Returns
+    -------
+    dict
+        The polygons keyed by their file path.
+    '''
+    if len(polygons_dict) == 1:
+        return {polygon_path: next(iter(polygons_dict.values()))}
+    root, ext = os.path.splitext(polygon_path)
+    return {f'{root}_WLD_{value:g}{ext}': gdf for value, gdf in polygons_dict.items()}
+
+def net_buildings(buildings_layer, heat_attribute, polygon_layer=None):
+    '''
+    Reads the buildings of the network, optionally only within a polygon layer, without unconnected buildings.
+
+    Parameters
+    ----------
+    buildings_layer : str or LayerSnapshot
+        The adjusted buildings.
+    heat_attribute : str
+        The heat demand attribute of the buildings.
+    polygon_layer : str or LayerSnapshot, optional
+        The area of the network (default is None).
+
+    Returns
+    -------
+    Buildings
+        The buildings of the network.
+    '''
+    buildings = Buildings(buildings_layer, heat_attribute)
+    if polygon_layer is not None:
+        polygon = read_layer(polygon_layer)
+        buildings.gdf = gpd.sjoin(buildings.gdf, polygon, how="inner", predicate="within") # only buildings within polygon
+    if 'Anschluss' in buildings.gdf.columns:
+        buildings.gdf = buildings.gdf[buildings.gdf['Anschluss']==1]
+    return buildings
+
+def net_graph(stage_cache, graph_key, buildings_layer, source_layer, streets_layer, heat_attribute, polygon_layer=None, progress=None):
+    '''
+    Returns the connection points of buildings and sources and the graph of the street network.
+
+    The result of unchanged inputs is loaded from the stage cache, otherwise it is computed and saved.
+
+    Parameters
+    ----------
+    stage_cache : StageCache
+        The cache of the intermediate results.
+    graph_key : str or None
+        The key of the 'net_graph' stage, None if the inputs are not cached.
+    buildings_layer, source_layer, streets_layer : str or LayerSnapshot
+        The adjusted buildings, the heat sources and the adjusted streets.
+    heat_attribute : str
+        The heat demand attribute of the buildings.
+    polygon_layer : str or LayerSnapshot, optional
+        The area of the network (default is None).
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    tuple
+        The buildings and the sources with their connection points as GeoDataFrames and the `Graph`.
+    '''
+    graph_artifact = stage_cache.load('net_graph', graph_key)
+    if graph_artifact is None:
+        buildings = net_buildings(buildings_layer, heat_attribute, polygon_layer)
+        source = Source(source_layer)
+        streets = Streets(streets_layer)
+        if 'Moegliche_Route' in streets.gdf.columns:
+            streets.gdf = streets.gdf[streets.gdf['Moegliche_Route']==1] # drop unwanted routes
+        _report(progress, 20)
+
+        # create connection points
+        buildings.add_centroid()
+        buildings.closest_points_buildings(streets.gdf, progress=_step(progress, 20, 50))
+        source.closest_points_sources(streets.gdf)
+        streets.add_connection_to_streets(buildings.gdf, source.gdf, progress=_step(progress, 50, 60))
+        _report(progress, 60)
+
+        # create graph
+        graph = Graph(crs=buildings.gdf.crs)
+        graph.create_street_network(streets.gdf)
+        graph.connect_centroids(buildings.gdf)
+        graph.connect_source(source.gdf)
+        graph.add_attribute_length()
+
+        graph_artifact = {'buildings': buildings.gdf, 'source': source.gdf, 'graph': graph.graph}
+        stage_cache.save('net_graph', graph_key, graph_artifact)
+
+    graph = Graph(crs=graph_artifact['buildings'].crs)
+    graph.graph = graph_artifact['graph']
+    _report(progress, 100)
+    return graph_artifact['buildings'], graph_artifact['source'], graph
+
+def disconnected_buildings(graph, buildings_gdf, source_gdf):
+    '''
+    Returns the building centroids that are not connected to the source by the street network.
+
+    Parameters
+    ----------
+    graph : Graph
+        The graph of the street network with buildings and source, see `net_graph`.
+    buildings_gdf : GeoDataFrame
+        The buildings with the 'centroid' column.
+    source_gdf : GeoDataFrame
+        The sources, the first one is the start of the network.
+
+    Returns
+    -------
+    tuple
+        The start point, the points connected to it and the disconnected building centroids as lists of (x, y).
+    '''
+    start_point = (source_gdf['geometry'][0].x, source_gdf['geometry'][0].y)
+    connected_points = graph.get_connected_points(start_point)
+    if start_point not in connected_points:
+        connected_points.append(start_point)
+    connected = set(connected_points)
+    disconnected = [(centroid.x, centroid.y) for centroid in buildings_gdf['centroid']
+                    if (centroid.x, centroid.y) not in connected and (centroid.x, centroid.y) in graph.graph]
+    return start_point, connected_points, disconnected
+
+def route_net(stage_cache, graph_key, graph, buildings_gdf, source_gdf, pipe_info, t_supply, t_return, power_attribute, progress=None):
+    '''
+    Calculates the heat network from the source along the streets to the buildings.
+
+    The routed net depends on the graph, the temperatures, the power attribute and the pipe catalog. It is
+    loaded from the stage cache if they are unchanged and not cached if the graph is not cached.
+
+    Parameters
+    ----------
+    stage_cache : StageCache
+        The cache of the intermediate results.
+    graph_key : str or None
+        The key of the 'net_graph' stage.
+    graph : Graph
+        The graph of the street network, see `net_graph`.
+    buildings_gdf, source_gdf : GeoDataFrame
+        The buildings and sources with their connection points.
+    pipe_info : DataFrame
+        The pipe catalog of pipe_data.xlsx.
+    t_supply, t_return : float
+        The supply and return temperature in °C.
+    power_attribute : str
+        The thermal power attribute of the buildings.
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    GeoDataFrame
+        The pipes of the net.
+    '''
+    net_key = stage_cache.key('net', parents=[graph_key], t_supply=t_supply, t_return=t_return,
+                              power_attribute=power_attribute, pipe_info=pipe_info)
+    net_gdf = stage_cache.load('net', net_key)
+    if net_gdf is None:
+        net = Net(t_supply, t_return, crs=buildings_gdf.crs)
+        net.network_analysis(graph.graph, buildings_gdf, source_gdf, pipe_info, power_th_att=power_attribute,
+                             progress=_step(progress, 0, 90))
+        _report(progress, 90)
+
+        # GeoDataFrame from net
+        net.ensure_power_th_attribute()
+        net.graph_to_gdf()
+        net.rename_columns() # translate
+        net_gdf = net.gdf
+        stage_cache.save('net', net_key, net_gdf)
+    _report(progress, 100)
+    return net_gdf
+
+def save_net(net_gdf, net_path, stage_cache):
+    '''
+    Saves the net and keeps it in the stage cache for the result.
+
+    The cached net has the column names of the saved file, e.g. the names of a shapefile are truncated to 
+    10 characters, so the result is the same whether the net is loaded from the cache or from the file.
+
+    Parameters
+    ----------
+    net_gdf : GeoDataFrame
+        The pipes of the net, see `route_net`.
+    net_path : str
+        The file path of the net.
+    stage_cache : StageCache
+        The cache of the intermediate results.
+
+    Returns
+    -------
+    GeoDataFrame
+        The net with the column names of the saved file.
+    '''
+    net_gdf.to_file(net_path)
+
+    # column names of the file, the driver keeps the order of the columns
+    columns = [column for column in net_gdf.columns if column != net_gdf.geometry.name]
+    stored_columns = layer_columns(net_path)
+    if len(stored_columns) == len(columns):
+        net_gdf = net_gdf.rename(columns=dict(zip(columns, stored_columns)))
+    else:
+        net_gdf = gpd.read_file(net_path)
+    stage_cache.save('net_file', stage_cache.key('net_file', [net_path]), net_gdf)
+    return net_gdf
+
+def create_result(buildings_gdf, net_gdf, result_path, pipe_info, heat_attribute, t_supply, t_return, temperature_data,
+                  image_dir, building_class=BUILDING_CLASS, progress=None):
+    '''
+    Creates the result tables, the building statistic and the load profile of the net and plots the load profile.
+
+    The tables are written to the result file by `save_result`.
+
+    Parameters
+    ----------
+    buildings_gdf : GeoDataFrame
+        The buildings of the network.
+    net_gdf : GeoDataFrame
+        The pipes of the net.
+    result_path : str
+        The file path of the result file.
+    pipe_info : DataFrame
+        The pipe catalog of pipe_data.xlsx.
+    heat_attribute : str
+        The heat demand attribute of the buildings.
+    t_supply, t_return : float
+        The supply and return temperature in °C.
+    temperature_data : Series
+        The hourly air temperature of the year.
+    image_dir : str
+        The directory of the plots, see `LOAD_PROFILE_IMAGES`.
+    building_class : int, optional
+        The building age class (1-11) of the load profiles of residential buildings, the class of other
+        buildings is 0 (default is BUILDING_CLASS).
+    progress : callable, optional
+        Called with the progress in percent and 100 (default is None).
+
+    Returns
+    -------
+    tuple
+        The `Result` with the building statistic as attribute `statistic` and the `LoadProfile` with the
+        hourly demand as attribute `demand_with_sum`.
+    '''
+    from workalendar.europe import Germany
+    try:
+        from .load_curve import LoadProfile
+    except ImportError:
+        from load_curve import LoadProfile
+
+    result = Result(result_path)
+    result.create_data_dict(buildings_gdf, net_gdf, LOAD_PROFILES, pipe_info['DN'].to_list(), heat_attribute, t_supply, t_return)
+    result.create_df_from_dataDict()
+    _report(progress, 10)
+
+    # building statistic
+    result.statistic = result.building_statistic(buildings_gdf)
+    _report(progress, 20)
+
+    # load curve
+    year, resolution, freq = 2022, 8760, 'h'
+    holidays = dict(Germany().holidays(year))
+    load_profile = LoadProfile(result.df, result_path, year, temperature_data, holidays)
+    demand = load_profile.set_up_df(year, resolution, freq) # dataframe for collecting generated profiles
+    _report(progress, 30)
+
+    profile_progress = _step(progress, 30, 40)
+    for n, row in enumerate(load_profile.net_result.itertuples(index=False)):
+        if profile_progress is not None:
+            profile_progress(n, len(load_profile.net_result))
+        building_type = row.Lastprofil
+        if pd.isna(building_type):
+            break
+        profile_class = building_class if building_type.lower() in ('efh', 'mfh') else 0
+        demand[building_type] = load_profile.create_heat_demand_profile(building_type, profile_class, 0, 1, row[2])
+    _report(progress, 40)
+
+    # sum of the buildings, loss and sum of buildings and loss
+    demand = load_profile.add_sum_buildings(demand)
+    demand = load_profile.add_loss(demand, load_profile.net_result, resolution)
+    demand_with_sum = load_profile.add_sum(demand)
+    _report(progress, 50)
+
+    # plot and save figures
+    images = {name: os.path.join(image_dir, f'{name}.png') for name in LOAD_PROFILE_IMAGES}
+    extra = {'column_names': ['Gesamtsumme (extra Dämmung)', 'Verlust'], 'colors': ['green','orange'],
+             'ylabel': 'Wärmebedarf und Verlust bei extra Dämmung [MW]'}
+    load_profile.plot_bar_chart(demand_with_sum, column_names=['Gesamtsumme', 'Verlust'], filename=images['Lastprofil'])
+    _report(progress, 60)
+    load_profile.plot_bar_chart(demand_with_sum, filename=images['Lastprofil_extra_Daemmung'],
+                                title='Wärmebedarf und Verlust bei extra Dämmung pro Stunde im Jahr', **extra)
+    _report(progress, 70)
+    load_profile.plot_bar_chart(demand_with_sum.sort_values(by='Gesamtsumme', ascending=False), column_names=['Gesamtsumme', 'Verlust'],
+                                filename=images['Lastprofil_geordnet'], title='Geordnetes Lastprofil')
+    _report(progress, 80)
+    load_profile.plot_bar_chart(demand_with_sum.sort_values(by='Gesamtsumme (extra Dämmung)', ascending=False),
+                                filename=images['Lastprofil_extra_Daemmung_geordnet'], title='Geordnetes Lastprofil (extra Dämmung)', **extra)
+    _report(progress, 90)
+
+    load_profile.demand_with_sum = demand_with_sum.round(decimals=3)
+    return result, load_profile
+
+def save_result(result, load_profile, template_path, image_dir):
+    '''
+    Writes the result tables, the building statistic, the load profile and its plots to the result file.
+
+    Parameters
+    ----------
+    result : Result
+        The result of `create_result`.
+    load_profile : LoadProfile
+        The load profile of `create_result`.
+    template_path : str
+        The file path of the result template (data/result.xlsx).
+    image_dir : str
+        The directory of the plots.
+    '''
+    result.copy_excel_file(template_path)
+    result.save_in_excel(result_table=result.df)
+    result.save_in_excel(result_table=result.statistic, sheet='Statistik')
+    load_profile.save_in_excel(load_profile.demand_with_sum, index_bool=True)
+    col = load_profile.demand_with_sum.shape[1] + 1
+    for name, row in LOAD_PROFILE_IMAGES.items():
+        load_profile.embed_image_in_excel(row, col, image_filename=os.path.join(image_dir, f'{name}.png'))
@@ -1,5 +1,12 @@
 import numpy as np
 import geopandas as gpd
+import shapely
+import pandas as pd
+try:
+    from .adjust_files import overlap_pairs
+except ImportError:
+    # imported as top-level module, e.g. by the tests with src on sys.path
+    from adjust_files import overlap_pairs
 
 class WLD:
     '''
@@ -17,7 +24,7 @@ class WLD:
     -------
     get_centroid():
         Adds the centroid of each building to the buildings GeoDataFrame.
-    closest_street_buildings():
+    closest_street_buildings(progress=None):
         Finds the nearest street for each building based on the centroid and assigns a street ID.
     add_length():
         Adds a column for the length of each street segment to the streets GeoDataFrame.
@@ -47,14 +54,21 @@ class WLD:
         '''
         self.buildings['centroid'] = self.buildings['geometry'].centroid
 
-    def closest_street_buildings(self):
+    def closest_street_buildings(self, progress=None):
         '''
         Finds the nearest street for each building based on the centroid and assigns a street ID.
         
         This method iterates over each building's centroid, finds the nearest street segment,
         and records the street ID in the buildings GeoDataFrame.
+
+        Parameters
+        ----------
+        progress : callable, optional
+            Called with the number of snapped and the number of all buildings (default is None).
         '''
-        for index, row in self.buildings.iterrows():
+        for n, (index, row) in enumerate(self.buildings.iterrows(), start=1):
+            if progress is not None:
+                progress(n, len(self.buildings))
             centroid = row['centroid']
             closest_line = self.streets.geometry.distance(centroid).idxmin()
             self.buildings.at[index, 'street_id'] = int(closest_line)
@@ -75,7 +89,7 @@ class WLD:
             The attribute in the buildings GeoDataFrame representing heat consumption.
         '''
         self.streets['connected'] = [[] for _ in range(len(self.streets))]
-        self.streets[f'{heat_att}'] = 0
+        self.streets[f'{heat_att}'] = 0.0
 
         for idx, row in self.buildings.iterrows():
             heat_demand = row[heat_att]
@@ -109,7 +123,8 @@ class WLD:
             'connected': 'angeschlossen'
         }
         self.streets = self.streets.rename(columns=rename_dict)
-        
+
+
 class Polygons:
     '''
     A class to process parcels, heat line density (Wärmeliniendichte WLD), and building data.
@@ -141,64 +156,72 @@ class Polygons:
         self.wld = wld
         self.buildings = buildings
     
-    def select_parcels_by_building_connection(self, WLD_value):
+    def calculate_building_coverage(self, coverage_value=0.1, chunk_size=None):
         '''
-        Selects parcels based on connected buildings and a WLD threshold.
+        Calculates the parcel-building coverage table, which is reused for every WLD threshold.
+
+        Each building gets the heat line density of the street it is connected to. For every parcel the
+        highest WLD of all buildings covering at least `coverage_value` of their footprint on this parcel
+        is stored. A parcel is selected by a WLD threshold if this value reaches the threshold, so the
+        spatial join only has to be done once.
 
         Parameters
         ----------
-        WLD_value : float
-            Threshold value of heat line density (Waermeliniendichte WLD).
+        coverage_value : float, optional
+            Minimum share of the building footprint that has to lie on the parcel (default is 0.1).
+        chunk_size : int, optional
+            Number of parcels per chunk to bound the memory of the candidate pairs (default is None).
         '''
-        # Filter WLD for values > WLD_value
-        filtered_wld = self.wld[self.wld['WLD [kWh/a*m]']>= WLD_value] 
-
-        # Extract all connected building IDs from the 'connected' column
-        connected_building_ids = [int(id) for sublist in filtered_wld['connected'].dropna().str.split(',').tolist() if isinstance(sublist, list) for id in sublist]
+        # WLD of the street each building is connected to
+        wld = self.wld[['WLD [kWh/a*m]', 'connected']].dropna(subset=['connected'])
+        wld = wld.assign(new_ID=wld['connected'].astype(str).str.split(',')).explode('new_ID')
+        wld = wld[wld['new_ID'].str.strip() != '']
+        building_wld = wld.groupby(wld['new_ID'].astype(int))['WLD [kWh/a*m]'].max()
 
-        # Select buildings that are in the list of connected building IDs
-        connected_buildings = self.buildings[self.buildings['new_ID'].isin(connected_building_ids)]
+        # Only buildings that are connected to a street
+        connected_buildings = self.buildings[['new_ID', 'geometry']].copy()
+        connected_buildings['WLD'] = connected_buildings['new_ID'].map(building_wld)
+        connected_buildings = connected_buildings[connected_buildings['WLD'].notna()]
 
         # Calculate area of building footprint
         connected_buildings['building_area'] = connected_buildings.geometry.area
 
-        # Remove index_left and index_right from the dataframes
-        if 'index_left' in self.parcels.columns:
-            self.parcels = self.parcels.drop(columns=['index_left'])
-        if 'index_right' in self.parcels.columns:
-            self.parcels = self.parcels.drop(columns=['index_right'])
+        # Check which parcels touch buildings and calculate the area of overlap
+        building_area = connected_buildings['building_area'].to_numpy()
+        building_wld = connected_buildings['WLD'].to_numpy()
+        coverage = []
+        for pairs in overlap_pairs(self.parcels, connected_buildings, chunk_size):
+            # Calculate coverage ratio
+            pairs['coverage_ratio'] = pairs['overlap_area'] / building_area[pairs['right']]
+            pairs['WLD'] = building_wld[pairs['right']]
 
-        if 'index_left' in connected_buildings.columns:
-            connected_buildings = connected_buildings.drop(columns=['index_left'])
-        if 'index_right' in connected_buildings.columns:
-            connected_buildings = connected_buildings.drop(columns=['index_right'])
+            # Highest WLD of all buildings with sufficient coverage per parcel
+            covered = pairs[pairs['coverage_ratio'] >= coverage_value]
+            coverage.append(covered.groupby('left')['WLD'].max())
 
-        # Add identifier to remove duplicates
-        self.parcels['identifier'] = range(len(self.parcels))
+        coverage = pd.concat(coverage) if coverage else pd.Series(dtype=float)
+        self.coverage = pd.Series(coverage.to_numpy(), index=self.parcels.index[coverage.index.to_numpy(dtype=np.int64)], name='WLD')
 
-        # Perform spatial join: check which parcels touch buildings
-        join_result = gpd.sjoin(self.parcels, connected_buildings, how="inner", predicate="intersects")
+    def select_parcels_by_building_connection(self, WLD_value):
+        '''
+        Selects parcels based on connected buildings and a WLD threshold.
 
-        # Calculate area of overlap between parcels and buildings
-        join_result['overlap_area'] = join_result.apply(lambda row: self.parcels.geometry.iloc[row.name].intersection(connected_buildings.geometry.iloc[row['index_right']]).area, axis=1)
-        
-        # Calculate coverage ratio
-        join_result['coverage_ratio'] = join_result['overlap_area'] / join_result['building_area']
-        
-        # Sort by coverage_ratio
-        sorted_joined = join_result.sort_values(by='coverage_ratio', ascending=False)
+        Parameters
+        ----------
+        WLD_value : float
+            Threshold value of heat line density (Waermeliniendichte WLD).
+        '''
+        if getattr(self, 'coverage', None) is None:
+            self.calculate_building_coverage()
 
-        # Keep only the row of a parcel with the max. 
-        max_coverage = sorted_joined.groupby(sorted_joined.index).first()
-        
-        # Select parcels where the coverage ratio exceeds the threshold
-        selected_parcels = max_coverage[max_coverage['coverage_ratio'] >= 0.1]
+        # Select parcels where the WLD of a covering building exceeds the threshold
+        selected_parcels = self.parcels.loc[self.coverage.index[self.coverage >= WLD_value]]
 
         # Remove 'centroid' column
         if 'centroid' in selected_parcels.columns:
             selected_parcels = selected_parcels.drop(columns=['centroid'])
-        
-        self.selected_parcels = selected_parcels
+
+        self.selected_parcels = selected_parcels.copy()
 
     def buffer_dissolve_and_explode(self, buffer_distance):
         """
@@ -227,6 +250,67 @@ class Polygons:
         # remove all attributes 
         self.polygons = exploded[['geometry']]
 
+    def heat_density_sweep(self, WLD_values, buffer_distance, heat_attribute, power_attribute, progress=None):
+        '''
+        Creates heat density polygons for several WLD thresholds in one pass.
+
+        The thresholds are processed from the highest to the lowest value. As a lower threshold always
+        contains all parcels of a higher one, only the newly selected parcels are buffered and united with
+        the polygons of the previous threshold.
+
+        Parameters
+        ----------
+        WLD_values : list of float
+            Threshold values of heat line density (Waermeliniendichte WLD).
+        buffer_distance : float
+            Distance of the buffer in meters.
+        heat_attribute : str
+            Name of the heat demand attribute.
+        power_attribute : str
+            Name of the power attribute.
+        progress : callable, optional
+            Called with the number of dissolved and the number of all thresholds (default is None).
+
+        Returns
+        -------
+        dict
+            A dictionary with the WLD threshold as key and the renamed heat density polygons as value.
+        '''
+        if getattr(self, 'coverage', None) is None:
+            self.calculate_building_coverage()
+
+        crs = self.buildings.crs
+        results = {}
+        dissolved = None
+        upper_value = np.inf
+
+        thresholds = sorted(set(WLD_values), reverse=True)
+        for n, WLD_value in enumerate(thresholds):
+            if progress is not None:
+                progress(n, len(thresholds))
+
+            # parcels that are added by lowering the threshold
+            mask = (self.coverage >= WLD_value) & (self.coverage < upper_value)
+            new_parcels = self.parcels.loc[self.coverage.index[mask]]
+
+            # buffer new parcels and dissolve them with the polygons of the previous threshold
+            geometries = new_parcels.buffer(buffer_distance).to_numpy()
+            if dissolved is not None:
+                geometries = np.append(geometries, dissolved)
+            dissolved = shapely.union_all(geometries)
+            upper_value = WLD_value
+
+            # explode multipolygons
+            exploded = gpd.GeoDataFrame(geometry=[dissolved], crs=crs).explode(index_parts=False)
+            exploded = exploded[~exploded.is_empty].reset_index(drop=True)
+            self.polygons = exploded[['geometry']]
+
+            self.add_attributes(heat_attribute, power_attribute)
+            self.rename_columns()
+            results[WLD_value] = self.polygons
+
+        return results
+
     def add_attributes(self,heat_attribute, power_attribute):
         '''
         Adds attributes like the number of connections, heat demand, and power to the polygons.
@@ -280,4 +364,171 @@ class Polygons:
             'Demand/Area [MWh/ha*a]': 'Waermebedarf/Flaeche [MWh/ha*a]',
             'Mean_Power_th [kW]': 'Mittlere thermische Leistung [kW]'
         }
-        self.polygons = self.polygons.rename(columns=rename_dict)
\ No newline at end of file
+        self.polygons = self.polygons.rename(columns=rename_dict)
+
+
+class HeatGrid:
+    '''
+    A class to bin the heat demand and thermal power of buildings onto a regular grid.
+
+    The grid is a fast preview of the heat density of a whole municipality. Each building is assigned to
+    the cell of its centroid by integer arithmetic, so no spatial predicates have to be evaluated. The grid
+    is a dense array over the extent of the buildings, so its number of cells is limited to `max_cells`.
+
+    Attributes
+    ----------
+    buildings : GeoDataFrame
+        GeoDataFrame of buildings.
+    cell_size : float
+        Edge length of a grid cell in the unit of the crs (usually meters).
+    origin : tuple
+        Lower left corner (x, y) of the grid.
+    connections : np.ndarray
+        Number of buildings per cell with shape (rows, columns).
+    heat : np.ndarray
+        Accumulated heat demand per cell.
+    power : np.ndarray
+        Accumulated thermal power per cell.
+    max_cells : int
+        The maximum number of grid cells, about 24 bytes of memory are needed per cell.
+
+    Methods
+    -------
+    bin_buildings(heat_attribute, power_attribute):
+        Sums up heat demand and thermal power of the buildings per grid cell.
+    to_polygons():
+        Converts all occupied cells to a GeoDataFrame of square polygons.
+    to_geotiff(path):
+        Saves heat density and thermal power as a GeoTIFF.
+    '''
+    max_cells = 20_000_000
+
+    def __init__(self, buildings, cell_size=100):
+        '''
+        Initializes the HeatGrid class with the buildings and the cell size.
+
+        Parameters
+        ----------
+        buildings : GeoDataFrame
+            GeoDataFrame of buildings.
+        cell_size : float, optional
+            Edge length of a grid cell (default is 100).
+        '''
+        self.buildings = buildings
+        self.cell_size = cell_size
+
+    def bin_buildings(self, heat_attribute, power_attribute):
+        '''
+        Sums up heat demand and thermal power of the buildings per grid cell.
+
+        The grid origin is aligned to multiples of the cell size, so grids of neighbouring areas match.
+        Without buildings, the grid is empty.
+
+        Parameters
+        ----------
+        heat_attribute : str
+            Name of the heat demand attribute.
+        power_attribute : str
+            Name of the power attribute.
+
+        Raises
+        ------
+        ValueError
+            If the grid over the extent of the buildings has more than `max_cells` cells.
+        '''
+        # only buildings with heat demand and a geometry
+        buildings = self.buildings[self.buildings[heat_attribute] > 0]
+        buildings = buildings[buildings.geometry.notna() & ~buildings.geometry.is_empty]
+        centroids = buildings.geometry.centroid
+        x = centroids.x.to_numpy()
+        y = centroids.y.to_numpy()
+
+        if len(buildings) == 0:
+            self.origin = (0.0, 0.0)
+            self.connections = np.zeros((0, 0), dtype=np.int64)
+            self.heat = np.zeros((0, 0))
+            self.power = np.zeros((0, 0))
+            return
+
+        # integer cell index of every centroid
+        x_min = np.floor(x.min() / self.cell_size) * self.cell_size
+        y_min = np.floor(y.min() / self.cell_size) * self.cell_size
+        columns = ((x - x_min) // self.cell_size).astype(np.int64)
+        rows = ((y - y_min) // self.cell_size).astype(np.int64)
+        n_columns = columns.max() + 1
+        n_rows = rows.max() + 1
+        if n_rows * n_columns > self.max_cells:
+            raise ValueError(f'The heat grid would have {n_rows * n_columns} cells (maximum {self.max_cells}). '
+                             f'Please increase the cell size of {self.cell_size}.')
+        cells = rows * n_columns + columns
+        shape = (n_rows, n_columns)
+
+        self.origin = (x_min, y_min)
+        self.connections = np.bincount(cells, minlength=n_rows * n_columns).reshape(shape)
+        self.heat = np.bincount(cells, weights=buildings[heat_attribute].to_numpy(dtype=float), minlength=n_rows * n_columns).reshape(shape)
+        self.power = np.bincount(cells, weights=buildings[power_attribute].to_numpy(dtype=float), minlength=n_rows * n_columns).reshape(shape)
+
+    def to_polygons(self):
+        '''
+        Converts all occupied cells to a GeoDataFrame of square polygons.
+
+        The columns are named like the heat density polygons of the `Polygons` class, so the same layer style can be used.
+
+        Returns
+        -------
+        GeoDataFrame
+            GeoDataFrame with one square polygon per occupied cell, empty if there are no buildings.
+        '''
+        rows, columns = np.nonzero(self.connections)
+        x = self.origin[0] + columns * self.cell_size
+        y = self.origin[1] + rows * self.cell_size
+        area = float(self.cell_size ** 2)
+
+        connections = self.connections[rows, columns]
+        heat = self.heat[rows, columns]
+        power = self.power[rows, columns]
+
+        grid = gpd.GeoDataFrame({
+            'Flaeche [m²]': np.full(len(rows), area),
+            'Anschluesse': connections,
+            'Waermebedarf [kWh/a]': heat,
+            'Thermische Leistung [kW]': power,
+            'Waermebedarf/Flaeche [MWh/ha*a]': 10 * heat / area, # 1000 kW 10000 m^2 in 1 MW 1 ha
+            'Mittlere thermische Leistung [kW]': power / connections
+            },
+            geometry=shapely.box(x, y, x + self.cell_size, y + self.cell_size),
+            crs=self.buildings.crs)
+        return grid
+
+    def to_geotiff(self, path):
+        '''
+        Saves heat density [MWh/ha*a] (band 1) and thermal power [kW] (band 2) as a GeoTIFF.
+
+        Parameters
+        ----------
+        path : str
+            The file path of the GeoTIFF.
+
+        Raises
+        ------
+        ValueError
+            If the grid is empty, since a raster needs at least one cell.
+        '''
+        if self.heat.size == 0:
+            raise ValueError('The heat grid is empty, there are no buildings with heat demand.')
+
+        # GDAL is shipped with QGIS
+        from osgeo import gdal
+
+        n_rows, n_columns = self.heat.shape
+        heat_density = 10 * self.heat / self.cell_size ** 2
+
+        dataset = gdal.GetDriverByName('GTiff').Create(path, int(n_columns), int(n_rows), 2, gdal.GDT_Float64)
+        dataset.SetGeoTransform((self.origin[0], self.cell_size, 0, self.origin[1] + n_rows * self.cell_size, 0, -self.cell_size))
+        dataset.SetProjection(self.buildings.crs.to_wkt())
+
+        # rows of a raster start at the top
+        for band, values in enumerate([heat_density, self.power], start=1):
+            dataset.GetRasterBand(band).WriteArray(np.flipud(values))
+        dataset.FlushCache()
+        dataset = None
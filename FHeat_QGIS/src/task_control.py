@@ -0,0 +1,81 @@
+class TaskCancelled(Exception):
+    '''
+    Raised by a progress callback to stop a task that was cancelled by the user.
+    '''
+
+class CancelToken:
+    '''
+    A class to request the cancellation of a running task from another thread.
+
+    The loops of the `src` classes report their progress with a callback `progress(done, total)`. A callback
+    created by `progress_callback` checks the token on every call, so each progress report is also a
+    point where the task can be stopped.
+
+    Attributes
+    ----------
+    cancelled : bool
+        True if the cancellation was requested.
+
+    Methods
+    -------
+    cancel():
+        Requests the cancellation of the task.
+    check():
+        Raises TaskCancelled if the cancellation was requested.
+    '''
+    def __init__(self):
+        '''
+        Initializes the CancelToken class.
+        '''
+        self.cancelled = False
+
+    def cancel(self):
+        '''
+        Requests the cancellation of the task.
+        '''
+        self.cancelled = True
+
+    def check(self):
+        '''
+        Raises TaskCancelled if the cancellation was requested.
+        '''
+        if self.cancelled:
+            raise TaskCancelled('The task was cancelled.')
+
+def progress_callback(report=None, start=0, end=100, token=None):
+    '''
+    Creates a callback that maps the progress of a loop to a range of progress values.
+
+    Parameters
+    ----------
+    report : callable, optional
+        Called with the progress value as int, e.g. the `emit` method of a progress signal (default is None).
+    start : int, optional
+        The progress value at the start of the loop (default is 0).
+    end : int, optional
+        The progress value at the end of the loop (default is 100).
+    token : CancelToken, optional
+        The token that is checked on every call (default is None).
+
+    Returns
+    -------
+    callable
+        A function of the done and the total number of steps. The progress value is only reported if it
+        changed. It raises TaskCancelled if the token was cancelled.
+
+    Examples
+    --------
+    >>> net.network_analysis(G, buildings, sources, pipe_info, 'Leistung_th [kW]',
+    ...                      progress=progress_callback(progress_update.emit, 30, 70, token))
+    '''
+    last_value = [None]
+
+    def progress(done, total):
+        if token is not None:
+            token.check()
+        if report is not None and total > 0:
+            value = start + int((end - start) * min(done, total) / total)
+            if value != last_value[0]:
+                last_value[0] = value
+                report(value)
+    return progress
@@ -0,0 +1,91 @@
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from adjust_files import Buildings_adj
+
+BUILDING_INFO = Path(__file__).resolve().parents[1] / 'FHeat_QGIS' / 'data' / 'building_info.xlsx'
+
+BINS = [0, 1918, 1948, 1957, 1968, 1978, 1983, 1994, 2001, 9999]
+LABELS = ['B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']
+
+
+def _buildings():
+    rng = np.random.default_rng(4)
+    n = 30
+    valid_from = [f'{year}-0{rng.integers(1, 10)}-15T00:00:00' for year in rng.integers(1850, 2024, n)]
+    valid_from[:4] = [None, '1918-12-31', '1919-01-01', '2001-06-01'] # missing date and bin edges
+    return pd.DataFrame({
+        'validFrom': valid_from,
+        'Lastprofil': rng.choice(['MFH', 'EFH', 'GHD'], n),
+        'citygml_fu': rng.choice(['31001_1000', '31001_2010', '31001_3020'], n),
+        'NF': rng.uniform(50, 400, n),
+    })
+
+
+def _tables():
+    wg_data = pd.DataFrame({'Baualtersklasse': LABELS, 'Waerme_MFH kWh/m²·a': np.arange(9) * 10.0 + 100,
+                            'Waerme_EFH kWh/m²·a': np.arange(9) * 12.0 + 120})
+    nwg_data = pd.DataFrame({'Funktion': [2010, 3020], 'WVBRpEBF': [80.0, 95.0]})
+    return wg_data, nwg_data
+
+
+def _add_BAK_baseline(gdf, bins, labels):
+    '''
+    Age classes as before the vectorization: years parsed per building and classes stored as text.
+    '''
+    gdf['jahr'] = gdf['validFrom'].apply(Buildings_adj.extract_year)
+    gdf['BAK'] = pd.cut(gdf['jahr'], bins=bins, labels=labels, right=True).astype(str)
+    return gdf.drop(columns=['jahr'])
+
+
+def test_add_BAK_matches_per_building_parsing():
+    buildings = Buildings_adj.__new__(Buildings_adj)
+    buildings.gdf = _buildings()
+    buildings.add_BAK(BINS, LABELS)
+    reference = _add_BAK_baseline(_buildings(), BINS, LABELS)
+
+    assert isinstance(buildings.gdf['BAK'].dtype, pd.CategoricalDtype)
+    assert list(buildings.gdf['BAK'].astype(str)) == list(reference['BAK'])
+    assert pd.isna(buildings.gdf['BAK'][0]) and list(reference['BAK'][1:4]) == ['B', 'C', 'I']
+    assert 'jahr' not in buildings.gdf.columns
+
+    # the merge on the categorical codes gives the same heat demand as the merge on text
+    wg_data, nwg_data = _tables()
+    buildings.add_custom_heat_demand(wg_data, nwg_data)
+    baseline = Buildings_adj.__new__(Buildings_adj)
+    baseline.gdf = reference
+    baseline.add_custom_heat_demand(wg_data, nwg_data)
+    for col in ['Spez_Waermebedarf', 'Waermebedarf']:
+        np.testing.assert_array_equal(buildings.gdf[col].to_numpy(float), baseline.gdf[col].to_numpy(float))
+    assert buildings.gdf['Spez_Waermebedarf'].notna().sum() > 20
+
+
+def test_buildings_without_age_class_are_not_duplicated():
+    # layout of the plugin: classes A to L and possibly empty rows
+    wg_data = pd.read_excel(BUILDING_INFO, sheet_name='Grunddaten_Gebaeude', nrows=13, usecols='A:D')
+    wg_data = pd.concat([wg_data, pd.DataFrame({'Baualtersklasse': [np.nan]})], ignore_index=True)
+    assert not wg_data['Baualtersklasse'].isin(LABELS).all()
+    _, nwg_data = _tables()
+
+    gdf = _buildings()
+    gdf.loc[:4, 'validFrom'] = None
+    gdf.loc[:4, 'Lastprofil'] = 'MFH'
+    buildings = Buildings_adj.__new__(Buildings_adj)
+    buildings.gdf = gdf
+    buildings.add_BAK(BINS, LABELS)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error') # no warning of the cast of unknown classes
+        buildings.add_custom_heat_demand(wg_data, nwg_data)
+
+    assert len(buildings.gdf) == len(gdf)
+    assert buildings.gdf['Spez_Waermebedarf'][:5].isna().all()
+
+    # same heat demand as the merge on text
+    baseline = Buildings_adj.__new__(Buildings_adj)
+    baseline.gdf = _add_BAK_baseline(gdf.copy(), BINS, LABELS)
+    baseline.add_custom_heat_demand(wg_data.astype({'Baualtersklasse': str}), nwg_data)
+    np.testing.assert_array_equal(buildings.gdf['Spez_Waermebedarf'].to_numpy(float),
+                                  baseline.gdf['Spez_Waermebedarf'].to_numpy(float))
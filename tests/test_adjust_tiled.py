@@ -0,0 +1,100 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point, box
+
+from adjust_files import (Buildings_adj, Parcels_adj, spatial_join, adjust_buildings_tiled, tile_schema,
+                          apply_schema)
+from reference_data import load_excel
+
+DATA = Path(__file__).resolve().parents[1] / 'FHeat_QGIS' / 'data'
+BAK_BINS = [0, 1918, 1948, 1957, 1968, 1978, 1983, 1994, 2001, 9999]
+BAK_LABELS = list('BCDEFGHIJ')
+
+
+def _fixture(tmp_path, n=300):
+    rng = np.random.default_rng(1)
+    parcels = [box(x, y, x + 40, y + 40) for x in range(0, 800, 40) for y in range(0, 400, 40)]
+    parcels_gdf = gpd.GeoDataFrame({'validFrom': rng.choice(['1950-01-01', '1990-02-02', '2010-01-01', None], len(parcels)),
+                                    'flst': [f'F{i}' for i in range(len(parcels))]}, geometry=parcels, crs=25832)
+    parcel_index = rng.integers(0, len(parcels), n)
+    geometries = []
+    for k in parcel_index:
+        x0, y0, _, _ = parcels[k].bounds
+        dx, dy = rng.uniform(2, 25, 2)
+        geometries.append(box(x0 + dx, y0 + dy, x0 + dx + 10, y0 + dy + 10))
+    buildings_gdf = gpd.GeoDataFrame({
+        'Flurstueck': parcels_gdf['flst'].to_numpy()[parcel_index],
+        'citygml_fu': rng.choice(['31001_1010', '31001_2020'], n), 'Fortschrei': 'a',
+        'GEBAEUDETY': rng.choice(['EFH_B', 'MFH_C'], n), 'WG_NWG': rng.choice(['WG', 'NWG'], n),
+        'Fest_ID': np.arange(n).astype(str), 'Nutzung': 'x', 'NF': rng.uniform(50, 200, n), 'RW': 1.0, 'WW': 1.0,
+        'RW_WW': rng.uniform(0, 100, n), 'RW_spez': 1.0, 'WW_spez': 1.0, 'RW_WW_spez': 1.0},
+        geometry=geometries, crs=25832)
+    buildings_path, parcels_path = str(tmp_path / 'buildings.gpkg'), str(tmp_path / 'parcels.gpkg')
+    buildings_gdf.to_file(buildings_path)
+    parcels_gdf.to_file(parcels_path)
+    return buildings_path, parcels_path
+
+
+def _sorted(gdf):
+    # GeoPackages store multi polygons, merged buildings share their geometry, so the parts and all
+    # attributes are the sort key
+    parts = gdf.geometry.explode(index_parts=False).normalize().to_wkt(rounding_precision=3)
+    key = parts.groupby(level=0).agg(lambda wkt: ';'.join(sorted(wkt)))
+    df = gdf.drop(columns=['new_ID', 'geometry']).assign(key=key.loc[gdf.index].to_numpy())
+    order = df.astype(str).sort_values(['key'] + list(df.columns.drop('key'))).index
+    return df.loc[order].reset_index(drop=True)
+
+
+def test_tiled_adjust_matches_adjust_at_once(tmp_path):
+    buildings_path, parcels_path = _fixture(tmp_path)
+    excel_path = str(DATA / 'building_info.xlsx')
+    info = load_excel(excel_path, sheet_name='database', cache_dir=str(tmp_path / 'cache'))
+    demand = load_excel(excel_path, sheet_name='Grunddaten_Gebaeude', nrows=13, usecols='A:D', cache_dir=str(tmp_path / 'cache'))
+
+    buildings = Buildings_adj(buildings_path, 'RW_WW')
+    buildings.gdf = buildings.gdf[buildings.gdf['RW_WW'] > 0].reset_index(drop=True)
+    buildings.add_LANUV_age_and_type()
+    buildings.merge_buildings()
+    buildings.gdf['new_ID'] = buildings.gdf.index.astype('int32')
+    buildings.gdf = spatial_join(buildings.gdf.copy(), Parcels_adj(parcels_path).gdf, ['validFrom'])
+    buildings.add_BAK(BAK_BINS, BAK_LABELS)
+    buildings.add_Vlh_Loadprofile(info)
+    buildings.drop_unwanted()
+    buildings.add_power()
+    buildings.add_custom_heat_demand(demand, info)
+    buildings.add_connect_option()
+    buildings.rename_and_order_columns()
+
+    output_path = str(tmp_path / 'adjusted.gpkg')
+    n = adjust_buildings_tiled(buildings_path, parcels_path, output_path, 'RW_WW', info, demand, BAK_BINS, BAK_LABELS,
+                               tile_size=200, halo=100)
+    tiled = gpd.read_file(output_path)
+    assert n == len(buildings.gdf) == len(tiled)
+    assert tiled['new_ID'].is_unique
+
+    expected, result = _sorted(buildings.gdf), _sorted(tiled)
+    for col in expected.columns:
+        if pd.api.types.is_numeric_dtype(expected[col]):
+            np.testing.assert_allclose(result[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float), equal_nan=True)
+        else:
+            assert (result[col].fillna('nan').astype(str) == expected[col].fillna('nan').astype(str)).all(), col
+
+
+def test_tiles_are_written_with_the_schema_of_the_first_tile(tmp_path):
+    first = gpd.GeoDataFrame({'count': [1, 2], 'note': [None, None], 'name': ['a', 'b']},
+                             geometry=[Point(0, 0), Point(1, 1)], crs=25832)
+    second = gpd.GeoDataFrame({'count': [np.nan, 3.0], 'note': ['x', None], 'name': [None, None]},
+                              geometry=[Point(2, 2), Point(3, 3)], crs=25832)
+    schema = tile_schema(first, text_columns=['note'])
+    assert schema == {'count': 'Int64', 'note': 'text', 'name': 'text'}
+
+    path = str(tmp_path / 'tiles.gpkg')
+    apply_schema(first, schema).to_file(path, mode='w')
+    apply_schema(second, schema).to_file(path, mode='a')
+    result = gpd.read_file(path)
+    assert result['count'].tolist()[:2] == [1, 2] and np.isnan(result['count'].iloc[2])
+    assert result['note'].tolist()[2] == 'x'
+    assert result['name'].tolist()[:2] == ['a', 'b']
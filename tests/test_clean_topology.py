@@ -0,0 +1,31 @@
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from adjust_files import Streets_adj
+
+
+def _streets(lines):
+    streets = Streets_adj.__new__(Streets_adj)
+    streets.gdf = gpd.GeoDataFrame({'name': [str(i) for i in range(len(lines))]},
+                                   geometry=[LineString(line) for line in lines], crs='EPSG:25832')
+    return streets
+
+
+def test_dangling_end_is_snapped_onto_junction():
+    # street 1 ends 0.2 m before the junction of streets 0 and 2, the junction must stay in place
+    streets = _streets([[(0, 0), (10, 0)], [(10.2, 0), (20, 0)], [(10, 0), (10, 10)]])
+    report = streets.clean_topology()
+    assert report.startswith('Street topology cleaned')
+    assert streets.topology_report['snapped_endpoints'] == 1
+    coordinates = {tuple(map(float, line.coords[0])) for line in streets.gdf.geometry}
+    coordinates |= {tuple(map(float, line.coords[-1])) for line in streets.gdf.geometry}
+    assert (10.0, 0.0) in coordinates
+    assert (10.2, 0.0) not in coordinates and (10.1, 0.0) not in coordinates
+
+
+def test_dead_end_is_snapped_onto_street():
+    streets = _streets([[(0, 0), (10, 0)], [(5, 0.3), (5, -10)]])
+    streets.clean_topology()
+    assert streets.topology_report['snapped_to_streets'] == 1
+    assert len(streets.gdf) == 3 # the first street is split at the snapped dead end
+    assert set(streets.gdf['name']) == {'0', '1'}
@@ -0,0 +1,18 @@
+import geopandas as gpd
+import pandas as pd
+
+from download_files import combine_zensus
+
+
+def test_combine_zensus_joins_cells():
+    heating = pd.DataFrame({'GITTER_ID_100m': ['a', 'b', 'c'], 'x_mp_100m': [4000050.0, 4000150.0, 4000250.0],
+                            'y_mp_100m': [3000050.0, 3000050.0, 3000050.0], 'Fernheizung': [1.0, 2.0, 3.0]})
+    energy = pd.DataFrame({'GITTER_ID_100m': ['c', 'a'], 'x_mp_100m': [4000250.0, 4000050.0],
+                           'y_mp_100m': [3000050.0, 3000050.0], 'Gas': [30.0, 10.0]})
+    zensus = combine_zensus(heating, energy)
+
+    assert isinstance(zensus, gpd.GeoDataFrame) and zensus.crs.to_epsg() == 3035
+    assert zensus['GITTER_ID_100m_left'].tolist() == zensus['GITTER_ID_100m_right'].tolist() == ['a', 'c']
+    assert zensus['Fernheizung'].tolist() == [1.0, 3.0] and zensus['Gas'].tolist() == [10.0, 30.0]
+    assert zensus.geometry.iloc[0].bounds == (4000000.0, 3000000.0, 4000100.0, 3000100.0)
+    assert 'point' not in zensus.columns
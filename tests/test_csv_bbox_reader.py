@@ -0,0 +1,63 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from download_files import read_csv_from_zip_in_bbox
+
+HEADER = 'GITTER_ID_100m;x_mp_100m;y_mp_100m;Insgesamt_Heizungsart;Fernheizung'
+
+
+def _zip(tmp_path, rows):
+    path = tmp_path / 'Zensus2022_Heizungsart.zip'
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('Zensus2022_Heizungsart_100m-Gitter.csv', '\n'.join([HEADER] + rows).encode('latin1'))
+    return str(path)
+
+
+def _rows(n):
+    rng = np.random.default_rng(0)
+    x = 4000050 + 100 * rng.integers(0, 50, n)
+    y = 3000050 + 100 * rng.integers(0, 50, n)
+    return [f'CRS3035RES100mN{b}E{a};{a};{b};{rng.integers(1, 20)};{rng.integers(0, 5)}' for a, b in zip(x, y)]
+
+
+def _read_all_as_text(zip_path, bbox):
+    # reference: the earlier implementation read all columns as strings and converted them after filtering
+    with zipfile.ZipFile(zip_path) as z, z.open(z.namelist()[0]) as f:
+        df = pd.read_csv(f, delimiter=';', encoding='latin1', dtype=str)
+    x, y = pd.to_numeric(df['x_mp_100m']), pd.to_numeric(df['y_mp_100m'])
+    df = df[(x > bbox[0]) & (x < bbox[2]) & (y > bbox[1]) & (y < bbox[3])].reset_index(drop=True)
+    for col in df.columns:
+        numbers = pd.to_numeric(df[col], errors='coerce')
+        if numbers.notna().all():
+            df[col] = numbers
+    return df
+
+
+def test_matches_reading_all_columns_as_text(tmp_path):
+    zip_path = _zip(tmp_path, _rows(500))
+    bbox = (4001000, 3001000, 4003000, 3004000)
+    df = read_csv_from_zip_in_bbox(zip_path, 'Heizungsart_100m-Gitter', bbox, encoding='latin1', chunk_size=64)
+    expected = _read_all_as_text(zip_path, bbox)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert df['GITTER_ID_100m'].map(type).eq(str).all()
+    assert all(df[col].dtype == 'float64' for col in ['x_mp_100m', 'y_mp_100m', 'Fernheizung'])
+
+
+def test_suppressed_values_and_text(tmp_path):
+    zip_path = _zip(tmp_path, ['CRS3035RES100mN3000050E4000050;4000050;3000050;5;\x96',
+                               'CRS3035RES100mN3000150E4000150;4000150;3000150;7;3'])
+    df = read_csv_from_zip_in_bbox(zip_path, 'Heizungsart_100m-Gitter', (0, 0, 1e8, 1e8), encoding='latin1')
+    assert np.isnan(df['Fernheizung'].iloc[0]) and df['Fernheizung'].iloc[1] == 3
+
+    # a value column with text is kept as strings
+    zip_path = _zip(tmp_path, ['CRS3035RES100mN3000050E4000050;4000050;3000050;5;unknown'])
+    df = read_csv_from_zip_in_bbox(zip_path, 'Heizungsart_100m-Gitter', (0, 0, 1e8, 1e8), encoding='latin1')
+    assert df['Fernheizung'].tolist() == ['unknown'] and df['Insgesamt_Heizungsart'].tolist() == [5]
+
+
+def test_empty_region_has_typed_columns(tmp_path):
+    zip_path = _zip(tmp_path, _rows(10))
+    df = read_csv_from_zip_in_bbox(zip_path, 'Heizungsart_100m-Gitter', (0, 0, 1, 1), encoding='latin1')
+    assert len(df) == 0 and df['x_mp_100m'].dtype == 'float64'
@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import download_files
+from download_files import cache_store, download_cached, download_cached_QGIS
+from task_control import CancelToken, TaskCancelled, progress_callback
+
+
+class _Response(io.BytesIO):
+    def __init__(self, content, etag):
+        super().__init__(content)
+        self.headers = {'Content-Length': str(len(content)), 'ETag': etag}
+
+
+def test_parallel_downloads_keep_all_index_entries(tmp_path, monkeypatch):
+    def urlopen(request):
+        time.sleep(0.01)
+        return _Response(request.full_url.encode() * 1000, f'"{request.full_url}"')
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+
+    urls = [f'http://example.com/file_{i}.zip' for i in range(16)]
+    paths = {}
+    threads = [threading.Thread(target=lambda url=url: paths.update({url: download_cached(url, str(tmp_path))}))
+               for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(tmp_path / 'index.json', encoding='utf-8') as f:
+        index = json.load(f)
+    assert sorted(index) == sorted(urls)
+    for url in urls:
+        with open(paths[url], 'rb') as f:
+            assert f.read() == url.encode() * 1000
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+    # fresh entries are used without a request
+    monkeypatch.setattr(urllib.request, 'urlopen', None)
+    assert download_cached(urls[0], str(tmp_path)) == paths[urls[0]]
+
+
+def test_recently_used_files_are_not_evicted(tmp_path, monkeypatch):
+    paths = []
+    for i in range(3):
+        tmp = tmp_path / f'{i}.part'
+        tmp.write_bytes(b'x' * 100)
+        paths.append(cache_store(f'http://example.com/{i}.zip', str(tmp), cache_dir=str(tmp_path), max_size=150))
+    assert all(os.path.exists(path) for path in paths)
+
+    # the least recently used file is evicted once it is no longer in use
+    monkeypatch.setattr(download_files, 'DOWNLOAD_CACHE_IN_USE', 0)
+    tmp = tmp_path / '3.part'
+    tmp.write_bytes(b'x' * 100)
+    paths.append(cache_store('http://example.com/3.zip', str(tmp), cache_dir=str(tmp_path), max_size=150))
+    assert [os.path.exists(path) for path in paths] == [False, False, False, True]
+
+
+class _Signal:
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self.slots:
+            try:
+                slot(*args)
+            except Exception as e:
+                # like Qt, exceptions of a slot do not reach the code that emitted the signal
+                _Reply.slot_errors.append(e)
+
+
+class _Reply:
+    '''
+    Reply of QgsNetworkAccessManager that delivers its chunks within the event loop.
+    '''
+    slot_errors = []
+    current = None
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b''
+        self.aborted = False
+        self.delivered = 0
+        self.readyRead, self.downloadProgress, self.finished = _Signal(), _Signal(), _Signal()
+
+    def run(self):
+        total = sum(len(chunk) for chunk in self.chunks)
+        received = 0
+        for chunk in self.chunks:
+            if self.aborted:
+                return
+            self.buffer += chunk
+            received += len(chunk)
+            self.delivered += 1
+            self.readyRead.emit()
+            self.downloadProgress.emit(received, total)
+        self.finished.emit()
+
+    def readAll(self):
+        data, self.buffer = self.buffer, b''
+        return data
+
+    def abort(self):
+        self.aborted = True
+        self.finished.emit()
+
+    def attribute(self, attribute):
+        return 200
+
+    def error(self):
+        return 5 if self.aborted else 0 # OperationCanceledError
+
+    def rawHeader(self, name):
+        return b''
+
+    def deleteLater(self):
+        pass
+
+
+class _NetworkAccessManager:
+    @staticmethod
+    def instance():
+        return _NetworkAccessManager()
+
+    def get(self, request):
+        return _Reply.current
+
+
+class _EventLoop:
+    def quit(self):
+        pass
+
+    def exec_(self):
+        _Reply.current.run()
+
+
+class _Request:
+    HttpStatusCodeAttribute = 0
+
+    def __init__(self, url):
+        pass
+
+    def setRawHeader(self, name, value):
+        pass
+
+
+@pytest.fixture
+def qgis_network(monkeypatch):
+    monkeypatch.setattr(download_files, 'QgsNetworkAccessManager', _NetworkAccessManager)
+    monkeypatch.setattr(download_files, 'QNetworkRequest', _Request)
+    monkeypatch.setattr(download_files, 'QEventLoop', _EventLoop)
+    monkeypatch.setattr(download_files, 'QUrl', str)
+    _Reply.slot_errors = []
+
+
+def test_download_QGIS_is_stored_in_cache(tmp_path, qgis_network):
+    _Reply.current = _Reply([b'a' * 10, b'b' * 10])
+    values = []
+    path = download_cached_QGIS('http://example.com/file.zip', str(tmp_path),
+                                progress=progress_callback(values.append, 0, 100, CancelToken()))
+    with open(path, 'rb') as f:
+        assert f.read() == b'a' * 10 + b'b' * 10
+    assert values == [50, 100]
+
+
+def test_cancelled_download_QGIS_aborts_the_reply(tmp_path, qgis_network):
+    token = CancelToken()
+
+    def report(value):
+        if value >= 20:
+            token.cancel()
+
+    _Reply.current = reply = _Reply([b'x' * 10] * 10)
+    with pytest.raises(TaskCancelled):
+        download_cached_QGIS('http://example.com/file.zip', str(tmp_path), progress=progress_callback(report, 0, 100, token))
+
+    # the reply is aborted at the next progress report, no data is kept
+    assert reply.aborted and reply.delivered == 3
+    assert _Reply.slot_errors == []
+    assert os.listdir(tmp_path) == []
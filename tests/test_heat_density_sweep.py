@@ -0,0 +1,69 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import LineString, box
+
+from status_analysis import WLD, Polygons
+
+
+def _district():
+    rng = np.random.default_rng(3)
+    parcels = gpd.GeoDataFrame(geometry=[box(x, y, x + 30, y + 30) for x in range(0, 300, 30) for y in range(0, 300, 30)],
+                               crs='EPSG:25832')
+    geometries, heat = [], []
+    for parcel in parcels.geometry[rng.choice(len(parcels), 60, replace=False)]:
+        x0, y0 = parcel.bounds[:2]
+        x, y = x0 + rng.uniform(-5, 20), y0 + rng.uniform(-5, 20) # some buildings cover two parcels
+        geometries.append(box(x, y, x + 12, y + 12))
+        heat.append(rng.uniform(1000, 50000))
+    buildings = gpd.GeoDataFrame({'new_ID': np.arange(60), 'heat': heat, 'power': np.array(heat) / 2000},
+                                 geometry=geometries, crs='EPSG:25832')
+    streets = gpd.GeoDataFrame(geometry=[LineString([(0, y), (300, y)]) for y in range(15, 300, 60)] +
+                               [LineString([(x, 0), (x, 300)]) for x in range(45, 300, 90)], crs='EPSG:25832')
+    wld = WLD(buildings.copy(), streets)
+    wld.get_centroid()
+    wld.closest_street_buildings()
+    wld.add_lenght()
+    wld.add_heat_att('heat')
+    wld.add_WLD('heat')
+    return parcels, wld.streets, buildings
+
+
+def _select_parcels_baseline(parcels, wld, buildings, WLD_value):
+    '''
+    Parcel selection of a single threshold as before the sweep: buildings of streets above the threshold,
+    parcels whose most covered building lies on them with at least 10 % of its footprint.
+    '''
+    filtered_wld = wld[wld['WLD [kWh/a*m]'] >= WLD_value]
+    ids = [int(i) for ids in filtered_wld['connected'].dropna().str.split(',').tolist() if isinstance(ids, list) for i in ids if i]
+    connected = buildings[buildings['new_ID'].isin(ids)].copy()
+    connected['building_area'] = connected.geometry.area
+    join = gpd.sjoin(parcels, connected, how='inner', predicate='intersects')
+    join['overlap_area'] = [parcels.geometry.loc[i].intersection(connected.geometry.loc[j]).area
+                            for i, j in zip(join.index, join['index_right'])]
+    join['coverage_ratio'] = join['overlap_area'] / join['building_area']
+    max_coverage = join.sort_values(by='coverage_ratio', ascending=False).groupby(level=0).first()
+    return parcels.loc[max_coverage.index[max_coverage['coverage_ratio'] >= 0.1]]
+
+
+def test_sweep_matches_single_threshold_runs():
+    parcels, wld, buildings = _district()
+    values = list(np.quantile(wld['WLD [kWh/a*m]'].dropna(), [0.8, 0.5, 0.2]))
+    polygons = Polygons(parcels, wld, buildings)
+    polygons.calculate_building_coverage()
+    results = polygons.heat_density_sweep(values, 0.5, 'heat', 'power')
+    assert list(results) == sorted(values, reverse=True)
+
+    for value, result in results.items():
+        reference = Polygons(parcels, wld, buildings)
+        reference.selected_parcels = _select_parcels_baseline(parcels, wld, buildings, value).copy()
+        assert len(reference.selected_parcels) > 0
+        reference.buffer_dissolve_and_explode(0.5)
+        reference.add_attributes('heat', 'power')
+        reference.rename_columns()
+        expected = reference.polygons
+
+        assert len(result) == len(expected)
+        assert result.union_all().symmetric_difference(expected.union_all()).area == pytest.approx(0, abs=1e-6)
+        for column in ['Anschluesse', 'Waermebedarf [kWh/a]', 'Thermische Leistung [kW]']:
+            np.testing.assert_allclose(np.sort(result[column].to_numpy(dtype=float)), np.sort(expected[column].to_numpy(dtype=float)))
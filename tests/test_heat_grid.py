@@ -0,0 +1,49 @@
+import math
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from status_analysis import HeatGrid
+
+
+def _buildings(points, heat, power):
+    geometry = [box(x - 2, y - 2, x + 2, y + 2) for x, y in points]
+    return gpd.GeoDataFrame({'heat': heat, 'power': power}, geometry=geometry, crs='EPSG:25832')
+
+
+def test_bin_buildings_matches_loop():
+    points = [(105, 210), (150, 250), (320, 210), (330, 460), (505, 505)]
+    buildings = _buildings(points, [10, 20, 30, 0, 40], [1, 2, 3, 4, 5])
+    grid = HeatGrid(buildings, cell_size=100)
+    grid.bin_buildings('heat', 'power')
+
+    # reference: assign each building with heat demand to the cell of its centroid one by one
+    expected = {}
+    for (x, y), heat, power in zip(points, buildings['heat'], buildings['power']):
+        if heat > 0:
+            cell = (math.floor(x / 100) * 100, math.floor(y / 100) * 100)
+            count, total_heat, total_power = expected.get(cell, (0, 0, 0))
+            expected[cell] = (count + 1, total_heat + heat, total_power + power)
+
+    polygons = grid.to_polygons()
+    result = {(int(row.geometry.bounds[0]), int(row.geometry.bounds[1])):
+              (row['Anschluesse'], row['Waermebedarf [kWh/a]'], row['Thermische Leistung [kW]'])
+              for _, row in polygons.iterrows()}
+    assert result == expected
+
+
+def test_empty_buildings():
+    grid = HeatGrid(_buildings([], [], []), cell_size=100)
+    grid.bin_buildings('heat', 'power')
+    polygons = grid.to_polygons()
+    assert len(polygons) == 0
+    assert 'Waermebedarf/Flaeche [MWh/ha*a]' in polygons.columns
+    with pytest.raises(ValueError):
+        grid.to_geotiff('unused.tif')
+
+
+def test_cell_count_is_limited():
+    buildings = _buildings([(0, 0), (1_000_000, 1_000_000)], [1, 1], [1, 1])
+    grid = HeatGrid(buildings, cell_size=1)
+    with pytest.raises(ValueError, match='cell size'):
+        grid.bin_buildings('heat', 'power')
@@ -0,0 +1,55 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from adjust_files import largest_overlap, spatial_join
+
+
+def _layers():
+    rng = np.random.default_rng(2)
+    geometries = [box(x, y, x + rng.uniform(5, 20), y + rng.uniform(5, 20)) for x, y in rng.uniform(0, 200, (50, 2))]
+    # one building outside of all parcels
+    buildings = gpd.GeoDataFrame({'name': [f'b{i}' for i in range(50)] + ['outside']},
+                                 geometry=geometries + [box(500, 500, 510, 510)], crs='EPSG:25832')
+    parcels = gpd.GeoDataFrame({'Flurstueck': [f'05{i:04d}' for i in range(64)], 'area_class': np.arange(64) % 5},
+                               geometry=[box(x, y, x + 25 + rng.uniform(0, 3), y + 25 + rng.uniform(0, 3))
+                                         for x in range(0, 200, 25) for y in range(0, 200, 25)], crs='EPSG:25832')
+    return buildings, parcels
+
+
+def _spatial_join_baseline(shape1, shape2, attributes):
+    '''
+    Spatial join as before the shared primitive: sjoin, row-wise intersection areas and the first row of
+    each feature after sorting by the area.
+    '''
+    joined = gpd.sjoin(shape1, shape2, how='inner', predicate='intersects')
+    joined['intersection_area'] = joined.apply(
+        lambda row: shape1.geometry.iloc[row.name].intersection(shape2.geometry.iloc[row['index_right']]).area, axis=1)
+    max_intersection = joined.sort_values(by='intersection_area', ascending=False).groupby(level=0).first()
+    for attr in attributes:
+        shape1[attr] = max_intersection[attr]
+    return shape1
+
+
+def test_spatial_join_matches_sjoin():
+    buildings, parcels = _layers()
+    reference = _spatial_join_baseline(buildings.copy(), parcels, ['Flurstueck', 'area_class'])
+
+    for chunk_size in (None, 7):
+        result = spatial_join(buildings.copy(), parcels, ['Flurstueck', 'area_class'], chunk_size=chunk_size)
+        assert result['Flurstueck'].isna().sum() == 1
+        pd.testing.assert_series_equal(result['Flurstueck'], reference['Flurstueck'], check_dtype=False)
+        np.testing.assert_array_equal(result['area_class'].to_numpy(float), reference['area_class'].to_numpy(float))
+
+
+def test_largest_overlap_is_independent_of_chunks():
+    buildings, parcels = _layers()
+    best = largest_overlap(buildings, parcels)
+    assert len(best) == len(buildings) - 1
+    for chunk_size in (1, 7, 100):
+        pd.testing.assert_frame_equal(largest_overlap(buildings, parcels, chunk_size).sort_index(), best.sort_index())
+
+    # the overlap is the maximum of all intersection areas of each building
+    areas = np.array([[b.intersection(p).area for p in parcels.geometry] for b in buildings.geometry[:-1]])
+    np.testing.assert_allclose(best.sort_index()['overlap_area'].to_numpy(), areas.max(axis=1))
@@ -0,0 +1,71 @@
+from collections import Counter
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from adjust_files import Buildings_adj
+
+
+def _buildings():
+    rng = np.random.default_rng(1)
+    n = 40
+    parcel = rng.integers(0, 8, n)
+    x = parcel * 50 + rng.integers(0, 3, n) * 10.0 # buildings of a parcel touch or overlap
+    nf = rng.uniform(50, 400, n)
+    rw_spez, ww_spez = rng.uniform(50, 200, n), rng.uniform(10, 30, n)
+    return gpd.GeoDataFrame({
+        'Flurstueck': [None] + [f'05{p:04d}' for p in parcel[1:]], # buildings without parcel are dropped
+        'citygml_fu': rng.choice(['31001_1000', '31001_2000'], n),
+        'Fortschrei': rng.choice(['2020-01-01', '2021-05-03'], n),
+        'type': 'WG',
+        'Fest_ID': [f'DENW{i:04d}' for i in range(n)],
+        'Nutzung': rng.choice(['Wohnen', 'Gewerbe'], n),
+        'NF': nf,
+        'RW_spez': rw_spez, 'RW': nf * rw_spez,
+        'WW_spez': ww_spez, 'WW': nf * ww_spez,
+        'RW_WW_spez': rw_spez + ww_spez, 'RW_WW': nf * (rw_spez + ww_spez),
+        'age_LANUV': rng.choice(['1919-1948', '1949-1957', '1958-1968'], n),
+    }, geometry=[box(xi, 0, xi + 12, 10) for xi in x], crs='EPSG:25832')
+
+
+def _merge_baseline(gdf):
+    '''
+    Merge of the buildings as before the vectorization, with dissolve and aggregations per group.
+    '''
+    def mode_or_string(x):
+        counts = Counter(x)
+        max_count = max(counts.values())
+        max_list = [val for val, count in counts.items() if count == max_count]
+        return str(max_list[0]) if len(max_list) == 1 else ', '.join(map(str, sorted(max_list)))
+
+    def weighted_average(s):
+        return (s * gdf.loc[s.index, 'NF']).sum() / gdf.loc[s.index, 'NF'].sum()
+
+    return gdf.dissolve(by=['Flurstueck', 'citygml_fu', 'Fortschrei', 'type'], as_index=False, aggfunc={
+        'Fest_ID': 'first', 'Nutzung': 'first', 'NF': 'sum', 'RW_spez': weighted_average, 'RW': 'sum',
+        'WW_spez': weighted_average, 'WW': 'sum', 'RW_WW_spez': weighted_average, 'RW_WW': 'sum',
+        'age_LANUV': mode_or_string})
+
+
+def test_merge_buildings_matches_dissolve():
+    gdf = _buildings()
+    buildings = Buildings_adj.__new__(Buildings_adj)
+    buildings.gdf = gdf.copy()
+    buildings.merge_buildings()
+    result = buildings.gdf
+    reference = _merge_baseline(gdf)
+
+    keys = ['Flurstueck', 'citygml_fu', 'Fortschrei', 'type']
+    result = result.sort_values(keys).reset_index(drop=True)
+    reference = reference.sort_values(keys).reset_index(drop=True)
+    assert len(result) == len(reference) < len(gdf)
+    assert reference['age_LANUV'].str.contains(', ').any() # ties are covered
+
+    for col in keys + ['Fest_ID', 'Nutzung', 'age_LANUV']:
+        assert list(result[col]) == list(reference[col]), col
+    for col in ['NF', 'RW_spez', 'RW', 'WW_spez', 'WW', 'RW_WW_spez', 'RW_WW']:
+        np.testing.assert_allclose(result[col].to_numpy(float), reference[col].to_numpy(float), rtol=1e-12, err_msg=col)
+    assert result.geometry.geom_equals(reference.geometry).all()
+    assert pd.Index(result.columns).difference(reference.columns).empty
@@ -0,0 +1,63 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+import read_files
+from read_files import read_layer
+
+
+def _buildings(path, driver):
+    rng = np.random.default_rng(5)
+    n = 60
+    gdf = gpd.GeoDataFrame({
+        'Fest_ID': [f'DENW{i:04d}' for i in range(n)],
+        'RW_WW': np.where(rng.random(n) < 0.3, 0.0, rng.uniform(1000, 50000, n)),
+        'NF': rng.uniform(50, 400, n),
+        'Nutzung': rng.choice(['Wohnen', 'Gewerbe'], n),
+    }, geometry=[box(x, y, x + 10, y + 10) for x, y in rng.uniform(0, 300, (n, 2))], crs='EPSG:25832')
+    gdf.to_file(path, driver=driver)
+    return path
+
+
+def _read_baseline(path, columns, heat_att, bbox):
+    '''
+    Read as before the pushdown: all features and attributes, filtered in pandas.
+    '''
+    gdf = gpd.read_file(path)
+    gdf = gdf[gdf.intersects(box(*bbox))] if bbox is not None else gdf
+    gdf = gdf[gdf[heat_att] > 0] if heat_att is not None else gdf
+    return gdf[columns + ['geometry']].sort_values('Fest_ID').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('driver, suffix', [('GPKG', '.gpkg'), ('ESRI Shapefile', '.shp')])
+@pytest.mark.parametrize('fallback', [False, True])
+def test_read_layer_matches_pandas_filter(tmp_path, monkeypatch, driver, suffix, fallback):
+    path = _buildings(str(tmp_path / f'buildings{suffix}'), driver)
+    if fallback:
+        monkeypatch.setattr(read_files, 'pyogrio', None)
+
+    columns = ['Fest_ID', 'RW_WW', 'NF', 'missing']
+    for where, heat_att, bbox in [(None, None, None), ('"RW_WW" > 0', 'RW_WW', None),
+                                  (None, None, (50, 50, 150, 200)), ('"RW_WW" > 0', 'RW_WW', (50, 50, 150, 200))]:
+        result = read_layer(path, columns=columns, where=where, bbox=bbox)
+        if where:
+            # callers repeat the filter, as it is not pushed down without pyogrio
+            result = result[result['RW_WW'] > 0]
+        # the spatial index of a GeoPackage changes the order of the features within a bbox
+        result = result.sort_values('Fest_ID').reset_index(drop=True)
+        reference = _read_baseline(path, ['Fest_ID', 'RW_WW', 'NF'], heat_att, bbox)
+
+        assert list(result.columns) == ['Fest_ID', 'RW_WW', 'NF', 'geometry']
+        assert 0 < len(result) < 60 or (where is None and bbox is None)
+        pd.testing.assert_frame_equal(pd.DataFrame(result.drop(columns='geometry')),
+                                      pd.DataFrame(reference.drop(columns='geometry')), check_dtype=False)
+        assert result.geometry.geom_equals(reference.geometry).all()
+
+
+def test_read_layer_geometry_only(tmp_path):
+    path = _buildings(str(tmp_path / 'buildings.gpkg'), 'GPKG')
+    result = read_layer(path, columns=[])
+    assert list(result.columns) == ['geometry']
+    assert result.geometry.geom_equals(gpd.read_file(path).geometry).all()
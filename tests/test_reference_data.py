@@ -0,0 +1,52 @@
+import json
+import os
+
+import pandas as pd
+
+import reference_data
+from reference_data import compiled_table, load_excel, user_cache_dir
+
+
+def test_load_excel_matches_read_excel(tmp_path):
+    path = tmp_path / 'pipe_data.xlsx'
+    pd.DataFrame({'DN': [20, 25, 32], 'Kosten': [1.5, 2.0, 2.5]}).to_excel(path, sheet_name='pipe_data', index=False)
+    cache_dir = str(tmp_path / 'cache')
+    expected = pd.read_excel(path, sheet_name='pipe_data')
+    pd.testing.assert_frame_equal(load_excel(str(path), sheet_name='pipe_data', cache_dir=cache_dir), expected)
+
+    # the compiled table of a new session is read from the cache directory
+    reference_data._session.clear()
+    table = compiled_table(str(path), 'excel', lambda: 1 / 0, {'sheet_name': 'pipe_data'}, cache_dir)
+    pd.testing.assert_frame_equal(table, expected)
+
+
+def _write(path, content):
+    # new content of the same size, the modification time is advanced to be independent of its resolution
+    mtime_ns = os.stat(path).st_mtime_ns if path.exists() else 0
+    path.write_text(content)
+    os.utime(path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+
+
+def test_earlier_versions_are_removed(tmp_path):
+    path = tmp_path / 'table.csv'
+    cache_dir = tmp_path / 'cache'
+    for content in ['a\n1\n', 'a\n2\n', 'a\n3\n']:
+        _write(path, content)
+        table = compiled_table(str(path), 'csv', lambda: pd.read_csv(path), cache_dir=str(cache_dir))
+    assert table['a'].tolist() == [3]
+    assert len([name for name in os.listdir(cache_dir) if name.startswith('table_csv_')]) == 1
+
+    # fingerprints of deleted source files are removed
+    other = tmp_path / 'other.csv'
+    _write(other, 'b\n1\n')
+    compiled_table(str(other), 'csv', lambda: pd.read_csv(other), cache_dir=str(cache_dir))
+    path.unlink()
+    _write(other, 'b\n2\n')
+    compiled_table(str(other), 'csv', lambda: pd.read_csv(other), cache_dir=str(cache_dir))
+    with open(cache_dir / 'index.json', encoding='utf-8') as f:
+        assert list(json.load(f)) == [str(other)]
+
+
+def test_user_cache_dir_is_outside_of_the_plugin():
+    plugin_dir = os.path.dirname(os.path.dirname(reference_data.__file__))
+    assert not os.path.abspath(user_cache_dir()).startswith(os.path.abspath(plugin_dir))
@@ -0,0 +1,55 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from download_files import repair_geometries
+
+
+def _parcels():
+    rng = np.random.default_rng(7)
+    valid = [box(x, y, x + 20, y + 20) for x, y in rng.uniform(0, 500, (20, 2))]
+    invalid = [
+        Polygon([(0, 0), (10, 10), (10, 0), (0, 10)]), # bowtie
+        Polygon([(0, 0), (10, 0), (10, 10), (5, 10), (5, 15), (5, 10), (0, 10)]), # spike
+        Polygon([(0, 0), (10, 0), (10, 10), (0, 10)], [[(2, 2), (12, 2), (12, 8), (2, 8)]]), # hole outside of the shell
+        MultiPolygon([box(0, 0, 10, 10), box(5, 5, 15, 15)]), # overlapping parts
+    ]
+    geometries = valid[:10] + invalid + valid[10:] + [None]
+    return gpd.GeoDataFrame({'Flurstueck': [f'05{i:04d}' for i in range(len(geometries))]}, geometry=geometries,
+                            crs='EPSG:25832')
+
+
+def test_repair_geometries_keeps_valid_and_repairs_invalid():
+    parcels = _parcels()
+    original = parcels.geometry.copy()
+    result, n_repaired = repair_geometries(parcels)
+
+    # the input is not changed
+    assert parcels.geometry.equals(original)
+    assert n_repaired == 4
+    assert result.geometry.is_valid.iloc[:-1].all() and result.geometry.iloc[-1] is None
+    assert list(result['Flurstueck']) == list(parcels['Flurstueck'])
+
+    # valid geometries are kept exactly, the former buffer(0) only rewrote them
+    valid = parcels.geometry.notna() & parcels.geometry.is_valid
+    assert result.geometry[valid].geom_equals_exact(parcels.geometry[valid], 0).all()
+    assert result.geometry[valid].geom_equals(parcels.geometry[valid].buffer(0)).all()
+
+    # repaired geometries are polygonal and cover the result of the former buffer(0)
+    repaired = result.geometry[~valid & parcels.geometry.notna()]
+    buffered = parcels.geometry[repaired.index].buffer(0)
+    assert set(repaired.geom_type) <= {'Polygon', 'MultiPolygon'}
+    assert (buffered.difference(repaired).area < 1e-9).all()
+    # overlapping parts are united, spikes and holes outside of the shell are repaired as before
+    assert repaired.iloc[1:].geom_equals(buffered.iloc[1:]).all()
+    # the bowtie keeps both triangles, buffer(0) drops one of them
+    assert repaired.iloc[0].area == 50 and buffered.iloc[0].area == 25
+
+
+def test_repair_geometries_without_invalid_geometries():
+    parcels = _parcels().iloc[:10]
+    result, n_repaired = repair_geometries(parcels)
+    assert n_repaired == 0
+    assert result is parcels
+    assert shapely.equals_exact(result.geometry.to_numpy(), parcels.geometry.to_numpy(), 0).all()
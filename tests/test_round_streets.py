@@ -0,0 +1,45 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, MultiLineString
+
+from adjust_files import Streets_adj
+
+
+def _round_baseline(geometry):
+    '''
+    Rounding of a single street as before the vectorization, per coordinate with round().
+    '''
+    return LineString([(round(x, 3), round(y, 3)) for x, y in geometry.coords])
+
+
+def _streets(gdf):
+    streets = Streets_adj.__new__(Streets_adj)
+    streets.gdf = gdf.copy()
+    streets.round_streets()
+    return streets.gdf
+
+
+def test_round_streets_matches_per_coordinate_rounding():
+    rng = np.random.default_rng(0)
+    lines = [LineString(rng.uniform(0, 1000, (rng.integers(2, 6), 2))) for _ in range(20)]
+    # values on the rounding boundary
+    lines.append(LineString([(0.0005, 1.2345), (2.0015, -3.4565), (10.12349999, 7.9995)]))
+    gdf = gpd.GeoDataFrame({'name': [f's{i}' for i in range(len(lines))]}, geometry=lines, crs='EPSG:25832')
+
+    result = _streets(gdf)
+    assert list(result['name']) == list(gdf['name'])
+    for rounded, line in zip(result.geometry, gdf.geometry):
+        assert rounded.equals_exact(_round_baseline(line), 0)
+
+
+def test_round_streets_keeps_all_parts_of_multilinestrings():
+    multi = MultiLineString([[(0, 0), (10.00049, 0)], [(20, 0), (30, 0.1234)]])
+    gdf = gpd.GeoDataFrame({'name': ['a', 'b']}, geometry=[LineString([(0, 5), (10, 5)]), multi], crs='EPSG:25832')
+
+    result = _streets(gdf)
+    # the first part equals the former result, the other parts are kept as separate streets
+    assert list(result['name']) == ['a', 'b', 'b']
+    assert result.geometry.iloc[1].equals_exact(_round_baseline(multi.geoms[0]), 0)
+    assert result.geometry.iloc[2].equals_exact(_round_baseline(multi.geoms[1]), 0)
+    assert result.length.sum() == _round_baseline(multi.geoms[0]).length + _round_baseline(multi.geoms[1]).length + 10
+    assert result.index.is_unique
@@ -0,0 +1,40 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, box
+
+from download_files import select_by_parcels
+
+
+def _district():
+    rng = np.random.default_rng(6)
+    # parcels with gaps in between
+    parcels = gpd.GeoDataFrame(geometry=[box(x, y, x + 20, y + 20) for x in range(0, 200, 25) for y in range(0, 200, 25)
+                                         if (x + y) % 75], crs='EPSG:25832')
+    buildings = gpd.GeoDataFrame({'Fest_ID': [f'DENW{i:04d}' for i in range(80)]},
+                                 geometry=[box(x, y, x + rng.uniform(2, 10), y + rng.uniform(2, 10))
+                                           for x, y in rng.uniform(-20, 220, (80, 2))], crs='EPSG:25832')
+    buildings.index = rng.permutation(np.arange(100, 180)) # index labels are kept
+    streets = gpd.GeoDataFrame({'name': [f's{i}' for i in range(12)]},
+                               geometry=[LineString([(-30, y), (230, y)]) for y in np.arange(-30, 230, 22.5)][:12],
+                               crs='EPSG:25832')
+    return parcels, buildings, streets
+
+
+def _select_baseline(gdf, parcels):
+    '''
+    Selection as before the parcel index: intersection with the union of all parcels.
+    '''
+    union = gpd.GeoDataFrame(geometry=[parcels.union_all()], crs=parcels.crs)
+    return gpd.sjoin(gdf, union, predicate='intersects').drop(columns='index_right')
+
+
+def test_select_by_parcels_matches_union():
+    parcels, buildings, streets = _district()
+    for gdf in (buildings, streets):
+        result = select_by_parcels(gdf, parcels)
+        reference = _select_baseline(gdf, parcels)
+        assert 0 < len(result) < len(gdf)
+        assert sorted(result.index) == sorted(reference.index)
+        assert list(result.index) == [i for i in gdf.index if i in set(result.index)] # original order
+        assert list(result.columns) == list(gdf.columns)
+        assert result.geometry.geom_equals(gdf.geometry.loc[result.index]).all()
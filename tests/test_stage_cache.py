@@ -0,0 +1,42 @@
+import pandas as pd
+
+from stage_cache import StageCache
+
+
+def test_key_changes_with_file_content(tmp_path):
+    path = tmp_path / 'layer.gpkg'
+    path.write_bytes(b'a')
+    cache = StageCache(str(tmp_path / 'stages'))
+    key_a = cache.key('net_graph', [str(path)], heat_attribute='RW_WW')
+    assert key_a == cache.key('net_graph', [str(path)], heat_attribute='RW_WW')
+    path.write_bytes(b'bb')
+    assert cache.key('net_graph', [str(path)], heat_attribute='RW_WW') != key_a
+
+
+def test_key_hashes_tables_by_content(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = cache.key('net', pipe_info=pd.DataFrame({'DN': [20, 25]}))
+    assert key == cache.key('net', pipe_info=pd.DataFrame({'DN': [20, 25]}))
+    assert key != cache.key('net', pipe_info=pd.DataFrame({'DN': [20, 32]}))
+
+
+def test_uncached_parent_disables_stage(tmp_path):
+    # a graph of layers with unsaved edits has no key, so the routed net must not be taken from the cache
+    cache = StageCache(str(tmp_path))
+    cached_key = cache.key('net', parents=['graph'], t_supply=80)
+    cache.save('net', cached_key, 'net of an earlier run')
+    key = cache.key('net', parents=[None], t_supply=80)
+    assert key is None
+    assert cache.load('net', key) is None
+    cache.save('net', key, 'net of unsaved layers')
+    assert cache.load('net', cached_key) == 'net of an earlier run'
+
+
+def test_load_from_file_in_new_session(tmp_path):
+    import stage_cache
+    cache = StageCache(str(tmp_path))
+    key = cache.key('net', parents=['graph'])
+    cache.save('net', key, {'n': 1})
+    stage_cache._session.clear()
+    assert cache.load('net', key) == {'n': 1}
+    assert cache.load('net', cache.key('net', parents=['other'])) is None
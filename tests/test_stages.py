@@ -0,0 +1,101 @@
+import geopandas as gpd
+import pytest
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString, Point, box
+
+import pipeline
+from load_curve import LoadProfile
+from stage_cache import StageCache
+from stages import BUILDING_CLASS, save_net
+
+
+@pytest.fixture(autouse=True)
+def fast_run(tmp_path, monkeypatch):
+    '''
+    Keeps the caches in the test directory and replaces the bar charts of 8760 hours by a small image.
+    '''
+    monkeypatch.setattr(pipeline, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(pipeline, 'STAGE_CACHE_DIR', str(tmp_path / 'cache' / 'stages'))
+
+    def plot_bar_chart(dataframe, column_names, filename, **kwargs):
+        figure = Figure(figsize=(1, 1))
+        figure.add_subplot().plot(dataframe[column_names[0]].to_numpy()[:24])
+        figure.savefig(filename, dpi=20)
+    monkeypatch.setattr(LoadProfile, 'plot_bar_chart', staticmethod(plot_bar_chart))
+
+
+def _district(directory):
+    '''
+    Writes buildings on both sides of a street, their parcels, the street and a heat source.
+    '''
+    parcels, buildings, function, kind = [], [], [], []
+    for i in range(8):
+        for y0, side in [(5, 'north'), (-45, 'south')]:
+            parcels.append(box(i * 40, y0, i * 40 + 40, y0 + 40))
+            y = y0 + 10 if side == 'north' else y0 + 20
+            buildings.append(box(i * 40 + 10, y, i * 40 + 25, y + 10))
+            function.append('31001_1010' if i % 2 else '31001_2020')
+            kind.append('EFH_B' if i % 2 else 'MFH_C')
+    n = len(buildings)
+    rng = np.random.default_rng(0)
+    gpd.GeoDataFrame({'Flurstueck': [f'F{i}' for i in range(n)], 'citygml_fu': function, 'Fortschrei': 'a',
+                      'GEBAEUDETY': kind, 'WG_NWG': 'WG', 'Fest_ID': [str(i) for i in range(n)], 'Nutzung': 'x',
+                      'NF': rng.uniform(80, 200, n), 'RW': 1.0, 'WW': 1.0, 'RW_WW': rng.uniform(5000, 20000, n),
+                      'RW_spez': 1.0, 'WW_spez': 1.0, 'RW_WW_spez': 1.0},
+                     geometry=buildings, crs=25832).to_file(directory / 'buildings.gpkg')
+    gpd.GeoDataFrame({'validFrom': ['1960-01-01', '1995-01-01'] * 8}, geometry=parcels, crs=25832).to_file(directory / 'parcels.gpkg')
+    gpd.GeoDataFrame({'name': ['main']}, geometry=[LineString([(-40, 0), (340, 0)])], crs=25832).to_file(directory / 'streets.gpkg')
+    gpd.GeoDataFrame({'name': ['source']}, geometry=[Point(-30, 2)], crs=25832).to_file(directory / 'source.gpkg')
+
+
+def test_pipeline_runs_the_shared_stages(tmp_path, monkeypatch):
+    calls = []
+    create_profile = LoadProfile.create_heat_demand_profile
+
+    def record(self, building_type, building_class, *args):
+        calls.append((building_type, building_class))
+        return create_profile(self, building_type, building_class, *args)
+    monkeypatch.setattr(LoadProfile, 'create_heat_demand_profile', record)
+
+    directory = tmp_path / 'runs' / 'test'
+    directory.mkdir(parents=True)
+    _district(directory)
+    run = dict(pipeline.DEFAULT_CONFIG, name='test', output_dir=str(tmp_path / 'runs'), stages=['adjust', 'status', 'net', 'result'],
+               paths={'source': str(directory / 'source.gpkg')}, building_class=5)
+    summary = pipeline.run_pipeline(run)
+    assert summary['status'] == 'complete', summary['message']
+
+    buildings = gpd.read_file(directory / 'buildings_adj.gpkg')
+    assert len(buildings) == 16 and 'Leistung_th [kW]' in buildings.columns
+    assert len(gpd.read_file(directory / 'streets_wld.gpkg')) > 0
+    assert len(gpd.read_file(directory / 'net.gpkg')) > 0
+    profile = pd.read_excel(directory / 'result.xlsx', sheet_name='Lastprofil', index_col=0)
+    assert profile['Gesamtsumme'].sum() > 0
+
+    # the building class of the run is used for residential buildings, 0 for the others
+    assert pipeline.DEFAULT_CONFIG['building_class'] == BUILDING_CLASS
+    assert {building_class for building_type, building_class in calls if building_type.lower() in ('efh', 'mfh')} == {5}
+    assert {building_class for building_type, building_class in calls if building_type.lower() not in ('efh', 'mfh')} <= {0}
+
+
+@pytest.mark.parametrize('suffix', ['.shp', '.gpkg'])
+def test_cached_net_has_the_schema_of_the_file(tmp_path, suffix):
+    net = gpd.GeoDataFrame({'Typ': ['Hauptleitung', 'Hausanschluss'], 'Laenge [m]': [40.0, 12.5],
+                            'Leistung_th [kW]': [30.0, 10.0], 'Leistung_th_GLF [kW]': [25.0, 10.0],
+                            'Verlust [kWh/a]': [100.0, 20.0], 'Verlust bei extra Daemmung [kWh/a]': [80.0, 15.0]},
+                           geometry=[LineString([(0, 0), (40, 0)]), LineString([(10, 0), (10, 12.5)])], crs=25832)
+    path = str(tmp_path / f'net{suffix}')
+    stage_cache = StageCache(str(tmp_path / 'stages'))
+    save_net(net, path, stage_cache)
+
+    # the result stage loads the net of the network analysis
+    result_cache = StageCache(str(tmp_path / 'stages'))
+    cached = result_cache.load('net_file', result_cache.key('net_file', [path]))
+    stored = gpd.read_file(path)
+    assert list(cached.columns) == list(stored.columns)
+    if suffix == '.shp':
+        assert 'Leistung_t' in cached.columns and 'Leistung_th [kW]' not in cached.columns
+    pd.testing.assert_frame_equal(pd.DataFrame(cached.drop(columns='geometry')), pd.DataFrame(stored.drop(columns='geometry')),
+                                  check_dtype=False)
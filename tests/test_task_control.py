@@ -0,0 +1,67 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import LineString, box
+
+from status_analysis import WLD
+from task_control import CancelToken, TaskCancelled, progress_callback
+
+
+def _wld():
+    rng = np.random.default_rng(8)
+    buildings = gpd.GeoDataFrame({'heat': rng.uniform(1000, 50000, 40)},
+                                 geometry=[box(x, y, x + 10, y + 10) for x, y in rng.uniform(0, 200, (40, 2))],
+                                 crs='EPSG:25832')
+    streets = gpd.GeoDataFrame(geometry=[LineString([(0, y), (200, y)]) for y in range(0, 220, 50)], crs='EPSG:25832')
+    wld = WLD(buildings, streets)
+    wld.get_centroid()
+    return wld
+
+
+def test_progress_callback_maps_the_loop_to_the_former_progress_steps():
+    values = []
+    progress = progress_callback(values.append, 30, 70)
+    for n in range(1, 251):
+        progress(n, 250)
+    # the former tasks emitted the start and end value around the loop, the steps in between are new
+    assert values[-1] == 70
+    assert values == sorted(set(values))
+    assert all(30 <= value <= 70 for value in values)
+    assert len(values) == 41
+
+    # nothing is reported for an empty loop, done is limited to the total
+    values = []
+    progress = progress_callback(values.append, 0, 100)
+    progress(0, 0)
+    progress(5, 3)
+    assert values == [100]
+
+
+def test_progress_does_not_change_the_result():
+    reference = _wld()
+    reference.closest_street_buildings()
+    values = []
+    wld = _wld()
+    wld.closest_street_buildings(progress=progress_callback(values.append, 10, 20, CancelToken()))
+    assert list(wld.buildings['street_id']) == list(reference.buildings['street_id'])
+    assert values[-1] == 20
+
+
+def test_cancelled_token_stops_the_loop():
+    token = CancelToken()
+    calls = []
+
+    def report(value):
+        calls.append(value)
+        if len(calls) == 3:
+            token.cancel()
+
+    wld = _wld()
+    with pytest.raises(TaskCancelled):
+        wld.closest_street_buildings(progress=progress_callback(report, 0, 100, token))
+    # the progress is reported before each building, the loop stops before the fourth building
+    assert len(calls) == 3
+    assert wld.buildings['street_id'].notna().sum() == 3
+
+    with pytest.raises(TaskCancelled):
+        token.check()
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import download_files
+from download_files import wfs_get_features_paged, _number_matched
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+
+class _Server:
+    '''A WFS server with `n` parcels that returns at most `cap` features per response.'''
+    def __init__(self, n, cap, report_matched=True, report_hits=True, sorting=True):
+        # the storage order of the server differs from the sort order
+        self.references = [f'05{i:06d}' for i in reversed(range(n))]
+        self.cap = cap
+        self.report_matched = report_matched
+        self.report_hits = report_hits
+        self.sorting = sorting
+        self.requests = []
+
+    def constraint(self, wfs_url, name):
+        return {'CountDefault': str(self.cap), 'ImplementsSorting': 'TRUE' if self.sorting else 'FALSE'}.get(name)
+
+    def get(self, url, params, **kwargs):
+        self.requests.append(params)
+        if params.get('resultType') == 'hits':
+            number = len(self.references) if self.report_hits else 'unknown'
+            return _Response(f'<wfs:FeatureCollection numberMatched="{number}"/>'.encode())
+        references = sorted(self.references) if params.get('sortBy') else self.references
+        start = params.get('startIndex', 0)
+        page = references[start:start + min(params.get('count', self.cap), self.cap)]
+        collection = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {'nationalCadastralReference': reference},
+             'geometry': {'type': 'Point', 'coordinates': [1.0, 2.0]}} for reference in page]}
+        if self.report_matched:
+            collection['numberMatched'] = len(self.references)
+        return _Response(json.dumps(collection).encode())
+
+
+def _use(monkeypatch, server, count_default=True):
+    monkeypatch.setattr(download_files, 'wfs_session', lambda: server)
+    monkeypatch.setattr(download_files, 'wfs_output_format', lambda wfs_url: 'application/json')
+    monkeypatch.setattr(download_files, 'wfs_get_feature_params', lambda wfs_url, layer_name, bbox, key=None: ('http://wfs', {}))
+    constraint = server.constraint if count_default else lambda wfs_url, name: None
+    monkeypatch.setattr(download_files, 'wfs_constraint', constraint)
+
+
+def _references(gdf):
+    return sorted(gdf['nationalCadastralReference'])
+
+
+@pytest.mark.parametrize('report_matched', [True, False])
+def test_pages_are_limited_to_the_server_cap(monkeypatch, report_matched):
+    server = _Server(7, cap=3, report_matched=report_matched)
+    _use(monkeypatch, server)
+    gdf, complete = wfs_get_features_paged('http://wfs', 'cp:CadastralParcel', (0, 0, 1, 1), page_size=100)
+    assert complete
+    assert _references(gdf) == sorted(server.references)
+    assert all(params.get('count') in (None, 3) for params in server.requests)
+    assert all(params['sortBy'] == 'cp:nationalCadastralReference' for params in server.requests if 'count' in params)
+
+
+def test_silent_server_cap_is_detected(monkeypatch):
+    # the server cuts the responses without reporting CountDefault
+    server = _Server(7, cap=3)
+    _use(monkeypatch, server, count_default=False)
+    gdf, complete = wfs_get_features_paged('http://wfs', 'cp:CadastralParcel', (0, 0, 1, 1), page_size=100)
+    assert complete
+    assert _references(gdf) == sorted(server.references)
+
+
+def test_silent_server_cap_without_number_matched(monkeypatch):
+    server = _Server(7, cap=3, report_matched=False, report_hits=False)
+    _use(monkeypatch, server, count_default=False)
+    gdf, complete = wfs_get_features_paged('http://wfs', 'cp:CadastralParcel', (0, 0, 1, 1), page_size=100)
+    assert complete
+    assert _references(gdf) == sorted(server.references)
+
+
+def test_small_result_needs_one_request(monkeypatch):
+    server = _Server(2, cap=3)
+    _use(monkeypatch, server)
+    gdf, complete = wfs_get_features_paged('http://wfs', 'cp:CadastralParcel', (0, 0, 1, 1), page_size=100)
+    assert complete and len(gdf) == 2
+    assert len(server.requests) == 1
+
+
+def test_number_matched_of_gml_and_geojson(tmp_path):
+    gml = tmp_path / 'page.gml'
+    gml.write_text('<wfs:FeatureCollection numberMatched="12" numberReturned="3">' + ' ' * 100000 + '</wfs:FeatureCollection>')
+    assert _number_matched(str(gml)) == 12
+    geojson = tmp_path / 'page.json'
+    geojson.write_text('{"type": "FeatureCollection", "features": [' + ' ' * 100000 + '], "numberMatched": 7}')
+    assert _number_matched(str(geojson)) == 7
+    gml.write_text('<wfs:FeatureCollection numberMatched="unknown"/>')
+    assert _number_matched(str(gml)) is None
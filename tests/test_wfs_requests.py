@@ -0,0 +1,59 @@
+import json
+import threading
+import time
+
+import download_files
+from download_files import get_shapes_from_wfs
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+
+class _Session:
+    '''A WFS server returning one parcel per key, counting the simultaneous requests.'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def get(self, url, params, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        if params.get('resultType') == 'hits':
+            return _Response(b'<wfs:FeatureCollection numberMatched="1" numberReturned="0"/>')
+        feature = {'type': 'Feature', 'properties': {'nationalCadastralReference': params['key'] + '0001'},
+                   'geometry': {'type': 'Point', 'coordinates': [1.0, 2.0]}}
+        return _Response(json.dumps({'type': 'FeatureCollection', 'features': [feature]}).encode())
+
+
+def test_simultaneous_requests_are_limited(monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(download_files, 'wfs_service', lambda wfs_url: None)
+    monkeypatch.setattr(download_files, 'wfs_session', lambda: session)
+    monkeypatch.setattr(download_files, 'wfs_output_format', lambda wfs_url: 'application/json')
+    monkeypatch.setattr(download_files, 'wfs_get_feature_params',
+                        lambda wfs_url, layer_name, bbox, key=None: ('http://wfs', {'key': key or ''}))
+
+    keys = [f'05{i:04d}' for i in range(16)]
+    gdf, incomplete = get_shapes_from_wfs('http://wfs', keys, [(0, 0, 1, 1)] * len(keys), 'cp:CadastralParcel', max_workers=16)
+    assert gdf['nationalCadastralReference'].tolist() == [key + '0001' for key in keys]
+    assert incomplete == []
+    assert session.max_running <= download_files.WFS_MAX_REQUESTS
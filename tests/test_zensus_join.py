@@ -0,0 +1,34 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+
+from adjust_files import zensus_join
+
+
+def _zensus():
+    # 3 x 3 cells of 100 m in EPSG:3035
+    cells = [(x, y) for x in range(4000000, 4000300, 100) for y in range(3000000, 3000300, 100)]
+    return gpd.GeoDataFrame({
+        'GITTER_ID_100m': [f'{x}_{y}' for x, y in cells],
+        'Fernheizung': np.arange(len(cells)),
+        'Gas': np.arange(len(cells)) * 2.0},
+        geometry=[box(x, y, x + 100, y + 100) for x, y in cells], crs='EPSG:3035')
+
+
+def test_zensus_join_matches_spatial_join():
+    zensus = _zensus()
+    points = [(4000010, 3000020), (4000150, 3000250), (4000299, 3000101), (4000150, 3000150), (3999950, 3000050)]
+    buildings = gpd.GeoDataFrame({'id': range(len(points))},
+                                 geometry=[box(x - 3, y - 3, x + 3, y + 3) for x, y in points], crs='EPSG:3035')
+    buildings = buildings.to_crs(epsg=25832)
+
+    result = zensus_join(buildings, zensus)
+    assert list(result.columns) == ['id', 'geometry', 'Fernheizung', 'Gas']
+
+    # reference: spatial join of the building centroids within the Zensus squares
+    centroids = gpd.GeoDataFrame(geometry=buildings.geometry.centroid.to_crs(epsg=3035))
+    expected = gpd.sjoin(centroids, zensus, how='left', predicate='within')
+    expected = expected[~expected.index.duplicated()]
+    for attr in ['Fernheizung', 'Gas']:
+        np.testing.assert_array_equal(result[attr].to_numpy(dtype=float), expected[attr].to_numpy(dtype=float))
+    assert np.isnan(result['Gas'].iloc[-1])